@@ -75,6 +75,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # 事务开始时即获取写锁，并发写入的事务排队等待，而不是先读后写时互相死锁报 database is locked
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # 测试库也用文件：内存库的共享缓存在并发写入时直接报 table is locked，测不出上面的排队效果
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
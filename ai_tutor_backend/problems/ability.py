@@ -0,0 +1,206 @@
+"""学生能力估计
+
+采用 Rasch（单参数IRT）模型：学生在知识点上的能力 theta 与题目难度 b
+处于同一 logit 尺度，答对的概率为 1 / (1 + exp(-(theta - b)))。
+
+- 每次作答后按 Elo 方式在 O(1) 内更新该知识点的能力值：
+  theta += K * (得分 - 预期得分)，作答越多 K 越小，估计越稳定。
+  只有提交新的作答（submission.submit_answers）才会更新，管理后台修改
+  或重新保存 UserProblemRecord 不会改变能力值。
+- 题目难度由 recalibrate() 定期用全部作答记录批量重新标定
+  （NumPy 向量化的正则化牛顿迭代），见 recalibrate_difficulty 命令。
+"""
+import math
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from students.models import StudentProfile
+
+from .models import Problem, TopicAbility, UserProblemRecord
+
+# 难度等级对应的初始难度参数，也是批量标定时的先验均值
+DIFFICULTY_PRIORS = {'简单': -1.0, '中等': 0.0, '较难': 1.0, '困难': 2.0}
+# 学业水平对应的初始能力值，学生在某知识点还没有作答时使用
+LEVEL_PRIORS = {'excellent': 1.5, 'good': 0.75, 'average': 0.0, 'below_average': -0.75, 'poor': -1.5}
+
+K_INITIAL = 0.6
+K_MIN = 0.1
+# 推荐题目的目标难度比能力低 TARGET_OFFSET，即预期正确率约 60%，上下浮动 TARGET_WIDTH
+TARGET_OFFSET = 0.4
+TARGET_WIDTH = 0.9
+
+
+def expected_score(theta, b):
+    return 1.0 / (1.0 + math.exp(-(theta - b)))
+
+
+def k_factor(attempts):
+    return max(K_MIN, K_INITIAL / (1 + 0.1 * attempts))
+
+
+def outcome_of(status, score):
+    """作答结果转换为 0~1 的得分，跳过的题目不计入能力估计"""
+    if status == 'skipped':
+        return None
+    if status == 'correct':
+        return 1.0
+    if status == 'incorrect':
+        return 0.0
+    return min(max(score / 100.0, 0.0), 1.0)
+
+
+def record_attempts(user_id, attempts):
+    """根据一次提交中的作答依次更新学生在各知识点上的能力值，涉及的能力值一次读取、一次写回
+
+    Args:
+        attempts: [(知识点id, 题目难度参数, status, score)]，按作答顺序
+
+    Returns:
+        dict: 知识点id -> 更新后的 TopicAbility
+    """
+    scored = [(topic_id, rating, outcome_of(status, score)) for topic_id, rating, status, score in attempts]
+    scored = [item for item in scored if item[2] is not None]
+    if not scored:
+        return {}
+    topic_ids = {topic_id for topic_id, _, _ in scored}
+
+    with transaction.atomic():
+        abilities = TopicAbility.objects.select_for_update().filter(user_id=user_id, topic_id__in=topic_ids)
+        if len(abilities) < len(topic_ids):
+            initial = _initial_rating(user_id)
+            existing = {ability.topic_id for ability in abilities}
+            TopicAbility.objects.bulk_create(
+                [TopicAbility(user_id=user_id, topic_id=topic_id, rating=initial)
+                 for topic_id in topic_ids - existing],
+                ignore_conflicts=True)
+            abilities = abilities.all()
+        abilities = {ability.topic_id: ability for ability in abilities}
+        for topic_id, rating, outcome in scored:
+            _update(abilities[topic_id], rating, outcome)
+        now = timezone.now()
+        for ability in abilities.values():
+            ability.updated_at = now
+        TopicAbility.objects.bulk_update(abilities.values(), ['rating', 'attempts', 'updated_at'])
+    return abilities
+
+
+def _update(ability, difficulty_rating, outcome):
+    ability.rating += k_factor(ability.attempts) * (outcome - expected_score(ability.rating, difficulty_rating))
+    ability.attempts += 1
+
+
+def _initial_rating(user_id):
+    level = StudentProfile.objects.filter(student_id=user_id).values_list('academic_level', flat=True).first()
+    return LEVEL_PRIORS.get(level, 0.0)
+
+
+def topic_abilities(user, topic_ids, academic_level=None):
+    """学生在各知识点上的能力值，没有作答过的知识点使用学业水平对应的初始值
+
+    Returns:
+        dict: 知识点id -> 能力值
+    """
+    prior = LEVEL_PRIORS.get(academic_level, 0.0)
+    abilities = {topic_id: prior for topic_id in topic_ids}
+    rows = TopicAbility.objects.filter(user=user, topic_id__in=topic_ids).values_list('topic_id', 'rating')
+    abilities.update(rows)
+    return abilities
+
+
+def target_range(theta):
+    """适合该能力值的题目难度区间
+
+    区间中心限制在各难度等级的范围内，能力特别高或特别低的学生也能取到最难或最简单的题目。
+    """
+    center = min(max(theta - TARGET_OFFSET, min(DIFFICULTY_PRIORS.values())), max(DIFFICULTY_PRIORS.values()))
+    return center - TARGET_WIDTH, center + TARGET_WIDTH
+
+
+def suggested_difficulty(theta):
+    """与能力值最接近的难度等级"""
+    center = theta - TARGET_OFFSET
+    return min(DIFFICULTY_PRIORS, key=lambda label: abs(DIFFICULTY_PRIORS[label] - center))
+
+
+def recalibrate(iterations=20, prior_weight=1.0, update_abilities=True, batch_size=1000):
+    """用全部作答记录重新标定题目难度（以及学生能力）
+
+    联合估计 Rasch 模型的能力和难度参数：交替对两组参数做一步牛顿迭代，
+    以难度等级对应的值作为题目难度的先验，避免作答很少的题目偏离过远。
+
+    Args:
+        iterations: 迭代次数
+        prior_weight: 先验的权重（相当于虚拟作答次数）
+        update_abilities: 是否同时用估计结果覆盖学生的能力值
+        batch_size: 写回数据库时每批更新的行数
+
+    Returns:
+        dict: 参与标定的记录数、题目数、学生知识点数和迭代后的对数似然
+    """
+    records = (UserProblemRecord.objects.exclude(status='skipped')
+               .values_list('user_id', 'problem__topic_id', 'problem_id', 'status', 'score'))
+    user_ids, topic_ids, problem_ids, outcomes = [], [], [], []
+    for user_id, topic_id, problem_id, status, score in records.iterator(chunk_size=5000):
+        user_ids.append(user_id)
+        topic_ids.append(topic_id)
+        problem_ids.append(problem_id)
+        outcomes.append(outcome_of(status, score))
+    if not outcomes:
+        return {'records': 0, 'problems': 0, 'abilities': 0, 'log_likelihood': None}
+
+    y = np.asarray(outcomes, dtype=float)
+    # 题目和(学生, 知识点)分别编号
+    items, item_index = np.unique(np.asarray(problem_ids), return_inverse=True)
+    pairs = np.stack([np.asarray(user_ids), np.asarray(topic_ids)], axis=1)
+    persons, person_index = np.unique(pairs, axis=0, return_inverse=True)
+    person_index = person_index.ravel()
+
+    labels = dict(Problem.objects.filter(id__in=items.tolist()).values_list('id', 'difficulty'))
+    prior_b = np.array([DIFFICULTY_PRIORS.get(labels.get(pid), 0.0) for pid in items.tolist()])
+    b = prior_b.copy()
+    theta = np.zeros(len(persons))
+
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-(theta[person_index] - b[item_index])))
+        info = p * (1 - p)
+        # 能力：先验均值为0
+        grad = np.bincount(person_index, y - p, len(persons)) - prior_weight * theta
+        theta += grad / (np.bincount(person_index, info, len(persons)) + prior_weight)
+
+        p = 1.0 / (1.0 + np.exp(-(theta[person_index] - b[item_index])))
+        info = p * (1 - p)
+        # 难度：先验均值为难度等级对应的值
+        grad = np.bincount(item_index, p - y, len(items)) - prior_weight * (b - prior_b)
+        b += grad / (np.bincount(item_index, info, len(items)) + prior_weight)
+
+    p = np.clip(1.0 / (1.0 + np.exp(-(theta[person_index] - b[item_index]))), 1e-9, 1 - 1e-9)
+    log_likelihood = float(np.sum(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+    with transaction.atomic():
+        ratings = dict(zip(items.tolist(), b.round(4).tolist()))
+        problems = list(Problem.objects.filter(id__in=ratings).only('id', 'difficulty_rating'))
+        for problem in problems:
+            problem.difficulty_rating = ratings[problem.id]
+        Problem.objects.bulk_update(problems, ['difficulty_rating'], batch_size=batch_size)
+
+        if update_abilities:
+            attempts = np.bincount(person_index, minlength=len(persons)).tolist()
+            estimates = {(u, t): (r, n) for (u, t), r, n in zip(persons.tolist(), theta.round(4).tolist(), attempts)}
+            abilities = list(TopicAbility.objects.filter(user_id__in={u for u, _ in estimates}))
+            for ability in abilities:
+                key = (ability.user_id, ability.topic_id)
+                if key in estimates:
+                    ability.rating = estimates.pop(key)[0]
+            TopicAbility.objects.bulk_update(abilities, ['rating'], batch_size=batch_size)
+            # 在能力估计上线之前已有作答记录的学生，补建能力值
+            TopicAbility.objects.bulk_create([
+                TopicAbility(user_id=u, topic_id=t, rating=r, attempts=n) for (u, t), (r, n) in estimates.items()
+            ], batch_size=batch_size)
+
+    return {
+        'records': len(y),
+        'problems': len(items),
+        'abilities': len(persons),
+        'log_likelihood': round(log_likelihood, 2),
+    }
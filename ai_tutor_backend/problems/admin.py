@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Subject, Topic, Problem, UserProblemRecord
+from .models import Subject, Topic, Problem, UserProblemRecord, ProblemAttempt, TopicAbility, UserStats, UserTopicStats
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
@@ -14,7 +14,7 @@ class TopicAdmin(admin.ModelAdmin):
 
 @admin.register(Problem)
 class ProblemAdmin(admin.ModelAdmin):
-    list_display = ('title', 'topic', 'difficulty', 'created_at')
+    list_display = ('title', 'topic', 'difficulty', 'difficulty_rating', 'created_at')
     list_filter = ('topic__subject', 'topic', 'difficulty')
     search_fields = ('title', 'content')
 
@@ -23,4 +23,41 @@ class UserProblemRecordAdmin(admin.ModelAdmin):
     list_display = ('user', 'problem', 'status', 'score', 'attempted_at')
     list_filter = ('status', 'score', 'attempted_at')
     search_fields = ('user__username', 'problem__title')
-    raw_id_fields = ('user', 'problem')
\ No newline at end of file
+    raw_id_fields = ('user', 'problem')
+
+@admin.register(ProblemAttempt)
+class ProblemAttemptAdmin(admin.ModelAdmin):
+    """作答历史只追加不修改，后台只能查看（修改或删除也不会同步统计和能力值）"""
+    list_display = ('user', 'problem', 'status', 'score', 'attempted_at')
+    list_filter = ('status', 'attempted_at')
+    search_fields = ('user__username', 'problem__title')
+    readonly_fields = ('user', 'problem', 'user_answer', 'status', 'score', 'time_spent', 'attempted_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(TopicAbility)
+class TopicAbilityAdmin(admin.ModelAdmin):
+    list_display = ('user', 'topic', 'rating', 'attempts', 'updated_at')
+    list_filter = ('topic__subject',)
+    search_fields = ('user__username', 'topic__name')
+    raw_id_fields = ('user', 'topic')
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'total_attempted', 'correct_count', 'incorrect_count', 'skipped_count')
+    search_fields = ('user__username',)
+    raw_id_fields = ('user',)
+
+@admin.register(UserTopicStats)
+class UserTopicStatsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'topic', 'difficulty', 'total_attempted', 'correct_count', 'incorrect_count')
+    list_filter = ('topic__subject', 'difficulty')
+    search_fields = ('user__username', 'topic__name')
+    raw_id_fields = ('user', 'topic')
@@ -0,0 +1,132 @@
+"""班级掌握情况分析
+
+从 UserTopicStats（见 stats.py，按 用户×知识点×难度 增量维护的汇总）出发，
+用一次分组查询得到 班级×知识点×难度 的作答数和正确数，再用 pandas 透视成
+每个知识点一行、每个难度一列的矩阵。
+
+结果按班级缓存在 Django 缓存中；班级里的学生有新的作答记录时清除该班级的缓存。
+"""
+import pandas as pd
+from django.core.cache import cache
+from django.db.models import Count, Sum
+from students.models import StudentProfile
+
+from .models import Problem, UserTopicStats
+
+CACHE_TIMEOUT = 600
+DIFFICULTIES = [value for value, _ in Problem.DIFFICULTY_CHOICES]
+# 导出 CSV 的列
+CSV_COLUMNS = ['class_name', 'subject_name', 'topic_name', 'difficulty', 'students', 'attempts', 'correct', 'accuracy']
+
+
+def _cache_key(class_name):
+    return f'problems:class_mastery:{class_name}'
+
+
+def invalidate_class(class_name):
+    cache.delete(_cache_key(class_name))
+
+
+def invalidate_student(user_id):
+    """学生作答后清除其所在班级的缓存"""
+    class_name = (StudentProfile.objects.filter(student_id=user_id)
+                  .values_list('class_name', flat=True).first())
+    if class_name:
+        invalidate_class(class_name)
+
+
+def _query(class_names):
+    """一次分组查询：各班级在每个知识点、每个难度上的作答人数、作答数、正确数"""
+    rows = (UserTopicStats.objects
+            .filter(user__student_profile__class_name__in=class_names)
+            .values('user__student_profile__class_name', 'topic_id', 'topic__name',
+                    'topic__subject__name', 'difficulty')
+            .order_by()
+            .annotate(students=Count('user_id', distinct=True),
+                      attempts=Sum('total_attempted'),
+                      correct=Sum('correct_count')))
+    frame = pd.DataFrame.from_records(list(rows), columns=[
+        'user__student_profile__class_name', 'topic_id', 'topic__name', 'topic__subject__name',
+        'difficulty', 'students', 'attempts', 'correct'])
+    return frame.rename(columns={
+        'user__student_profile__class_name': 'class_name',
+        'topic__name': 'topic_name',
+        'topic__subject__name': 'subject_name',
+    })
+
+
+def _matrix(frame):
+    """把一个班级的长表透视为 知识点 × 难度 的矩阵
+
+    Returns:
+        list: 每个知识点一项，包含总体和各难度的作答人数、作答数、正确率
+    """
+    index = ['subject_name', 'topic_id', 'topic_name']
+    values = ['students', 'attempts', 'correct']
+    pivot = frame.pivot_table(index=index, columns='difficulty', values=values, aggfunc='sum', fill_value=0)
+    # 补齐没有作答的难度列（reindex 指定 level 时不会新增该层中缺少的列）
+    pivot = pivot.reindex(columns=pd.MultiIndex.from_product([values, DIFFICULTIES]), fill_value=0)
+    attempts = pivot['attempts']
+    correct = pivot['correct']
+    accuracy = (correct / attempts.where(attempts > 0)).round(4)
+    totals = frame.groupby(index)[['attempts', 'correct']].sum()
+    total_accuracy = (totals['correct'] / totals['attempts'].where(totals['attempts'] > 0)).round(4)
+    # 知识点的作答人数为各难度作答人数的最大值（同一学生可能作答多个难度）
+    students = pivot['students'].max(axis=1)
+
+    topics = []
+    for key in pivot.index:
+        subject_name, topic_id, topic_name = key
+        topics.append({
+            'subject_name': subject_name,
+            'topic_id': int(topic_id),
+            'topic_name': topic_name,
+            'students': int(students[key]),
+            'attempts': int(totals.at[key, 'attempts']),
+            'accuracy': _number(total_accuracy[key]),
+            'difficulties': {
+                difficulty: {
+                    'students': int(pivot.at[key, ('students', difficulty)]),
+                    'attempts': int(attempts.at[key, difficulty]),
+                    'correct': int(correct.at[key, difficulty]),
+                    'accuracy': _number(accuracy.at[key, difficulty]),
+                }
+                for difficulty in DIFFICULTIES
+            },
+        })
+    return topics
+
+
+def _number(value):
+    return None if pd.isna(value) else float(value)
+
+
+def class_mastery(class_names):
+    """各班级的知识点掌握矩阵，优先读取缓存，未缓存的班级合并为一次查询
+
+    Returns:
+        dict: 班级名 -> 知识点列表（见 _matrix）
+    """
+    keys = {class_name: _cache_key(class_name) for class_name in class_names}
+    cached = cache.get_many(keys.values())
+    result = {name: cached[key] for name, key in keys.items() if key in cached}
+
+    missing = [name for name in class_names if name not in result]
+    if missing:
+        frame = _query(missing)
+        groups = dict(tuple(frame.groupby('class_name'))) if not frame.empty else {}
+        computed = {name: _matrix(groups[name]) if name in groups else [] for name in missing}
+        cache.set_many({keys[name]: topics for name, topics in computed.items()}, CACHE_TIMEOUT)
+        result.update(computed)
+    return {name: result[name] for name in class_names}
+
+
+def to_csv_rows(mastery):
+    """展开为 CSV 的行：每个 班级×知识点×难度 一行"""
+    for class_name, topics in mastery.items():
+        for topic in topics:
+            for difficulty, cell in topic['difficulties'].items():
+                if not cell['attempts']:
+                    continue
+                yield [class_name, topic['subject_name'], topic['topic_name'], difficulty,
+                       cell['students'], cell['attempts'], cell['correct'], cell['accuracy']]
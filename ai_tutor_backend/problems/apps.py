@@ -4,4 +4,8 @@ from django.apps import AppConfig
 class ProblemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'problems'
-    verbose_name = '题目管理'
\ No newline at end of file
+    verbose_name = '题目管理'
+
+    def ready(self):
+        # 注册信号处理函数
+        from . import signals  # noqa: F401
@@ -0,0 +1,180 @@
+"""AI 生成题目
+
+- 多道题在线程池中并发生成（同一请求最多 GENERATE_WORKERS 个并发调用），
+  所有请求共用一个令牌桶限速器，控制整个进程对大模型接口的调用频率；
+- 每道题独立重试：输出无法解析为 JSON、缺少字段或与已生成的题目重复时重新生成，
+  最多 GENERATE_RETRIES 次，失败的题目返回错误信息，不影响其他题目；
+- generate_problems() 按完成顺序逐个产出结果，视图可以边生成边流式返回。
+"""
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from openai import OpenAI
+
+logger = logging.getLogger(__name__)
+
+DEEPSEEK_API_KEY = os.environ.get('DEEPSEEK_API_KEY', '')  # 未设置时生成接口直接返回配置错误
+DEEPSEEK_BASE_URL = 'https://api.deepseek.com'
+MAX_COUNT = 20
+GENERATE_WORKERS = int(os.environ.get('AI_GENERATE_WORKERS', 4))
+GENERATE_RETRIES = 2
+# 进程内对大模型接口的调用频率上限（每秒请求数）和允许的突发请求数
+GENERATE_RATE = float(os.environ.get('AI_GENERATE_RATE', 2))
+GENERATE_BURST = 4
+MAX_TEMPERATURE = 2.0
+
+REQUIRED_FIELDS = ['题目', '知识点', '难度', '答案', '解析']
+
+
+class TokenBucket:
+    """令牌桶限速器：每秒补充 rate 个令牌，最多积累 capacity 个，acquire() 在没有令牌时等待"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+rate_limiter = TokenBucket(GENERATE_RATE, GENERATE_BURST)
+
+
+def get_client():
+    return OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL)
+
+
+def build_prompt(subject, topic, difficulty):
+    # 添加随机性因素，避免生成相似题目
+    random_seed = random.randint(1000, 9999)
+    return f"""请生成一道{subject}题目，满足以下要求：
+1. 知识点: {topic}
+2. 难度级别: {difficulty}
+3. 题目要有明确的题干、答案和解析
+4. 请确保题目具有独特性和多样性
+5. 基于随机种子{random_seed}生成不同风格的题目
+6. 输出格式如下(不要出现反斜杠转义问题)：
+{{
+    "题目": "(具体题目描述)",
+    "知识点": "{topic}",
+    "难度": "{difficulty}",
+    "答案": "(答案内容)",
+    "解析": "(详细解析步骤)"
+}}
+请确保输出是有效的JSON格式，特别注意：当需要在JSON字符串中包含反斜杠或引号时，请确保正确转义。"""
+
+
+def parse_problem(result):
+    """从模型输出中提取题目 JSON
+
+    Raises:
+        ValueError: 无法提取或解析，或缺少必要字段
+    """
+    start_idx = result.find('{')
+    end_idx = result.rfind('}') + 1
+    if start_idx == -1 or end_idx <= start_idx:
+        raise ValueError('AI输出格式异常，无法提取JSON')
+    json_str = result[start_idx:end_idx]
+
+    try:
+        problem_data = json.loads(json_str)
+    except json.JSONDecodeError as e:
+        # 尝试替换可能导致问题的转义序列：双重转义反斜杠，但不要双重转义已经正确转义的引号
+        fixed_json = json_str.replace("\\", "\\\\").replace("\\\\\"", "\\\"")
+        try:
+            problem_data = json.loads(fixed_json)
+        except json.JSONDecodeError:
+            raise ValueError(f'JSON解析错误: {str(e)}')
+
+    if not isinstance(problem_data, dict):
+        raise ValueError('AI输出格式异常，无法提取JSON')
+    missing = [f for f in REQUIRED_FIELDS if f not in problem_data]
+    if missing:
+        raise ValueError(f'生成的数据缺少必要字段: {", ".join(missing)}')
+    return problem_data
+
+
+class _Generation:
+    """一次生成任务的共享状态：客户端和已生成题目（用于去重）"""
+
+    def __init__(self, client, subject, topic, difficulty):
+        self.client = client
+        self.subject = subject
+        self.topic = topic
+        self.difficulty = difficulty
+        self.seen = set()
+        self.lock = threading.Lock()
+
+    def generate_one(self, index):
+        """生成第 index 道题，解析失败或重复时重试，返回题目或 {'error': ...}"""
+        error = None
+        for attempt in range(GENERATE_RETRIES + 1):
+            rate_limiter.acquire()
+            try:
+                response = self.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[{"role": "user", "content": build_prompt(self.subject, self.topic, self.difficulty)}],
+                    # 逐渐增加随机性
+                    temperature=min(1.2 + (index + attempt) * 0.1, MAX_TEMPERATURE),
+                    max_tokens=1500
+                )
+            except Exception as e:
+                # 接口调用失败（网络、鉴权、额度）重试通常无效，直接返回错误
+                logger.warning(f"生成题目错误: {str(e)}")
+                return {'error': str(e)}
+
+            result = response.choices[0].message.content or ''
+            try:
+                problem_data = parse_problem(result)
+            except ValueError as e:
+                error = str(e)
+                logger.info(f"第{index + 1}题第{attempt + 1}次生成无法解析: {error}")
+                continue
+
+            with self.lock:
+                if problem_data['题目'] in self.seen:
+                    error = '生成的题目重复'
+                    logger.info("检测到重复题目，重新生成...")
+                    continue
+                self.seen.add(problem_data['题目'])
+            return problem_data
+        return {'error': error}
+
+
+def generate_problems(subject, topic, difficulty, count, client=None):
+    """并发生成若干道题目
+
+    Args:
+        subject, topic, difficulty: 学科、知识点、难度
+        count: 题目数量
+        client: OpenAI 兼容客户端，默认连接 DeepSeek
+
+    Yields:
+        tuple: (序号, 题目或 {'error': ...})，按完成顺序
+    """
+    generation = _Generation(client or get_client(), subject, topic, difficulty)
+    executor = ThreadPoolExecutor(max_workers=max(1, min(count, GENERATE_WORKERS)))
+    try:
+        futures = {executor.submit(generation.generate_one, i): i for i in range(count)}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # 客户端断开（生成器被关闭）时不再启动尚未开始的任务
+        executor.shutdown(wait=False, cancel_futures=True)
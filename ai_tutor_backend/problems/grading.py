@@ -0,0 +1,741 @@
+"""自动判题
+
+标准答案先被编译成判题器（Matcher），再用判题器给学生答案打分（0~1）：
+- 两边都先做规范化：上下标转换、NFKC（全角转半角）、统一乘除号和减号、去掉首尾标点；
+- ChoiceMatcher：选择题，比较选项字母集合，多选题少选给部分分；
+- PartsMatcher：(1)(2)… 分小问的答案，逐问判分取平均；
+- AlternativesMatcher：“k = 5 或 k = -15”、“1, 2” 这类不计顺序的多个答案；
+- SequenceMatcher：坐标、区间等带括号的有序数组；
+- QuantityMatcher：数值（分数、百分数、科学计数法）加可选单位，整数要求完全相等，
+  小数按标准答案写出的小数位数比较（学生答案四舍五入后与之相同即可），分数按相对误差比较；
+- ExpressionMatcher：代数式或方程，在随机取的若干点上用 NumPy 向量化求值比较，
+  方程允许两边同乘一个非零常数；
+- 以上都不适用时按规范化后的文本比较。
+
+判题器按 (题目id, 标准答案) 缓存在 LRU 中，修改答案后自动重新编译。
+可以用 register() 注册新的判题器，排在已有判题器之前优先尝试。
+"""
+import math
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+# 数值比较的相对误差（学生写 0.333 表示 1/3 视为正确）
+REL_TOLERANCE = 1e-3
+# 指数和数值字面量的上限：学生答案中的 9^9^9、10^99999 之类直接判为无法解析，
+# 代数式中的数值都按浮点数求值，溢出时得到 inf 或异常，不做任意精度的整数运算
+MAX_EXPONENT = 100
+MAX_LITERAL = 10.0 ** MAX_EXPONENT
+# 代数式比较的相对误差和随机取点数
+EXPR_TOLERANCE = 1e-6
+SAMPLES = 12
+MATCHER_CACHE_SIZE = 4096
+
+Grade = namedtuple('Grade', ['status', 'score'])
+
+_SUPERSCRIPTS = dict(zip('⁰¹²³⁴⁵⁶⁷⁸⁹⁻', '0123456789-'))
+_SUBSCRIPTS = dict(zip('₀₁₂₃₄₅₆₇₈₉', '0123456789'))
+_CIRCLED = {chr(0x2460 + i): f'({i + 1})' for i in range(10)}
+_SYMBOLS = str.maketrans({
+    '×': '*', '·': '*', '⋅': '*', '÷': '/', '⁄': '/',
+    '−': '-', '–': '-', '—': '-',
+    '、': ',', '。': '.',
+})
+_QUOTES = '"\'“”‘’'
+_ANSWER_PREFIX = re.compile(r'^(?:(?:最终|正确)?答案\s*(?:应该?)?(?:是|为|:)|答\s*:|解\s*:)\s*')
+
+
+def canonical(text):
+    """规范化答案文本：上下标、全角字符、乘除号和空白统一，去掉首尾的标点和引号"""
+    text = re.sub('[' + ''.join(_SUPERSCRIPTS) + ']+',
+                  lambda m: '^' + ''.join(_SUPERSCRIPTS[c] for c in m.group()), text or '')
+    text = re.sub('[' + ''.join(_SUBSCRIPTS) + ']+',
+                  lambda m: '_' + ''.join(_SUBSCRIPTS[c] for c in m.group()), text)
+    text = ''.join(_CIRCLED.get(c, c) for c in text)
+    text = unicodedata.normalize('NFKC', text).translate(_SYMBOLS)
+    # 去掉 “答案是”、“答：” 这样的前缀
+    text = _ANSWER_PREFIX.sub('', text.strip())
+    # 保留换行（分小问时可能用换行分隔），其他空白合并为一个空格
+    text = re.sub(r' *\n[\s]*', '\n', re.sub(r'[^\S\n]+', ' ', text)).strip()
+    return text.strip(_QUOTES).rstrip('.;,').strip()
+
+
+def _text_key(text):
+    # 英文单词之间的空白保留为一个空格（“a n” 不等于 “an”），其余空白忽略
+    text = re.sub(r'\s+', ' ', canonical(text)).strip()
+    text = re.sub(r'(?<![A-Za-z]) | (?![A-Za-z])', '', text)
+    return re.sub('[' + _QUOTES + ']', '', text).rstrip('.!?;,').casefold()
+
+
+def _close(a, b, rel=REL_TOLERANCE):
+    if a == b:
+        return True
+    if math.isinf(a) or math.isinf(b):
+        return False
+    # 两边都是整数时要求完全相等（2024 不等于 2025）
+    if float(a).is_integer() and float(b).is_integer():
+        return False
+    return abs(a - b) <= max(rel * max(abs(a), abs(b)), 1e-9)
+
+
+def _split_top_level(text, separators):
+    """在括号外的分隔符处切分"""
+    parts, depth, start = [], 0, 0
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            for separator in separators:
+                if text.startswith(separator, i):
+                    parts.append(text[start:i])
+                    start = i + len(separator)
+                    i = start - 1
+                    break
+        i += 1
+    parts.append(text[start:])
+    return [part.strip().rstrip('.;,').strip() for part in parts if part.strip(' .;,')]
+
+
+def _strip_assignment(text):
+    """去掉 “x = ” 这样的左边（单个变量），方程保持原样"""
+    match = re.fullmatch(r'[A-Za-zͰ-Ͽ](?:_\d+)?\s*=\s*([^=]+)', text)
+    return match.group(1).strip() if match else text
+
+
+class Matcher:
+    """判题器基类
+
+    compile() 解析标准答案，不适用于该答案时返回 None；
+    match() 返回学生答案的得分，1 为完全正确，0 为错误，介于两者之间为部分正确。
+    """
+    @classmethod
+    def compile(cls, answer):
+        raise NotImplementedError
+
+    def match(self, user_answer):
+        raise NotImplementedError
+
+
+MATCHERS = []
+
+
+def register(matcher_class, first=False):
+    """注册判题器，按注册顺序尝试；first=True 时排在最前"""
+    if first:
+        MATCHERS.insert(0, matcher_class)
+    else:
+        MATCHERS.append(matcher_class)
+    _cached_matcher.cache_clear()
+    return matcher_class
+
+
+# ---------- 选择题 ----------
+
+_CHOICE_LETTERS = r'[A-H](?:\s*,?\s*[A-H])*'
+
+
+def _choice_letters(text):
+    """学生答案中的选项字母：“AC”、“a, c”、“(B)”、“选B”，或以 “B.” 开头的整句"""
+    text = re.sub(r'^(?:选|答案:?)\s*', '', text)
+    text = re.sub(r'[()\[\]]', '', text).strip().upper()
+    if re.fullmatch(_CHOICE_LETTERS, text):
+        return frozenset(re.findall('[A-H]', text))
+    match = re.match(r'([A-H])\s*[.:]\s*', text)
+    if match:
+        return frozenset(match.group(1))
+    return None
+
+
+class ChoiceMatcher(Matcher):
+    def __init__(self, letters, option_text=None):
+        self.letters = letters
+        self.option_key = _text_key(option_text) if option_text else None
+
+    @classmethod
+    def compile(cls, answer):
+        text = canonical(answer)
+        if re.fullmatch(_CHOICE_LETTERS, text):
+            return cls(frozenset(re.findall('[A-H]', text)))
+        match = re.fullmatch(r'\(?([A-H])\s*[).:]\s*(.+)', text)
+        if match:
+            return cls(frozenset(match.group(1)), match.group(2))
+        return None
+
+    def match(self, user_answer):
+        text = canonical(user_answer)
+        letters = _choice_letters(text)
+        if letters is None and self.option_key and _text_key(text) == self.option_key:
+            letters = self.letters
+        if not letters or letters - self.letters:
+            return 0.0
+        return len(letters) / len(self.letters)
+
+
+# ---------- 分小问 ----------
+
+_PART_MARK = re.compile(r'\(\s*(\d+)\s*\)')
+
+
+def _numbered_parts(text):
+    """按 (1)(2)… 切分，编号必须从 1 开始连续，否则返回 None"""
+    marks = list(_PART_MARK.finditer(text))
+    if len(marks) < 2 or text[:marks[0].start()].strip():
+        return None
+    if [int(m.group(1)) for m in marks] != list(range(1, len(marks) + 1)):
+        return None
+    bounds = [m.end() for m in marks]
+    ends = [m.start() for m in marks[1:]] + [len(text)]
+    return [text[start:end].strip().rstrip('.;,').strip() for start, end in zip(bounds, ends)]
+
+
+class PartsMatcher(Matcher):
+    def __init__(self, parts):
+        self.parts = parts
+
+    @classmethod
+    def compile(cls, answer):
+        parts = _numbered_parts(canonical(answer))
+        if not parts:
+            return None
+        return cls([compile_answer(part) for part in parts])
+
+    def match(self, user_answer):
+        text = canonical(user_answer)
+        parts = _numbered_parts(text) or _split_top_level(text, [';', '\n'])
+        if len(parts) != len(self.parts):
+            return 0.0
+        return sum(matcher.match(part) for matcher, part in zip(self.parts, parts)) / len(self.parts)
+
+
+# ---------- 多个答案（不计顺序） ----------
+
+class AlternativesMatcher(Matcher):
+    SEPARATORS = ['或', ' or ', ',', ';', '和', ' and ']
+
+    def __init__(self, items):
+        self.items = items
+
+    @classmethod
+    def compile(cls, answer):
+        text = canonical(answer)
+        items = _split_top_level(text, ['或'])
+        if len(items) < 2:
+            # 逗号分隔时只接受全部是数值的答案，避免把英语短语拆开
+            items = _split_top_level(text, [','])
+            if len(items) < 2 or not all(QuantityMatcher.compile(item) for item in items):
+                return None
+        return cls([compile_answer(item) for item in items])
+
+    def match(self, user_answer):
+        items = _split_top_level(canonical(user_answer), self.SEPARATORS)
+        unused = list(items)
+        matched = 0
+        for matcher in self.items:
+            for item in unused:
+                if matcher.match(item) == 1:
+                    unused.remove(item)
+                    matched += 1
+                    break
+        return matched / max(len(self.items), len(items))
+
+
+# ---------- 数值和单位 ----------
+
+_NUMBER = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:/\d+(?:\.\d+)?)?(?:\s*\*\s*10\^\(?[-+]?\d+\)?|[eE][-+]?\d+)?%?'
+# 单位：字母、汉字和 °、μ、Ω 等符号，可带 / * 和指数，如 m/s^2、kg*m/s、km/h、伏特
+_UNIT_CHAR = 'A-Za-zͰ-Ͽ°\u4e00-\u9fff'
+_UNIT = rf'[{_UNIT_CHAR}](?:[{_UNIT_CHAR}/*\d]|\^-?\d)*'
+_QUANTITY = re.compile(rf'(?P<number>{_NUMBER})\s*(?P<unit>{_UNIT})?')
+
+
+def _parse_number(text):
+    text = text.replace(' ', '')
+    percent = text.endswith('%')
+    text = text.rstrip('%')
+    power = re.search(r'\*10\^\(?([-+]?\d+)\)?$', text)
+    exponent = 0
+    if power:
+        exponent = int(power.group(1))
+        if abs(exponent) > MAX_EXPONENT:
+            return None
+        text = text[:power.start()]
+    if '/' in text:
+        numerator, denominator = text.split('/')
+        if float(denominator) == 0:
+            return None
+        value = float(numerator) / float(denominator)
+    else:
+        value = float(text)
+    value *= 10.0 ** exponent
+    return value / 100 if percent else value
+
+
+def _tolerance(text):
+    """标准答案数值的允许误差：整数为 0；小数为最后一位的一半（按科学计数法和百分号换算）；
+    分数等没有写出精度的返回 None，按相对误差比较"""
+    text = text.replace(' ', '')
+    if '/' in text:
+        return None
+    match = re.fullmatch(r'[-+]?(\d*)(?:\.(\d*))?(?:\*10\^\(?([-+]?\d+)\)?|[eE]([-+]?\d+))?(%?)', text)
+    if not match:
+        return None
+    decimals = len(match.group(2) or '')
+    if not decimals:
+        return 0.0
+    exponent = int(match.group(3) or match.group(4) or 0)
+    tolerance = 0.5 * 10.0 ** (exponent - decimals)
+    return tolerance / 100 if match.group(5) else tolerance
+
+
+def _unit_key(unit):
+    return re.sub(r'[\s*^]', '', unit or '')
+
+
+def _parse_quantity(text):
+    """解析数值和单位
+
+    Returns:
+        tuple: (数值, 单位, 允许误差)，无法解析时返回 None
+    """
+    match = _QUANTITY.fullmatch(_strip_assignment(text))
+    if not match:
+        return None
+    value = _parse_number(match.group('number'))
+    if value is None or math.isinf(value):
+        return None
+    return value, _unit_key(match.group('unit')), _tolerance(match.group('number'))
+
+
+class QuantityMatcher(Matcher):
+    def __init__(self, value, unit, tolerance=None):
+        self.value = value
+        self.unit = unit
+        self.tolerance = tolerance
+
+    @classmethod
+    def compile(cls, answer):
+        text = canonical(answer)
+        quantity = _parse_quantity(text)
+        if not quantity:
+            return None
+        # “2x” 中的 x 是变量而不是单位，交给 ExpressionMatcher
+        if re.fullmatch(r'[a-z]', quantity[1]) and not re.search(r'\s[a-z]$', text):
+            return None
+        return cls(*quantity)
+
+    def _equal(self, value):
+        if self.tolerance is None:
+            return _close(value, self.value)
+        # 浮点误差：0.1 + 0.2 这样的算式不应因末位误差判错
+        slack = 1e-9 * max(abs(value), abs(self.value), 1)
+        return abs(value - self.value) <= self.tolerance + slack
+
+    def match(self, user_answer):
+        text = canonical(user_answer)
+        quantity = _parse_quantity(text)
+        if quantity is None:
+            # 学生可能写成 √2/2、2^10 这样的算式
+            value = _constant_value(_strip_assignment(text))
+            quantity = (value, '', None) if value is not None else None
+        if quantity is None:
+            return 0.0
+        value, unit, _ = quantity
+        # 没写单位不扣分，写了就要和标准答案一致
+        if unit and unit != self.unit:
+            return 0.0
+        return 1.0 if self._equal(value) else 0.0
+
+
+# ---------- 代数式 ----------
+
+_FUNCTIONS = {
+    'arcsin': 'np.arcsin', 'arccos': 'np.arccos', 'arctan': 'np.arctan',
+    'sqrt': 'np.sqrt', 'sin': 'np.sin', 'cos': 'np.cos', 'tan': 'np.tan',
+    'cot': '1/np.tan', 'sec': '1/np.cos', 'csc': '1/np.sin',
+    'ln': 'np.log', 'lg': 'np.log10', 'log': 'np.log10', 'exp': 'np.exp', 'abs': 'np.abs',
+}
+_CONSTANTS = {'pi': repr(math.pi), 'π': repr(math.pi), 'e': repr(math.e), '∞': 'np.inf'}
+_NAMES = sorted(list(_FUNCTIONS) + list(_CONSTANTS), key=len, reverse=True)
+_TOKEN = re.compile(r'\s*(?:(?P<num>\d+\.?\d*|\.\d+)|(?P<op>[-+*/^(),√∞])|(?P<name>[A-Za-zͰ-Ͽ]))')
+
+
+class _ParseError(ValueError):
+    pass
+
+
+def _tokenize(text):
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise _ParseError(text[position:])
+        position = match.end()
+        if match.group('num'):
+            tokens.append(('num', match.group('num')))
+        elif match.group('op'):
+            op = match.group('op')
+            tokens.append(('const', _CONSTANTS[op]) if op in _CONSTANTS else ('op', op))
+        else:
+            start = match.start('name')
+            name = next((n for n in _NAMES if text.startswith(n, start)), None)
+            if name in _FUNCTIONS:
+                tokens.append(('func', name))
+                position = start + len(name)
+            elif name in _CONSTANTS:
+                tokens.append(('const', _CONSTANTS[name]))
+                position = start + len(name)
+            else:
+                # 单个字母是一个变量，可带下标 y_0
+                subscript = re.match(r'_(\d+)', text[position:])
+                variable = match.group('name')
+                if subscript:
+                    variable += subscript.group()
+                    position += subscript.end()
+                tokens.append(('var', variable))
+    return tokens
+
+
+class _Parser:
+    """把代数式解析为 Python 表达式源码（变量读自字典 v），支持省略乘号、√ 和 ^"""
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+        self.variables = set()
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        token = self.peek()
+        if token[0] is None or (value is not None and token[1] != value):
+            raise _ParseError(value)
+        self.position += 1
+        return token
+
+    def parse(self):
+        source = self.expression()
+        if self.position != len(self.tokens):
+            raise _ParseError(self.peek()[1])
+        return source
+
+    def expression(self):
+        source = self.term()
+        while self.peek() in (('op', '+'), ('op', '-')):
+            source = f'{source} {self.take()[1]} {self.term()}'
+        return source
+
+    def _starts_atom(self):
+        kind, value = self.peek()
+        return kind in ('num', 'var', 'const', 'func') or value in ('(', '√')
+
+    def term(self):
+        source = self.unary()
+        while True:
+            if self.peek() in (('op', '*'), ('op', '/')):
+                operator = self.take()[1]
+                source = f'{source} {operator} {self.unary()}'
+            elif self._starts_atom():
+                source = f'{source} * {self.power()}'
+            else:
+                return source
+
+    def unary(self):
+        if self.peek() in (('op', '-'), ('op', '+')):
+            operator = self.take()[1]
+            return f'({operator}{self.unary()})'
+        return self.power()
+
+    def power(self):
+        source = self.atom()
+        if self.peek() == ('op', '^'):
+            self.take()
+            exponent = self.unary()
+            try:
+                too_large = abs(float(exponent.replace('(', '').replace(')', ''))) > MAX_EXPONENT
+            except ValueError:
+                # 指数不是常数时靠浮点溢出限制计算量
+                too_large = False
+            if too_large:
+                raise _ParseError(exponent)
+            return f'({source} ** {exponent})'
+        return source
+
+    def atom(self):
+        kind, value = self.take()
+        if kind == 'num':
+            # 按浮点数求值，避免 Python 整数的任意精度乘方
+            number = float(value)
+            if number > MAX_LITERAL:
+                raise _ParseError(value)
+            return repr(number)
+        if kind == 'const':
+            return value
+        if kind == 'var':
+            self.variables.add(value)
+            return f'v[{value!r}]'
+        if kind == 'func':
+            return f'{_FUNCTIONS[value]}({self.argument()})'
+        if value == '√':
+            return f'np.sqrt({self.argument()})'
+        if value == '(':
+            source = self.expression()
+            self.take(')')
+            return f'({source})'
+        raise _ParseError(value)
+
+    def argument(self):
+        """函数参数：带括号时取括号内，否则取紧跟的乘积（如 cos2x、√3）"""
+        if self.peek() == ('op', '('):
+            return self.atom()
+        source = self.power()
+        while self.peek()[0] in ('num', 'var', 'const'):
+            source = f'{source} * {self.power()}'
+        return source
+
+
+# 出现运算符、数字或等号时才把相邻字母当作乘积
+_MATH_CHARS = re.compile(r'[\d=+\-*/^()√²³·×÷]')
+
+
+def _looks_like_words(text):
+    """判断是否为英文单词，是则不按乘积解析（否则 “the” 会等于 “eth”，“is” 会等于 “si”）
+
+    去掉函数名后：没有运算符、数字和等号时，两个以上相连的字母就视为单词；
+    有运算符时（如 “3mg - 2mgcosθ”）连续三个以上字母才视为单词。
+    """
+    shortest = 3 if _MATH_CHARS.search(text) else 2
+    for run in re.findall('[A-Za-z]+', text):
+        for name in _NAMES:
+            if len(name) > 1:
+                run = run.replace(name, ' ')
+        if any(len(part) >= shortest for part in run.split()):
+            return True
+    return False
+
+
+def _compile_expression(text):
+    """解析代数式或方程
+
+    Returns:
+        tuple: (编译后的代码, 变量集合, 是否为方程)，无法解析时返回 None
+    """
+    if _looks_like_words(text):
+        return None
+    sides = text.split('=')
+    if len(sides) > 2 or not all(side.strip() for side in sides):
+        return None
+    try:
+        parsed = []
+        variables = set()
+        for side in sides:
+            parser = _Parser(_tokenize(side))
+            parsed.append(parser.parse())
+            variables |= parser.variables
+    except _ParseError:
+        return None
+    source = parsed[0] if len(parsed) == 1 else f'({parsed[0]}) - ({parsed[1]})'
+    return compile(source, '<answer>', 'eval'), frozenset(variables), len(sides) == 2
+
+
+def _points(variables):
+    """变量的随机取值（固定种子，结果可重复），取正数避免开方和对数无意义"""
+    rng = np.random.default_rng(20240601)
+    return {name: rng.uniform(0.5, 2.5, SAMPLES) for name in sorted(variables)}
+
+
+def _evaluate(code, variables):
+    with np.errstate(all='ignore'):
+        try:
+            values = eval(code, {'np': np, '__builtins__': {}}, {'v': _points(variables)})
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+    return np.broadcast_to(np.asarray(values, dtype=float), (SAMPLES,))
+
+
+def _constant_value(text):
+    compiled = _compile_expression(text)
+    if not compiled or compiled[1] or compiled[2]:
+        return None
+    values = _evaluate(compiled[0], compiled[1])
+    if values is None or np.isnan(values[0]):
+        return None
+    return float(values[0])
+
+
+class ExpressionMatcher(Matcher):
+    """代数式或方程
+
+    “y = 2x + 1” 这样的答案同时保存方程形式和去掉 “y =” 后的代数式形式，
+    学生写成方程（包括移项、两边同乘常数）或只写右边都能判对。
+    """
+    def __init__(self, forms):
+        # {是否为方程: (变量集合, 各取值点上的值)}
+        self.forms = forms
+
+    @classmethod
+    def compile(cls, answer):
+        text = canonical(answer)
+        forms = {}
+        for candidate in dict.fromkeys([text, _strip_assignment(text)]):
+            compiled = _compile_expression(candidate)
+            if not compiled:
+                continue
+            code, variables, equation = compiled
+            values = _evaluate(code, variables)
+            if values is not None and np.isfinite(values).any():
+                forms.setdefault(equation, (variables, values))
+        return cls(forms) if forms else None
+
+    def match(self, user_answer):
+        text = canonical(user_answer)
+        compiled = _compile_expression(text)
+        if compiled and compiled[2] and True not in self.forms:
+            # 标准答案是代数式，学生写了 “x = …”
+            compiled = _compile_expression(_strip_assignment(text))
+        if not compiled or compiled[2] not in self.forms:
+            return 0.0
+        code, variables, equation = compiled
+        expected_variables, expected = self.forms[equation]
+        if variables != expected_variables:
+            return 0.0
+        values = _evaluate(code, variables)
+        if values is None:
+            return 0.0
+        if not variables:
+            return 1.0 if _close(float(values[0]), float(expected[0])) else 0.0
+
+        valid = np.isfinite(values) & np.isfinite(expected)
+        if valid.sum() < SAMPLES // 2:
+            return 0.0
+        expected, actual = expected[valid], values[valid]
+        if equation:
+            # 方程两边同乘非零常数仍等价：比值应为常数
+            nonzero = np.abs(expected) > 1e-12
+            if not nonzero.any() or not np.allclose(actual[~nonzero], 0, atol=1e-9):
+                return 0.0
+            ratios = actual[nonzero] / expected[nonzero]
+            equal = abs(ratios[0]) > 1e-12 and np.allclose(ratios, ratios[0], rtol=EXPR_TOLERANCE)
+        else:
+            equal = np.allclose(actual, expected, rtol=EXPR_TOLERANCE, atol=1e-9)
+        return 1.0 if equal else 0.0
+
+
+# ---------- 坐标、区间 ----------
+
+class SequenceMatcher(Matcher):
+    def __init__(self, brackets, items):
+        self.brackets = brackets
+        self.items = items
+
+    @staticmethod
+    def _split(text):
+        if len(text) < 2 or text[0] not in '([' or text[-1] not in ')]':
+            return None
+        # 第一个括号要到最后才闭合，排除 “(1)+(2)” 这样的式子
+        depth = 0
+        for char in text[:-1]:
+            depth += (char in '([') - (char in ')]')
+            if depth == 0:
+                return None
+        items = _split_top_level(text[1:-1], [','])
+        return (text[0] + text[-1], items) if len(items) >= 2 else None
+
+    @classmethod
+    def compile(cls, answer):
+        split = cls._split(canonical(answer))
+        if not split:
+            return None
+        brackets, items = split
+        matchers = [QuantityMatcher.compile(item) or ExpressionMatcher.compile(item) for item in items]
+        if not all(matchers):
+            return None
+        return cls(brackets, matchers)
+
+    def match(self, user_answer):
+        split = self._split(canonical(user_answer))
+        if not split or split[0] != self.brackets or len(split[1]) != len(self.items):
+            return 0.0
+        return 1.0 if all(m.match(item) == 1 for m, item in zip(self.items, split[1])) else 0.0
+
+
+class TextMatcher(Matcher):
+    """文本答案：忽略大小写、空白、全半角和首尾标点"""
+    def __init__(self, key):
+        self.key = key
+
+    @classmethod
+    def compile(cls, answer):
+        return cls(_text_key(answer))
+
+    def match(self, user_answer):
+        return 1.0 if _text_key(user_answer) == self.key else 0.0
+
+
+MATCHERS.extend([ChoiceMatcher, PartsMatcher, AlternativesMatcher, SequenceMatcher,
+                 QuantityMatcher, ExpressionMatcher])
+
+
+def compile_answer(answer):
+    """把标准答案编译为判题器，依次尝试已注册的判题器，都不适用时按文本比较"""
+    for matcher_class in MATCHERS:
+        matcher = matcher_class.compile(answer)
+        if matcher is not None:
+            return _WithText(matcher, answer)
+    return TextMatcher.compile(answer)
+
+
+class _WithText(Matcher):
+    """学生答案与标准答案文本相同时直接判对，不依赖具体判题器的解析"""
+    def __init__(self, matcher, answer):
+        self.matcher = matcher
+        self.key = _text_key(answer)
+
+    def match(self, user_answer):
+        if _text_key(user_answer) == self.key:
+            return 1.0
+        return self.matcher.match(user_answer)
+
+
+@lru_cache(maxsize=MATCHER_CACHE_SIZE)
+def _cached_matcher(problem_id, answer):
+    return compile_answer(answer)
+
+
+def matcher_for(problem):
+    """题目的判题器，按 (题目id, 标准答案) 缓存"""
+    return _cached_matcher(problem.id, problem.answer or '')
+
+
+def grade_score(score):
+    """0~1 的得分转换为作答状态和百分制分数"""
+    if score >= 1:
+        return Grade('correct', 100)
+    if score > 0:
+        return Grade('partially_correct', round(score * 100, 1))
+    return Grade('incorrect', 0)
+
+
+def grade(problem, user_answer):
+    """给学生答案判分
+
+    Returns:
+        Grade: (status, score)，status 为 correct / partially_correct / incorrect / skipped
+    """
+    if not (user_answer or '').strip():
+        return Grade('skipped', 0)
+    try:
+        score = matcher_for(problem).match(user_answer)
+    except Exception:
+        # 判题器出错时退回到文本比较，不影响提交
+        score = TextMatcher.compile(problem.answer).match(user_answer)
+    return grade_score(score)
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from problems import stats
+
+class Command(BaseCommand):
+    help = '检查用户做题统计与作答记录是否一致'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='只检查指定用户id，可重复')
+        parser.add_argument('--fix', action='store_true', help='重建不一致用户的统计')
+
+    def handle(self, *args, **options):
+        mismatched = stats.check(options['user_ids'])
+        if not mismatched:
+            self.stdout.write(self.style.SUCCESS('统计与作答记录一致'))
+            return
+        self.stdout.write(self.style.WARNING(f'{len(mismatched)} 个用户的统计不一致: {mismatched[:50]}'))
+        if options['fix']:
+            stats.rebuild(mismatched)
+            self.stdout.write(self.style.SUCCESS('已重建这些用户的统计'))
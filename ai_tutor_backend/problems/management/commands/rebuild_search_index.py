@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from problems import search
+
+class Command(BaseCommand):
+    help = '重建题库全文检索索引（SQLite FTS5）'
+
+    def handle(self, *args, **options):
+        if not search.create_index_table():
+            self.stdout.write(self.style.ERROR('当前数据库不支持 FTS5 全文索引，题目检索将使用普通模糊查询'))
+            return
+
+        start = time.time()
+        count = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'已为 {count} 道题目建立索引，用时 {time.time() - start:.2f} 秒'))
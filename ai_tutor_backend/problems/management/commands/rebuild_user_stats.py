@@ -0,0 +1,15 @@
+import time
+from django.core.management.base import BaseCommand
+from problems import stats
+
+class Command(BaseCommand):
+    help = '从作答记录重新计算用户做题统计（上线时回填，或修复 check_user_stats 发现的不一致）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='只重建指定用户id，可重复')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        users, topics = stats.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'已重建 {users} 个用户的统计（{topics} 行知识点统计），用时 {time.time() - start:.2f} 秒'))
@@ -0,0 +1,27 @@
+import time
+from django.core.management.base import BaseCommand
+from problems import ability
+
+class Command(BaseCommand):
+    help = '用全部作答记录重新标定题目难度参数和学生能力值（建议每晚运行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20, help='迭代次数')
+        parser.add_argument('--prior-weight', type=float, default=1.0, help='难度等级先验的权重')
+        parser.add_argument('--no-abilities', action='store_true', help='只更新题目难度，不覆盖学生能力值')
+
+    def handle(self, *args, **options):
+        start = time.time()
+        result = ability.recalibrate(
+            iterations=options['iterations'],
+            prior_weight=options['prior_weight'],
+            update_abilities=not options['no_abilities'],
+        )
+        if not result['records']:
+            self.stdout.write(self.style.WARNING('没有作答记录，无需标定'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f"已用 {result['records']} 条作答记录标定 {result['problems']} 道题目、"
+            f"{result['abilities']} 个学生知识点能力值，对数似然 {result['log_likelihood']}，"
+            f"用时 {time.time() - start:.2f} 秒"
+        ))
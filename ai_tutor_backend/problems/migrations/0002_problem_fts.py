@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def create_fts_index(apps, schema_editor):
+    """仅在 SQLite 上创建 FTS5 全文索引并为已有题目建立索引，其他数据库跳过"""
+    from problems import search
+    if search.create_index_table(schema_editor):
+        search.rebuild_index(apps.get_model('problems', 'Problem'))
+
+
+def drop_fts_index(apps, schema_editor):
+    from problems import search
+    search.drop_index_table(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# 迁移时的难度初始值，与 ability.DIFFICULTY_PRIORS 当时的取值相同，之后修改 ability.py 不影响本迁移
+DIFFICULTY_PRIORS = {'简单': -1.0, '中等': 0.0, '较难': 1.0, '困难': 2.0}
+
+
+def init_difficulty_ratings(apps, schema_editor):
+    """已有题目的难度参数取难度等级对应的初始值"""
+    Problem = apps.get_model('problems', 'Problem')
+    for label, rating in DIFFICULTY_PRIORS.items():
+        Problem.objects.filter(difficulty=label).update(difficulty_rating=rating)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0003_problem_topic_difficulty_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TopicAbility',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rating', models.FloatField(default=0.0)),
+                ('attempts', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='problem',
+            name='difficulty_rating',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddIndex(
+            model_name='problem',
+            index=models.Index(fields=['topic', 'difficulty_rating'], name='problem_topic_rating_idx'),
+        ),
+        migrations.AddField(
+            model_name='topicability',
+            name='topic',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='abilities', to='problems.topic'),
+        ),
+        migrations.AddField(
+            model_name='topicability',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_abilities', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterUniqueTogether(
+            name='topicability',
+            unique_together={('user', 'topic')},
+        ),
+        migrations.RunPython(init_difficulty_ratings, migrations.RunPython.noop),
+    ]
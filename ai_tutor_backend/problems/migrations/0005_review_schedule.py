@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:43
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def schedule_existing_mistakes(apps, schema_editor):
+    """已有的错题在作答后第二天进入复习队列"""
+    UserProblemRecord = apps.get_model('problems', 'UserProblemRecord')
+    UserProblemRecord.objects.filter(status__in=['incorrect', 'partially_correct']).update(
+        review_due=F('attempted_at') + timedelta(days=1), review_interval=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0004_topic_ability'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userproblemrecord',
+            name='review_due',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userproblemrecord',
+            name='review_ease',
+            field=models.FloatField(default=2.5),
+        ),
+        migrations.AddField(
+            model_name='userproblemrecord',
+            name='review_interval',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userproblemrecord',
+            name='review_repetitions',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='userproblemrecord',
+            index=models.Index(fields=['user', 'review_due'], name='record_user_review_due_idx'),
+        ),
+        migrations.RunPython(schedule_existing_mistakes, migrations.RunPython.noop),
+    ]
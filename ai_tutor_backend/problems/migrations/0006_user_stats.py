@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+COUNTER_FIELDS = ('total_attempted', 'correct_count', 'incorrect_count',
+                  'partially_correct_count', 'skipped_count', 'score_sum')
+
+
+def backfill_user_stats(apps, schema_editor):
+    """从已有作答记录计算统计（逻辑复制自当时的 stats.rebuild，之后修改 stats.py 不影响本迁移）"""
+    UserProblemRecord = apps.get_model('problems', 'UserProblemRecord')
+    UserStats = apps.get_model('problems', 'UserStats')
+    UserTopicStats = apps.get_model('problems', 'UserTopicStats')
+    rows = (UserProblemRecord.objects
+            .values('user_id', 'problem__topic_id', 'problem__difficulty').order_by()
+            .annotate(total_attempted=Count('id'),
+                      correct_count=Count('id', filter=Q(status='correct')),
+                      incorrect_count=Count('id', filter=Q(status='incorrect')),
+                      partially_correct_count=Count('id', filter=Q(status='partially_correct')),
+                      skipped_count=Count('id', filter=Q(status='skipped')),
+                      score_sum=Sum('score')))
+    users = {}
+    topic_stats = []
+    for row in rows.iterator():
+        counts = {field: row[field] or 0 for field in COUNTER_FIELDS}
+        topic_stats.append(UserTopicStats(user_id=row['user_id'], topic_id=row['problem__topic_id'],
+                                          difficulty=row['problem__difficulty'], **counts))
+        total = users.setdefault(row['user_id'], dict.fromkeys(COUNTER_FIELDS, 0))
+        for field in COUNTER_FIELDS:
+            total[field] += counts[field]
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **counts) for user_id, counts in users.items()], batch_size=1000)
+    UserTopicStats.objects.bulk_create(topic_stats, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0005_review_schedule'),
+        ('users', '0002_remove_user_is_teacher_remove_user_join_date_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='problem_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total_attempted', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('incorrect_count', models.IntegerField(default=0)),
+                ('partially_correct_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UserTopicStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('difficulty', models.CharField(choices=[('简单', '简单'), ('中等', '中等'), ('较难', '较难'), ('困难', '困难')], max_length=10)),
+                ('total_attempted', models.IntegerField(default=0)),
+                ('correct_count', models.IntegerField(default=0)),
+                ('incorrect_count', models.IntegerField(default=0)),
+                ('partially_correct_count', models.IntegerField(default=0)),
+                ('skipped_count', models.IntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('topic', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_stats', to='problems.topic')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='topic_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'topic', 'difficulty')},
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def copy_latest_records(apps, schema_editor):
+    """之前只保存了每道题最近一次的作答，作为历史的起点"""
+    UserProblemRecord = apps.get_model('problems', 'UserProblemRecord')
+    ProblemAttempt = apps.get_model('problems', 'ProblemAttempt')
+    batch = []
+    fields = ('user_id', 'problem_id', 'user_answer', 'status', 'score', 'time_spent', 'attempted_at')
+    for row in UserProblemRecord.objects.order_by('id').values_list(*fields).iterator(chunk_size=2000):
+        batch.append(ProblemAttempt(**dict(zip(fields, row))))
+        if len(batch) >= 2000:
+            ProblemAttempt.objects.bulk_create(batch)
+            batch = []
+    ProblemAttempt.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('problems', '0006_user_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProblemAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_answer', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('correct', '正确'), ('incorrect', '错误'), ('partially_correct', '部分正确'), ('skipped', '跳过')], max_length=20)),
+                ('score', models.FloatField(default=0)),
+                ('time_spent', models.IntegerField(default=0)),
+                ('attempted_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='problems.problem')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='problem_attempts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'attempted_at'], name='attempt_user_time_idx')],
+            },
+        ),
+        migrations.RunPython(copy_latest_records, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from users.models import User  # 修改导入路径
 
 class Subject(models.Model):
@@ -34,7 +35,17 @@ class Problem(models.Model):
     answer = models.TextField()
     explanation = models.TextField()
     difficulty = models.CharField(max_length=10, choices=DIFFICULTY_CHOICES)
+    # 难度参数（logit尺度，与学生能力值可直接比较），初始值由难度等级给出，定期由作答记录重新标定
+    difficulty_rating = models.FloatField(default=0.0)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # 按知识点和难度筛选题目
+            models.Index(fields=['topic', 'difficulty'], name='problem_topic_difficulty_idx'),
+            # 按知识点和难度参数区间取题（按能力推荐）
+            models.Index(fields=['topic', 'difficulty_rating'], name='problem_topic_rating_idx'),
+        ]
     
     def __str__(self):
         return f"{self.topic.name} - {self.title[:30]}"
@@ -55,6 +66,74 @@ class UserProblemRecord(models.Model):
     score = models.FloatField(default=0)  # 得分(0-100)
     time_spent = models.IntegerField(default=0)  # 花费时间(秒)
     attempted_at = models.DateTimeField(auto_now_add=True)
+    # 错题复习排期（SM-2），review_due 为空表示不在复习队列中
+    review_due = models.DateTimeField(null=True, blank=True)
+    review_interval = models.IntegerField(default=0)  # 当前复习间隔(天)
+    review_ease = models.FloatField(default=2.5)  # 熟练度系数
+    review_repetitions = models.IntegerField(default=0)  # 连续复习正确的次数
     
     class Meta:
-        unique_together = ('user', 'problem')  # 每个用户对每道题只有一条最新记录
\ No newline at end of file
+        unique_together = ('user', 'problem')  # 每个用户对每道题只有一条最新记录
+        indexes = [
+            # 查询某个学生到期的复习题
+            models.Index(fields=['user', 'review_due'], name='record_user_review_due_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # 记住从数据库读出时的作答结果，保存时据此增量更新统计
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_result = (instance.__dict__.get('status'), instance.__dict__.get('score'))
+        return instance
+
+class ProblemAttempt(models.Model):
+    """作答历史（只追加不修改），UserProblemRecord 是其中每道题最近一次的结果"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='problem_attempts')
+    problem = models.ForeignKey(Problem, on_delete=models.CASCADE, related_name='attempts')
+    user_answer = models.TextField(blank=True, null=True)
+    status = models.CharField(max_length=20, choices=UserProblemRecord.STATUS_CHOICES)
+    score = models.FloatField(default=0)
+    time_spent = models.IntegerField(default=0)
+    attempted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # 按时间查询某个学生的作答历史
+            models.Index(fields=['user', 'attempted_at'], name='attempt_user_time_idx'),
+        ]
+
+class TopicAbility(models.Model):
+    """学生在某个知识点上的能力估计（Elo/Rasch 模型，logit尺度）"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='topic_abilities')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='abilities')
+    rating = models.FloatField(default=0.0)
+    attempts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('user', 'topic')
+
+class UserStats(models.Model):
+    """用户做题统计汇总，作答记录变化时增量更新"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='problem_stats')
+    total_attempted = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    incorrect_count = models.IntegerField(default=0)
+    partially_correct_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+
+class UserTopicStats(models.Model):
+    """用户在某知识点某难度上的做题统计，按学科汇总时关联 topic__subject"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='topic_stats')
+    topic = models.ForeignKey(Topic, on_delete=models.CASCADE, related_name='user_stats')
+    difficulty = models.CharField(max_length=10, choices=Problem.DIFFICULTY_CHOICES)
+    total_attempted = models.IntegerField(default=0)
+    correct_count = models.IntegerField(default=0)
+    incorrect_count = models.IntegerField(default=0)
+    partially_correct_count = models.IntegerField(default=0)
+    skipped_count = models.IntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'topic', 'difficulty')
@@ -0,0 +1,185 @@
+"""题目推荐
+
+按知识点近期错误率加权抽取知识点，再在每个知识点内按随机 id 区间取题，
+并排除学生已经做对的题目。
+
+- 不再把候选题目全部读入内存：每个知识点在该知识点自己的 id 范围内取一个
+  随机起点，沿知识点外键索引（SQLite 的索引按 (topic_id, id) 排序）读取一小段，
+  题库变大时耗时基本不变。
+- 学生在各知识点上有能力估计（见 ability.py）时，只取难度参数落在
+  该能力值附近的题目，使题目难度跟随学生的实际水平变化。
+- 已做对的题目用位图（Python 整数，第 i 位表示 id 为 i 的题目）保存在
+  Django 缓存中。作答记录变化时直接删除缓存，下次使用时从作答记录重建；
+  删除是原子操作，并发提交不会像“读出-修改-写回”那样丢失更新。
+  未配置 CACHES 时使用各进程独立的本地内存缓存，删除只对当前进程生效，
+  其他进程最多在 SOLVED_CACHE_TIMEOUT 内使用旧的位图；多进程部署时应配置
+  Redis、Memcached 等共享缓存。
+"""
+import random
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from . import ability
+from .models import Topic, Problem, UserProblemRecord
+
+# 计算错误率时只看最近这些天的作答
+RECENT_DAYS = 30
+# 每个知识点每次读取的题目数 = 需要的题目数 * WINDOW_FACTOR + WINDOW_EXTRA
+WINDOW_FACTOR = 3
+WINDOW_EXTRA = 10
+SOLVED_CACHE_TIMEOUT = 300
+ID_RANGE_CACHE_TIMEOUT = 300
+
+WRONG_STATUSES = ('incorrect', 'partially_correct')
+
+
+def _solved_key(user_id):
+    return f'problems:solved:{user_id}'
+
+
+def get_solved_bitmap(user_id):
+    """返回用户已做对题目的位图，缓存未命中时从作答记录重建"""
+    key = _solved_key(user_id)
+    bitmap = cache.get(key)
+    if bitmap is None:
+        bitmap = 0
+        solved = UserProblemRecord.objects.filter(user_id=user_id, status='correct')
+        for problem_id in solved.values_list('problem_id', flat=True).iterator():
+            bitmap |= 1 << problem_id
+        cache.set(key, bitmap, SOLVED_CACHE_TIMEOUT)
+    return bitmap
+
+
+def invalidate_solved(user_id):
+    """作答记录变化后删除缓存中的位图，下次使用时重建"""
+    cache.delete(_solved_key(user_id))
+
+
+def is_solved(bitmap, problem_id):
+    return bitmap >> problem_id & 1 == 1
+
+
+def _id_range_key(topic_id):
+    return f'problems:id_range:{topic_id}'
+
+
+def topic_id_ranges(topic_ids):
+    """各知识点题目 id 的最小值和最大值，未缓存的知识点合并为一次分组查询，并短暂缓存
+
+    Returns:
+        dict: 知识点id -> (最小id, 最大id)，没有题目的知识点为 (None, None)
+    """
+    keys = {topic_id: _id_range_key(topic_id) for topic_id in topic_ids}
+    cached = cache.get_many(keys.values())
+    ranges = {topic_id: cached[key] for topic_id, key in keys.items() if key in cached}
+
+    missing = [topic_id for topic_id in topic_ids if topic_id not in ranges]
+    if missing:
+        rows = (Problem.objects.filter(topic_id__in=missing)
+                .values('topic_id').order_by()
+                .annotate(low=Min('id'), high=Max('id')))
+        computed = dict.fromkeys(missing, (None, None))
+        computed.update({row['topic_id']: (row['low'], row['high']) for row in rows})
+        cache.set_many({keys[topic_id]: id_range for topic_id, id_range in computed.items()},
+                       ID_RANGE_CACHE_TIMEOUT)
+        ranges.update(computed)
+    return ranges
+
+
+def topic_weights(user, topic_ids):
+    """按最近的错误率给知识点加权
+
+    权重为平滑后的错误率 (错误数 + 1) / (作答数 + 2)，
+    没有作答过的知识点为 0.5，全部做对的知识点权重较低但仍有机会被选中。
+
+    Returns:
+        dict: 知识点id -> 权重
+    """
+    since = timezone.now() - timedelta(days=RECENT_DAYS)
+    stats = (UserProblemRecord.objects
+             .filter(user=user, attempted_at__gte=since, problem__topic_id__in=topic_ids)
+             .values('problem__topic_id')
+             .annotate(attempts=Count('id'), errors=Count('id', filter=Q(status__in=WRONG_STATUSES))))
+    weights = {topic_id: 0.5 for topic_id in topic_ids}
+    for row in stats:
+        weights[row['problem__topic_id']] = (row['errors'] + 1) / (row['attempts'] + 2)
+    return weights
+
+
+def _sample_topic(topic_id, need, solved, exclude, id_range, rating_range=None):
+    """在一个知识点内从随机 id 起点取题，不足时从头部补齐
+
+    Args:
+        id_range: 该知识点题目 id 的 (最小值, 最大值)，起点在其中均匀抽取
+        rating_range: 限定难度参数区间 (下限, 上限)，为空时不限难度
+    """
+    low, high = id_range
+    if low is None:
+        return []
+    pivot = random.randint(low, high)
+    base = Problem.objects.select_related('topic__subject').filter(topic_id=topic_id)
+    if rating_range:
+        base = base.filter(difficulty_rating__range=rating_range)
+    window = need * WINDOW_FACTOR + WINDOW_EXTRA
+
+    candidates = []
+    for queryset in (base.filter(id__gte=pivot), base.filter(id__lt=pivot)):
+        rows = list(queryset.order_by('id')[:window])
+        candidates.extend(p for p in rows if not is_solved(solved, p.id) and p.id not in exclude)
+        if len(candidates) >= need:
+            break
+    return random.sample(candidates, min(need, len(candidates)))
+
+
+def recommend_problems(user, count=10, subjects=None, academic_level=None):
+    """为学生推荐题目
+
+    每个知识点只取难度参数在学生当前能力附近的题目，不足时用其他难度补齐。
+
+    Args:
+        user: 学生
+        count: 推荐数量
+        subjects: 限定的学科名称列表（如薄弱学科），为空时不限
+        academic_level: 学业水平，作为学生尚未作答的知识点的初始能力
+
+    Returns:
+        list: Problem 列表（已 select_related 知识点和学科）
+    """
+    topics = Topic.objects.all()
+    if subjects:
+        topics = topics.filter(subject__name__in=subjects)
+    topic_ids = list(topics.values_list('id', flat=True))
+    if not topic_ids:
+        return []
+
+    solved = get_solved_bitmap(user.id)
+    weights = topic_weights(user, topic_ids)
+    abilities = ability.topic_abilities(user, topic_ids, academic_level)
+    ranges = {topic_id: ability.target_range(theta) for topic_id, theta in abilities.items()}
+    id_ranges = topic_id_ranges(topic_ids)
+    picked = []
+    chosen = set()
+
+    for limited in (True, False):
+        need = count - len(picked)
+        if need <= 0:
+            break
+        # 按权重抽取知识点，再在各知识点内取题；题目不足的知识点换其他知识点继续
+        remaining = dict(weights)
+        while need > 0 and remaining:
+            ids = list(remaining)
+            quota = Counter(random.choices(ids, weights=[remaining[i] for i in ids], k=need))
+            for topic_id, topic_need in quota.items():
+                rating_range = ranges[topic_id] if limited else None
+                problems = _sample_topic(topic_id, topic_need, solved, chosen, id_ranges[topic_id],
+                                         rating_range=rating_range)
+                picked.extend(problems)
+                chosen.update(p.id for p in problems)
+                if len(problems) < topic_need:
+                    remaining.pop(topic_id)
+            need = count - len(picked)
+    return picked[:count]
@@ -0,0 +1,90 @@
+"""错题复习排期
+
+按 SM-2 间隔重复算法为错题安排下次复习的时间：
+- 做错（或部分正确）的题目第二天进入复习队列；
+- 复习时做对则间隔按熟练度系数逐次拉长（1天、6天、之后乘以系数），
+  做错则间隔重置为1天并降低熟练度系数；
+- 间隔超过 MASTERED_INTERVAL 天视为已掌握，移出复习队列。
+
+到期时间保存在 UserProblemRecord.review_due 上，配合 (user, review_due) 索引，
+“今天要复习的题”只需一次按索引的范围查询。
+"""
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import UserProblemRecord
+
+EASE_INITIAL = 2.5
+EASE_MIN = 1.3
+MASTERED_INTERVAL = 60
+# schedule() 会修改的字段，批量保存时使用
+REVIEW_FIELDS = ('review_due', 'review_interval', 'review_ease', 'review_repetitions')
+
+
+def quality_of(status, score):
+    """作答结果转换为 SM-2 的回答质量（0~5），3 及以上视为记住了"""
+    if status == 'correct':
+        return 5
+    if status == 'partially_correct':
+        return 3 if score >= 60 else 2
+    if status == 'incorrect':
+        return 1
+    return 0
+
+
+def schedule(record, now=None):
+    """根据本次作答结果更新记录的复习排期（只修改字段，不保存）
+
+    Args:
+        record: UserProblemRecord，status 和 score 已是本次作答的结果
+        now: 当前时间，默认 timezone.now()
+
+    Returns:
+        UserProblemRecord: 同一条记录
+    """
+    now = now or timezone.now()
+    quality = quality_of(record.status, record.score)
+    in_queue = record.review_due is not None
+
+    if not in_queue:
+        # 不在复习队列中：做错才加入，做对或跳过不需要复习
+        if quality < 3 and record.status != 'skipped':
+            record.review_repetitions = 0
+            record.review_interval = 1
+            record.review_ease = EASE_INITIAL
+            record.review_due = now + timedelta(days=1)
+        return record
+
+    if quality < 3:
+        record.review_repetitions = 0
+        record.review_interval = 1
+    else:
+        if record.review_repetitions == 0:
+            record.review_interval = 1
+        elif record.review_repetitions == 1:
+            record.review_interval = 6
+        else:
+            record.review_interval = round(record.review_interval * record.review_ease)
+        record.review_repetitions += 1
+    record.review_ease = max(EASE_MIN, record.review_ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+
+    if record.review_interval > MASTERED_INTERVAL:
+        record.review_due = None
+    else:
+        record.review_due = now + timedelta(days=record.review_interval)
+    return record
+
+
+def end_of_today(now=None):
+    """本地时区下一天的零点，到期时间早于它的题目都算今天要复习"""
+    today = timezone.localtime(now or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=1)
+
+
+def due_records(user, now=None):
+    """用户今天（本地时区）到期需要复习的错题，按到期时间排序（走 (user, review_due) 索引）"""
+    return (UserProblemRecord.objects
+            .filter(user=user, review_due__lt=end_of_today(now))
+            .select_related('problem__topic__subject')
+            .order_by('review_due', 'id'))
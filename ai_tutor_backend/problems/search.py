@@ -0,0 +1,203 @@
+"""题库全文检索
+
+使用 SQLite FTS5 建立倒排索引，代替 SearchFilter 的 LIKE '%...%' 全表扫描。
+FTS5 自带的分词器不能切分中文，这里在写入和查询前自行分词：
+连续的中日韩文字切成重叠的二元组(bigram)，英文和数字按单词切分并转小写，
+然后以空格连接交给 unicode61 分词器。相关度用 bm25 计算，标题权重最高。
+
+非 SQLite 数据库或 SQLite 未编译 FTS5 时 is_available() 返回 False，
+调用方应退回到普通的模糊查询。
+"""
+import logging
+import re
+
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'problems_problem_fts'
+# 与建表语句中的列顺序一致：标题、知识点、学科、题干
+FTS_COLUMNS = ('title', 'topic', 'subject', 'content')
+# bm25 各列权重
+FTS_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_CJK = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[0-9A-Za-z_]+')
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+_available = None
+
+
+def tokenize(text):
+    """切分为检索词：中文切成二元组，单个汉字保留原样，英文数字按单词切分"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text or ''):
+        word = match.group()
+        if _CJK_RE.match(word):
+            if len(word) == 1:
+                tokens.append(word)
+            else:
+                tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+
+def _index_text(text):
+    return ' '.join(tokenize(text))
+
+
+def create_index_table(schema_editor=None):
+    """创建 FTS5 虚拟表，SQLite 不支持 FTS5 时返回 False"""
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor != 'sqlite':
+        return False
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"{', '.join(FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2')"
+            )
+    except Exception as e:
+        logger.warning(f"无法创建全文索引表（SQLite 可能未启用 FTS5）: {e}")
+        return False
+    global _available
+    _available = None
+    return True
+
+
+def drop_index_table(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if conn.vendor == 'sqlite':
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def is_available():
+    """当前数据库中是否存在全文索引表，结果在进程内缓存"""
+    global _available
+    if _available is None:
+        _available = (connection.vendor == 'sqlite'
+                      and FTS_TABLE in connection.introspection.table_names())
+    return _available
+
+
+def _row(problem):
+    topic = problem.topic
+    return (
+        problem.id,
+        _index_text(problem.title),
+        _index_text(topic.name),
+        _index_text(topic.subject.name),
+        _index_text(problem.content),
+    )
+
+
+def _write_rows(cursor, rows):
+    cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, {', '.join(FTS_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)",
+        rows,
+    )
+
+
+def index_problems(problems):
+    """写入或更新若干道题目的索引，problems 应已 select_related('topic__subject')"""
+    if not is_available():
+        return
+    rows = [_row(problem) for problem in problems]
+    if rows:
+        with connection.cursor() as cursor:
+            _write_rows(cursor, rows)
+
+
+def remove_problems(problem_ids):
+    if not is_available() or not problem_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(pk,) for pk in problem_ids])
+
+
+def rebuild_index(problem_model=None, batch_size=2000):
+    """清空并重建全部索引
+
+    Args:
+        problem_model: 题目模型，迁移中传入历史模型，默认使用当前模型
+        batch_size: 每批写入的题目数
+
+    Returns:
+        int: 建立索引的题目数
+    """
+    if problem_model is None:
+        from .models import Problem as problem_model
+    count = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        queryset = problem_model.objects.select_related('topic__subject').order_by('id')
+        batch = []
+        for problem in queryset.iterator(chunk_size=batch_size):
+            batch.append(_row(problem))
+            if len(batch) >= batch_size:
+                _write_rows(cursor, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            _write_rows(cursor, batch)
+            count += len(batch)
+        # 合并索引段，提高之后的查询速度
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return count
+
+
+def _match_terms(query):
+    """把用户输入转换为 FTS5 检索词，单个汉字按前缀匹配"""
+    terms = []
+    for token in dict.fromkeys(tokenize(query)):
+        quoted = '"' + token.replace('"', '""') + '"'
+        terms.append(quoted + '*' if len(token) == 1 and _CJK_RE.match(token) else quoted)
+    return terms
+
+
+def build_match_query(query):
+    """所有检索词都出现的题目优先；没有这样的题目时（如输入“函数极值”而题目写作
+    “函数的极值”）改为出现任一检索词即可，由 bm25 把命中词多的排在前面"""
+    terms = _match_terms(query)
+    if len(terms) <= 1:
+        return terms[0] if terms else ''
+    match = ' AND '.join(terms)
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT 1", [match])
+        if cursor.fetchone():
+            return match
+    return ' OR '.join(terms)
+
+
+def search(query, queryset=None, limit=50, offset=0):
+    """按相关度检索题目
+
+    Args:
+        query: 检索内容
+        queryset: 限定范围的题目查询集（如按知识点、难度过滤后的结果）
+        limit: 返回数量
+        offset: 跳过的数量
+
+    Returns:
+        list: [(题目id, 相关度得分)]，得分越高越相关
+    """
+    match = build_match_query(query)
+    if not match:
+        return []
+    weights = ', '.join(str(w) for w in FTS_WEIGHTS)
+    sql = f"SELECT rowid, bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+    params = [match]
+    if queryset is not None and queryset.query.where:
+        sub_sql, sub_params = queryset.order_by().values('id').query.sql_with_params()
+        # +rowid 防止 SQLite 把 IN 条件下推给 FTS5 逐行查找，子查询只执行一次
+        sql += f" AND +rowid IN ({sub_sql})"
+        params.extend(sub_params)
+    sql += " ORDER BY rank LIMIT %s OFFSET %s"
+    params.extend([limit, offset])
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        # bm25 越小越相关，取反后作为得分
+        return [(row[0], round(-row[1], 4)) for row in cursor.fetchall()]
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Subject, Topic, Problem, UserProblemRecord
+from .models import Subject, Topic, Problem, UserProblemRecord, ProblemAttempt
+from .submission import MAX_ANSWERS
 
 class SubjectSerializer(serializers.ModelSerializer):
     class Meta:
@@ -13,7 +14,25 @@ class TopicSerializer(serializers.ModelSerializer):
         model = Topic
         fields = ['id', 'name', 'description', 'subject', 'subject_name']
 
-class ProblemSerializer(serializers.ModelSerializer):
+def parse_fields_param(request):
+    """解析 ?fields=id,title 参数，未指定时返回 None"""
+    if request is None:
+        return None
+    fields = request.query_params.get('fields')
+    if not fields:
+        return None
+    return {name.strip() for name in fields.split(',') if name.strip()} | {'id'}
+
+class DynamicFieldsMixin:
+    """支持通过 ?fields= 只返回部分字段，id 始终返回"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = parse_fields_param(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+class ProblemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     topic_name = serializers.CharField(source='topic.name', read_only=True)
     subject_name = serializers.CharField(source='topic.subject.name', read_only=True)
     
@@ -47,4 +66,19 @@ class UserProblemRecordSerializer(serializers.ModelSerializer):
 class UserProblemRecordCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = UserProblemRecord
-        fields = ['problem', 'user_answer', 'time_spent']
\ No newline at end of file
+        fields = ['problem', 'user_answer', 'time_spent']
+
+class ProblemAttemptSerializer(serializers.ModelSerializer):
+    problem_title = serializers.CharField(source='problem.title', read_only=True)
+
+    class Meta:
+        model = ProblemAttempt
+        fields = ['id', 'problem', 'problem_title', 'user_answer', 'status', 'score', 'time_spent', 'attempted_at']
+
+class SessionAnswerSerializer(serializers.Serializer):
+    problem = serializers.IntegerField()
+    user_answer = serializers.CharField(required=False, allow_blank=True, allow_null=True, default='', trim_whitespace=False)
+    time_spent = serializers.IntegerField(required=False, min_value=0, default=0)
+
+class SessionSubmitSerializer(serializers.Serializer):
+    answers = serializers.ListField(child=SessionAnswerSerializer(), allow_empty=False, max_length=MAX_ANSWERS)
\ No newline at end of file
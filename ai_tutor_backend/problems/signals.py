@@ -0,0 +1,77 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from . import ability, analytics, search, recommend, stats
+from .models import Subject, Topic, Problem, UserProblemRecord
+
+
+@receiver(pre_save, sender=Problem)
+def init_difficulty_rating(sender, instance, raw=False, **kwargs):
+    """新题目的难度参数取难度等级对应的初始值，之后由批量标定更新"""
+    if raw or not instance._state.adding or instance.difficulty_rating:
+        return
+    instance.difficulty_rating = ability.DIFFICULTY_PRIORS.get(instance.difficulty, 0.0)
+
+
+@receiver(post_save, sender=Problem)
+def index_problem(sender, instance, raw=False, **kwargs):
+    """题目新增或修改后更新全文索引"""
+    if raw:
+        return
+    problem = Problem.objects.select_related('topic__subject').get(pk=instance.pk)
+    search.index_problems([problem])
+
+
+@receiver(post_delete, sender=Problem)
+def unindex_problem(sender, instance, **kwargs):
+    search.remove_problems([instance.pk])
+
+
+@receiver(post_save, sender=Topic)
+def reindex_topic(sender, instance, created=False, raw=False, **kwargs):
+    """知识点改名或调整学科后，其下题目的索引需要更新"""
+    if created or raw:
+        return
+    search.index_problems(Problem.objects.filter(topic=instance).select_related('topic__subject'))
+
+
+@receiver(post_save, sender=Subject)
+def reindex_subject(sender, instance, created=False, raw=False, **kwargs):
+    if created or raw:
+        return
+    search.index_problems(Problem.objects.filter(topic__subject=instance).select_related('topic__subject'))
+
+
+@receiver(post_save, sender=UserProblemRecord)
+@receiver(post_delete, sender=UserProblemRecord)
+def invalidate_solved_bitmap(sender, instance, raw=False, **kwargs):
+    """作答记录变化后，推荐用的已做对题目位图缓存失效"""
+    if raw:
+        return
+    recommend.invalidate_solved(instance.user_id)
+
+
+@receiver(post_save, sender=UserProblemRecord)
+def update_user_stats(sender, instance, created=False, raw=False, **kwargs):
+    """按本次保存前后的作答结果增量更新做题统计"""
+    if raw:
+        return
+    old = None if created else getattr(instance, '_loaded_result', None)
+    new = (instance.status, instance.score)
+    stats.apply_change(instance.user_id, instance.problem_id, old, new)
+    instance._loaded_result = new
+
+
+@receiver(post_delete, sender=UserProblemRecord)
+def remove_user_stats(sender, instance, **kwargs):
+    old = getattr(instance, '_loaded_result', None) or (instance.status, instance.score)
+    stats.apply_change(instance.user_id, instance.problem_id, old, None)
+
+
+@receiver(post_save, sender=UserProblemRecord)
+@receiver(post_delete, sender=UserProblemRecord)
+def invalidate_class_mastery(sender, instance, raw=False, **kwargs):
+    """学生的作答记录变化后，所在班级的掌握情况缓存失效"""
+    if raw:
+        return
+    analytics.invalidate_student(instance.user_id)
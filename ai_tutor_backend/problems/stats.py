@@ -0,0 +1,202 @@
+"""用户做题统计
+
+UserStats 保存每个用户的汇总，UserTopicStats 按 (知识点, 难度) 细分，
+按学科统计时再关联 topic__subject 汇总。两张表都在作答记录保存或删除时
+按“去掉旧结果、加上新结果”的差值用 F() 表达式增量更新，
+统计接口只需一次按主键的查询，不再每次扫描用户的全部作答记录。
+
+rebuild() 从作答记录重新计算（用于修复，上线时的回填见迁移 0006），
+check() 对比统计表与作答记录，找出不一致的用户。
+"""
+from collections import Counter, defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Problem, UserProblemRecord, UserStats, UserTopicStats
+
+COUNTER_FIELDS = ('total_attempted', 'correct_count', 'incorrect_count',
+                  'partially_correct_count', 'skipped_count', 'score_sum')
+STATUS_FIELDS = {
+    'correct': 'correct_count',
+    'incorrect': 'incorrect_count',
+    'partially_correct': 'partially_correct_count',
+    'skipped': 'skipped_count',
+}
+
+
+def _deltas(old, new):
+    """旧结果和新结果 (status, score) 对各计数字段的差值，为 None 表示没有该结果"""
+    deltas = dict.fromkeys(COUNTER_FIELDS, 0)
+    for result, sign in ((old, -1), (new, 1)):
+        if result is None:
+            continue
+        status, score = result
+        deltas['total_attempted'] += sign
+        if status in STATUS_FIELDS:
+            deltas[STATUS_FIELDS[status]] += sign
+        deltas['score_sum'] += sign * (score or 0)
+    return {field: value for field, value in deltas.items() if value}
+
+
+def _bump(model, lookup, deltas, create):
+    """按差值更新一行统计，行不存在且 create 为 True 时先创建"""
+    updates = {field: F(field) + value for field, value in deltas.items()}
+    if model.objects.filter(**lookup).update(**updates) or not create:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, **deltas)
+    except IntegrityError:
+        # 并发请求已经创建了这一行
+        model.objects.filter(**lookup).update(**updates)
+
+
+def apply_change(user_id, problem_id, old, new, topic_id=None, difficulty=None):
+    """作答记录的结果从 old 变为 new 后更新统计
+
+    Args:
+        user_id: 用户id
+        problem_id: 题目id
+        old: 修改前的 (status, score)，新建记录时为 None
+        new: 修改后的 (status, score)，删除记录时为 None
+        topic_id, difficulty: 题目的知识点和难度，调用方已知时传入可省去一次查询
+    """
+    if not _deltas(old, new):
+        return
+    if topic_id is None or difficulty is None:
+        row = Problem.objects.filter(pk=problem_id).values_list('topic_id', 'difficulty').first()
+        if row is None:
+            return
+        topic_id, difficulty = row
+    apply_changes(user_id, [(topic_id, difficulty, old, new)])
+
+
+def apply_changes(user_id, changes):
+    """批量版本的 apply_change：差值按 (知识点, 难度) 合并后再写入
+
+    Args:
+        changes: [(知识点id, 难度, 旧结果, 新结果)]
+    """
+    total = Counter()
+    by_topic = defaultdict(Counter)
+    # 只有增加计数时才需要建行；删除用户或题目时级联删除记录不应再建统计行
+    creating = set()
+    for topic_id, difficulty, old, new in changes:
+        deltas = _deltas(old, new)
+        total.update(deltas)
+        by_topic[(topic_id, difficulty)].update(deltas)
+        if new is not None:
+            creating.add((topic_id, difficulty))
+
+    def nonzero(counter):
+        return {field: value for field, value in counter.items() if value}
+
+    if not nonzero(total) and not any(nonzero(deltas) for deltas in by_topic.values()):
+        return
+    with transaction.atomic():
+        if nonzero(total):
+            _bump(UserStats, {'user_id': user_id}, nonzero(total), bool(creating))
+        for (topic_id, difficulty), deltas in by_topic.items():
+            if nonzero(deltas):
+                _bump(UserTopicStats, {'user_id': user_id, 'topic_id': topic_id, 'difficulty': difficulty},
+                      nonzero(deltas), (topic_id, difficulty) in creating)
+
+
+def _aggregate(records, *group_by):
+    return (records.values(*group_by).order_by()
+            .annotate(total_attempted=Count('id'),
+                      correct_count=Count('id', filter=Q(status='correct')),
+                      incorrect_count=Count('id', filter=Q(status='incorrect')),
+                      partially_correct_count=Count('id', filter=Q(status='partially_correct')),
+                      skipped_count=Count('id', filter=Q(status='skipped')),
+                      score_sum=Sum('score')))
+
+
+def _expected(user_ids=None):
+    """从作答记录计算应有的统计：({user_id: 计数}, {(user_id, topic_id, difficulty): 计数})"""
+    records = UserProblemRecord.objects.all()
+    if user_ids is not None:
+        records = records.filter(user_id__in=user_ids)
+    users = {}
+    topics = {}
+    for row in _aggregate(records, 'user_id', 'problem__topic_id', 'problem__difficulty').iterator():
+        counts = {field: row[field] or 0 for field in COUNTER_FIELDS}
+        topics[(row['user_id'], row['problem__topic_id'], row['problem__difficulty'])] = counts
+        total = users.setdefault(row['user_id'], dict.fromkeys(COUNTER_FIELDS, 0))
+        for field in COUNTER_FIELDS:
+            total[field] += counts[field]
+    return users, topics
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """从作答记录重新计算统计表
+
+    Args:
+        user_ids: 只重建这些用户，默认全部
+        batch_size: 每批写入的行数
+
+    Returns:
+        tuple: (重建的用户数, 知识点统计行数)
+    """
+    users, topics = _expected(user_ids)
+    with transaction.atomic():
+        for model in (UserStats, UserTopicStats):
+            existing = model.objects.all()
+            if user_ids is not None:
+                existing = existing.filter(user_id__in=user_ids)
+            existing.delete()
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id, **counts) for user_id, counts in users.items()],
+            batch_size=batch_size)
+        UserTopicStats.objects.bulk_create(
+            [UserTopicStats(user_id=user_id, topic_id=topic_id, difficulty=difficulty, **counts)
+             for (user_id, topic_id, difficulty), counts in topics.items()],
+            batch_size=batch_size)
+    return len(users), len(topics)
+
+
+def _stored(queryset, *keys):
+    """读取统计表中计数不为 0 的行：{键: 计数}"""
+    rows = queryset.exclude(total_attempted=0).values(*keys, *COUNTER_FIELDS)
+    return {tuple(row[k] for k in keys): {field: row[field] for field in COUNTER_FIELDS} for row in rows}
+
+
+def check(user_ids=None):
+    """对比统计表和作答记录
+
+    Returns:
+        list: 统计不一致的用户id
+    """
+    users, topics = _expected(user_ids)
+    stored_users = UserStats.objects.all()
+    stored_topics = UserTopicStats.objects.all()
+    if user_ids is not None:
+        stored_users = stored_users.filter(user_id__in=user_ids)
+        stored_topics = stored_topics.filter(user_id__in=user_ids)
+    pairs = (
+        ({(user_id,): counts for user_id, counts in users.items()}, _stored(stored_users, 'user_id')),
+        (topics, _stored(stored_topics, 'user_id', 'topic_id', 'difficulty')),
+    )
+
+    mismatched = set()
+    for expected, stored in pairs:
+        for key in expected.keys() | stored.keys():
+            if key not in expected or key not in stored or any(
+                    abs(expected[key][field] - stored[key][field]) > 1e-6 for field in COUNTER_FIELDS):
+                mismatched.add(key[0])
+    return sorted(mismatched)
+
+
+def summary(counts):
+    """统计计数（包含 COUNTER_FIELDS 的字典）转换为接口返回的数据，counts 为 None 时返回全 0"""
+    counts = counts or dict.fromkeys(COUNTER_FIELDS, 0)
+    total = counts['total_attempted']
+    return {
+        'total_attempted': total,
+        'correct_count': counts['correct_count'],
+        'incorrect_count': counts['incorrect_count'],
+        'partially_correct_count': counts['partially_correct_count'],
+        'skipped_count': counts['skipped_count'],
+        'avg_score': round(counts['score_sum'] / total, 2) if total else 0,
+    }
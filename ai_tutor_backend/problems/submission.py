@@ -0,0 +1,98 @@
+"""提交作答
+
+submit_answers() 一次提交若干道题的答案（一次练习或单道题）：
+- 题目用一次 in_bulk 读取，已有记录在事务中加锁读取（用于增量统计和复习排期），
+  同一用户的并发提交通过锁住其 UserStats 行依次执行；
+- 每次作答追加到 ProblemAttempt 历史表（只插入）；
+- 判题后用 bulk_create(update_conflicts=True) 按 (user, problem) 插入或更新
+  UserProblemRecord（每道题最近一次的结果），与历史在同一事务中写入，
+  由数据库保证唯一，不会像先查后写那样在重复点击时违反 unique_together；
+- bulk_create 不发送 post_save 信号，保存后的副作用在这里显式批量执行：
+  做题统计、知识点能力值在同一事务中更新，已做对位图和班级分析缓存在提交后失效。
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import ability, analytics, grading, recommend, review, stats
+from .models import Problem, ProblemAttempt, UserProblemRecord, UserStats
+
+MAX_ANSWERS = 200
+
+UPDATE_FIELDS = ['user_answer', 'status', 'score', 'time_spent', 'attempted_at', *review.REVIEW_FIELDS]
+
+
+def _time_spent(value):
+    try:
+        return max(int(value or 0), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def submit_answers(user, answers):
+    """判题并保存作答记录
+
+    Args:
+        user: 作答的学生
+        answers: [{'problem': 题目id, 'user_answer': 答案, 'time_spent': 用时(秒)}]，
+                 同一道题出现多次时以最后一次为准
+
+    Returns:
+        list: 与 answers 顺序对应的 (题目id, UserProblemRecord)，题目不存在时记录为 None
+    """
+    latest = {}
+    for item in answers:
+        latest[item['problem']] = item
+    problems = Problem.objects.only('id', 'answer', 'topic_id', 'difficulty', 'difficulty_rating').in_bulk(latest)
+    now = timezone.now()
+
+    with transaction.atomic():
+        # 先锁住用户的统计行，同一用户的并发提交依次执行：
+        # 下面读到的已有记录（统计差值和复习排期的依据）不会在写入前被另一个提交改掉
+        UserStats.objects.select_for_update().get_or_create(user=user)
+        existing = {record.problem_id: record
+                    for record in UserProblemRecord.objects.select_for_update()
+                    .filter(user=user, problem_id__in=problems)}
+
+        records = []
+        for problem_id, item in latest.items():
+            problem = problems.get(problem_id)
+            if problem is None:
+                continue
+            user_answer = (item.get('user_answer') or '').strip()
+            status, score = grading.grade(problem, user_answer)
+            previous = existing.get(problem_id)
+            record = UserProblemRecord(
+                user=user, problem=problem, user_answer=user_answer, status=status, score=score,
+                time_spent=_time_spent(item.get('time_spent')), attempted_at=now,
+            )
+            if previous is not None:
+                for field in review.REVIEW_FIELDS:
+                    setattr(record, field, getattr(previous, field))
+            review.schedule(record, now)
+            records.append(record)
+
+        ProblemAttempt.objects.bulk_create([
+            ProblemAttempt(user=user, problem_id=record.problem_id, user_answer=record.user_answer,
+                           status=record.status, score=record.score, time_spent=record.time_spent,
+                           attempted_at=now)
+            for record in records
+        ])
+        saved = UserProblemRecord.objects.bulk_create(
+            records, update_conflicts=True, unique_fields=['user', 'problem'], update_fields=UPDATE_FIELDS)
+        stats.apply_changes(user.id, [
+            (record.problem.topic_id, record.problem.difficulty,
+             existing[record.problem_id]._loaded_result if record.problem_id in existing else None,
+             (record.status, record.score))
+            for record in saved
+        ])
+        ability.record_attempts(user.id, [
+            (record.problem.topic_id, record.problem.difficulty_rating, record.status, record.score)
+            for record in saved
+        ])
+        transaction.on_commit(lambda: recommend.invalidate_solved(user.id))
+        transaction.on_commit(lambda: analytics.invalidate_student(user.id))
+
+    for record in saved:
+        record._loaded_result = (record.status, record.score)
+    by_problem = {record.problem_id: record for record in saved}
+    return [(item['problem'], by_problem.get(item['problem'])) for item in answers]
@@ -0,0 +1,715 @@
+import csv
+import importlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from io import StringIO
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.utils import timezone
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from students.models import StudentProfile
+
+from . import analytics, generation, grading, recommend, review, search, stats, submission
+from .models import (Problem, ProblemAttempt, Subject, Topic, TopicAbility, UserProblemRecord, UserStats,
+                     UserTopicStats)
+
+
+class GradingTestCase(SimpleTestCase):
+    def assertScores(self, answer, cases):
+        matcher = grading.compile_answer(answer)
+        for user_answer, expected in cases:
+            with self.subTest(answer=answer, user_answer=user_answer):
+                self.assertAlmostEqual(matcher.match(user_answer), expected)
+
+
+class NumericMatcherTests(GradingTestCase):
+    def test_integers_compare_exactly(self):
+        self.assertScores('2025', [('2025', 1), ('2024', 0), ('2025.0', 1), ('2026', 0)])
+        self.assertScores('1001', [('1000', 0), ('1001', 1)])
+        self.assertScores('1024', [('2^10', 1), ('2^10+1', 0)])
+
+    def test_decimals_use_stated_precision(self):
+        self.assertScores('3.14', [('3.1416', 1), ('3.14', 1), ('3.1', 0), ('3.15', 0)])
+        self.assertScores('0.5', [('1/2', 1), ('½', 1), ('50%', 1)])
+        self.assertScores('12.5%', [('0.125', 1), ('12.5%', 1), ('13%', 0)])
+        self.assertScores('1.5e3', [('1500', 1), ('1.5*10^3', 1), ('1600', 0)])
+
+    def test_fractions_use_relative_tolerance(self):
+        self.assertScores('1/3', [('0.333', 1), ('0.33', 0), ('2/6', 1)])
+        self.assertScores('√10/10', [('0.316', 1), ('1/√10', 1)])
+
+    def test_prose_prefix(self):
+        self.assertScores('5', [('答案是5', 1), ('答案：5', 1), ('答：5', 1), ('答案是6', 0)])
+        self.assertScores('x = 2', [('2', 1), ('答：x = 2', 1)])
+
+    def test_huge_powers_do_not_stall(self):
+        started = time.monotonic()
+        for user_answer in ['9^9^9', '9^9^9^9', '(9^9)^(9^9)', '10^99999', '1*10^999999999', '9' * 500]:
+            with self.subTest(user_answer=user_answer):
+                self.assertEqual(grading.compile_answer('5').match(user_answer), 0)
+                self.assertEqual(grading.compile_answer('x^2').match(user_answer), 0)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+class QuantityMatcherTests(GradingTestCase):
+    def test_units(self):
+        self.assertScores('2 m/s', [('2m/s', 1), ('2', 1), ('2 km/h', 0), ('3 m/s', 0)])
+        self.assertScores('1.33×10^5 Pa', [('133000 Pa', 1), ('1.33*10^5Pa', 1)])
+        self.assertScores('3600 J', [('3600J', 1), ('3603 J', 0)])
+
+    def test_assignment(self):
+        self.assertScores('y₀ = 3', [('3', 1), ('y_0=3', 1)])
+        self.assertScores('2', [('x=2', 1), ('2x', 0)])
+
+
+class ExpressionMatcherTests(GradingTestCase):
+    def test_equivalent_forms(self):
+        self.assertScores('x²+2x+1', [('(x+1)^2', 1), ('(x+1)²', 1), ('x^2+2x', 0)])
+        self.assertScores('3mg - 2mgcosθ', [('mg(3-2cosθ)', 1), ('3mg-2mgsinθ', 0)])
+        self.assertScores('sin2x', [('2sinxcosx', 1)])
+
+    def test_equations(self):
+        self.assertScores('4x + 3y - 25 = 0', [('8x+6y=50', 1), ('y=(25-4x)/3', 1), ('4x+3y+25=0', 0)])
+        self.assertScores('y = 2x + 1', [('2x+1', 1), ('2x-y+1=0', 1), ('y=2x', 0)])
+
+    def test_code_is_not_evaluated(self):
+        self.assertScores('2', [("__import__('os')", 0)])
+
+
+class ChoiceMatcherTests(GradingTestCase):
+    def test_letters(self):
+        self.assertScores('A', [('a', 1), ('（A）', 1), ('选A', 1), ('B', 0)])
+        self.assertScores('AC', [('C,A', 1), ('A、C', 1), ('A', 0.5), ('AB', 0)])
+        self.assertScores('A. fine', [('fine', 1), ('A', 1), ('B', 0)])
+
+
+class StructuredMatcherTests(GradingTestCase):
+    def test_alternatives(self):
+        self.assertScores('k = 5 或 k = -15', [('-15或5', 1), ('k=5, k=-15', 1), ('5', 0.5)])
+
+    def test_sequences(self):
+        self.assertScores('(1, 3)', [('(1,3)', 1), ('(3,1)', 0)])
+        self.assertScores('[0, 1]', [('［0，1］', 1), ('(0,1)', 0)])
+
+    def test_parts(self):
+        self.assertScores('(1) 40m/s (2) 2m/s²', [('(1)40 m/s (2)2 m/s^2', 1), ('(1) 40 (2) 3', 0.5)])
+
+
+class TextMatcherTests(GradingTestCase):
+    def test_normalised_text(self):
+        self.assertScores('were', [('Were', 1), ('was', 0)])
+        self.assertScores('hadn\'t she', [('hadn’t she', 1)])
+        self.assertScores('the', [('eth', 0)])
+        self.assertScores('look  up', [('Look up', 1), ('lookup', 0)])
+
+    def test_short_words_are_not_products(self):
+        for answer, anagram in [('is', 'si'), ('on', 'no'), ('at', 'ta'), ('it', 'ti'), ('up', 'pu'), ('do', 'od')]:
+            self.assertScores(answer, [(answer, 1), (answer.upper(), 1), (anagram, 0)])
+        self.assertScores('an', [('a n', 0), ('An', 1)])
+        # 有运算符或数字时相邻字母仍按乘积解析
+        self.assertScores('ab + 1', [('ba+1', 1)])
+        self.assertScores('a(b+1)', [('ab+a', 1), ('ba+a', 1)])
+
+
+class GradeTests(SimpleTestCase):
+    def test_status(self):
+        problem = Problem(id=1, answer='2025')
+        self.assertEqual(grading.grade(problem, '2025'), ('correct', 100))
+        self.assertEqual(grading.grade(problem, '2024'), ('incorrect', 0))
+        self.assertEqual(grading.grade(problem, '  '), ('skipped', 0))
+        self.assertEqual(grading.grade(Problem(id=2, answer='AC'), 'A'), ('partially_correct', 50.0))
+
+
+class RecommendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='数学')
+        self.small = Topic.objects.create(subject=subject, name='函数')
+        large = Topic.objects.create(subject=subject, name='数列')
+        for topic, count in ((self.small, 30), (large, 600)):
+            Problem.objects.bulk_create([
+                Problem(topic=topic, title=f'{topic.name}{i}', content='题干', answer='1',
+                        explanation='略', difficulty='中等')
+                for i in range(count)
+            ])
+
+    def test_topic_id_ranges(self):
+        ids = list(Problem.objects.filter(topic=self.small).values_list('id', flat=True))
+        ranges = recommend.topic_id_ranges([self.small.id, 0])
+        self.assertEqual(ranges, {self.small.id: (min(ids), max(ids)), 0: (None, None)})
+
+    def test_sample_is_spread_over_the_topic(self):
+        # 起点在知识点自己的 id 范围内抽取，不会总是落到该知识点最小的那几道题
+        ids = sorted(Problem.objects.filter(topic=self.small).values_list('id', flat=True))
+        id_range = recommend.topic_id_ranges([self.small.id])[self.small.id]
+        upper = 0
+        for _ in range(100):
+            picked = recommend._sample_topic(self.small.id, 1, 0, set(), id_range)
+            self.assertEqual(len(picked), 1)
+            upper += picked[0].id > ids[len(ids) // 2]
+        self.assertGreater(upper, 20)
+
+
+class ProblemViewSetTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='物理')
+        topics = [Topic.objects.create(subject=subject, name=name) for name in ('力学', '电学')]
+        Problem.objects.bulk_create([
+            Problem(topic=topics[i % 2], title=f'题目{i}', content='小球从静止开始下落', answer='1',
+                    explanation='略', difficulty='中等')
+            for i in range(60)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='student', password='pw'))
+
+    def test_list_uses_one_query(self):
+        # 知识点和学科名称随题目一次联表查出，查询数不随题目数量增加
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/problems/problems/')
+        self.assertEqual(len(response.data), 60)
+        self.assertEqual(response.data[0]['subject_name'], '物理')
+
+    def test_retrieve_uses_one_query(self):
+        problem = Problem.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/problems/problems/{problem.id}/')
+        self.assertEqual(response.data['topic_name'], problem.topic.name)
+
+    def test_fields(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/problems/problems/', {'fields': 'id,title'})
+        self.assertEqual(set(response.data[0]), {'id', 'title'})
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/problems/problems/', {'fields': 'id,topic_name'})
+        self.assertEqual(set(response.data[0]), {'id', 'topic_name'})
+
+    def test_cursor_pagination(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/problems/problems/', {'paginate': 'cursor', 'page_size': 20})
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_search_fallback_is_paginated(self):
+        with mock.patch.object(search, 'is_available', return_value=False):
+            response = self.client.get('/api/problems/problems/', {'q': '下落'})
+            self.assertEqual(len(response.data), 50)
+            response = self.client.get('/api/problems/problems/', {'q': '下落', 'page_size': 20, 'offset': 50})
+            self.assertEqual(len(response.data), 10)
+            response = self.client.get('/api/problems/problems/',
+                                       {'q': '下落', 'paginate': 'cursor', 'page_size': 20})
+            self.assertEqual(len(response.data['results']), 20)
+            response = self.client.get(response.data['next'])
+            self.assertEqual(len(response.data['results']), 20)
+
+
+class AbilityUpdateTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='数学')
+        self.topic = Topic.objects.create(subject=subject, name='函数')
+        self.problem = Problem.objects.create(topic=self.topic, title='题目', content='题干', answer='2',
+                                              explanation='略', difficulty='中等')
+        self.user = get_user_model().objects.create_user(username='student', password='pw')
+
+    def ability(self):
+        return TopicAbility.objects.get(user=self.user, topic=self.topic)
+
+    def test_only_new_attempts_update_ability(self):
+        submission.submit_answers(self.user, [{'problem': self.problem.id, 'user_answer': '2'}])
+        first = self.ability()
+        self.assertEqual(first.attempts, 1)
+
+        # 后台修改、重新保存作答记录不计为新的作答
+        record = UserProblemRecord.objects.get(user=self.user, problem=self.problem)
+        record.time_spent = 30
+        record.save()
+        record.save()
+        self.assertEqual((self.ability().rating, self.ability().attempts), (first.rating, 1))
+
+        submission.submit_answers(self.user, [{'problem': self.problem.id, 'user_answer': '3'}])
+        self.assertEqual(self.ability().attempts, 2)
+        self.assertLess(self.ability().rating, first.rating)
+
+
+class ProblemAttemptAdminTests(TestCase):
+    def test_read_only(self):
+        subject = Subject.objects.create(name='数学')
+        topic = Topic.objects.create(subject=subject, name='函数')
+        problem = Problem.objects.create(topic=topic, title='题目', content='题干', answer='2',
+                                         explanation='略', difficulty='中等')
+        admin = get_user_model().objects.create_superuser(username='admin', password='pw')
+        attempt = ProblemAttempt.objects.create(user=admin, problem=problem, user_answer='2',
+                                                status='correct', score=100)
+        self.client.force_login(admin)
+        base = '/admin/problems/problemattempt/'
+        self.assertEqual(self.client.get(base).status_code, 200)
+        self.assertEqual(self.client.get(f'{base}{attempt.id}/change/').status_code, 200)
+        self.assertEqual(self.client.get(f'{base}add/').status_code, 403)
+        self.assertEqual(self.client.post(f'{base}{attempt.id}/change/', {'status': 'incorrect'}).status_code, 403)
+        self.assertEqual(self.client.post(f'{base}{attempt.id}/delete/', {'post': 'yes'}).status_code, 403)
+        attempt.refresh_from_db()
+        self.assertEqual(attempt.status, 'correct')
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='数学')
+        topics = [Topic.objects.create(subject=subject, name=name) for name in ('函数', '数列')]
+        self.problems = [
+            Problem.objects.create(topic=topics[i % 2], title=f'题目{i}', content='题干', answer=str(i),
+                                   explanation='略', difficulty=('简单', '中等')[i // 2 % 2])
+            for i in range(6)
+        ]
+        self.users = [get_user_model().objects.create_user(username=f'student{i}', password='pw')
+                      for i in range(2)]
+        for user in self.users:
+            submission.submit_answers(user, [
+                {'problem': self.problems[0].id, 'user_answer': '0'},
+                {'problem': self.problems[1].id, 'user_answer': '2'},
+                {'problem': self.problems[2].id, 'user_answer': ''},
+                {'problem': self.problems[3].id, 'user_answer': '3'},
+            ])
+        # 改答案、删除记录后统计仍与作答记录一致
+        submission.submit_answers(self.users[0], [{'problem': self.problems[1].id, 'user_answer': '1'},
+                                                  {'problem': self.problems[4].id, 'user_answer': '5'}])
+        UserProblemRecord.objects.get(user=self.users[1], problem=self.problems[3]).delete()
+
+    def test_incremental_stats_match_records(self):
+        self.assertEqual(stats.check(), [])
+        user_stats = UserStats.objects.get(user=self.users[0])
+        self.assertEqual((user_stats.total_attempted, user_stats.correct_count, user_stats.incorrect_count,
+                          user_stats.skipped_count), (5, 3, 1, 1))
+        self.assertEqual(UserStats.objects.get(user=self.users[1]).total_attempted, 3)
+        topic_stats = UserTopicStats.objects.get(user=self.users[0], topic=self.problems[1].topic, difficulty='简单')
+        self.assertEqual((topic_stats.total_attempted, topic_stats.correct_count), (1, 1))
+
+    def test_check_user_stats_fix(self):
+        UserStats.objects.filter(user=self.users[1]).update(correct_count=9)
+        UserTopicStats.objects.filter(user=self.users[0]).delete()
+        self.assertEqual(stats.check(), sorted(user.id for user in self.users))
+
+        out = StringIO()
+        call_command('check_user_stats', stdout=out)
+        self.assertIn('2 个用户的统计不一致', out.getvalue())
+        self.assertEqual(len(stats.check()), 2)
+
+        call_command('check_user_stats', '--fix', stdout=StringIO())
+        self.assertEqual(stats.check(), [])
+        out = StringIO()
+        call_command('check_user_stats', stdout=out)
+        self.assertIn('统计与作答记录一致', out.getvalue())
+
+    def test_migration_backfill(self):
+        expected = stats._expected()
+        UserStats.objects.all().delete()
+        UserTopicStats.objects.all().delete()
+        migration = importlib.import_module('problems.migrations.0006_user_stats')
+        migration.backfill_user_stats(apps, None)
+        self.assertEqual(stats.check(), [])
+        self.assertEqual(stats._expected(), expected)
+
+
+class StubClient:
+    """按调用顺序返回预设输出的大模型客户端，元素为异常时抛出"""
+
+    def __init__(self, outputs):
+        self.outputs = list(outputs)
+        self.calls = 0
+        self.lock = threading.Lock()
+        self.chat = self
+        self.completions = self
+
+    def create(self, **kwargs):
+        with self.lock:
+            output = self.outputs[self.calls]
+            self.calls += 1
+        if isinstance(output, Exception):
+            raise output
+        message = mock.Mock(content=output)
+        return mock.Mock(choices=[mock.Mock(message=message)])
+
+
+def problem_data(title):
+    return {'题目': title, '知识点': '函数', '难度': '中等', '答案': '1', '解析': '略'}
+
+
+def problem_json(title):
+    return '好的：' + json.dumps(problem_data(title), ensure_ascii=False)
+
+
+@mock.patch.object(generation, 'rate_limiter', generation.TokenBucket(1000, 1000))
+@mock.patch.object(generation, 'GENERATE_WORKERS', 1)
+class GenerationTests(TestCase):
+    def test_retries_and_partial_failure(self):
+        client = StubClient([
+            '无法解析', problem_json('题目一'),           # 第1题：解析失败后重试成功
+            problem_json('题目一'), problem_json('题目二'),  # 第2题：与第1题重复，重试成功
+            '{', '{"题目": "缺字段"}', '仍然不是JSON',       # 第3题：重试次数用完
+        ])
+        results = dict(generation.generate_problems('数学', '函数', '中等', 3, client=client))
+        self.assertEqual(client.calls, 7)
+        self.assertEqual(results[0]['题目'], '题目一')
+        self.assertEqual(results[1]['题目'], '题目二')
+        self.assertEqual(set(results[2]), {'error'})
+
+    def test_api_errors_are_not_retried(self):
+        client = StubClient([RuntimeError('余额不足'), problem_json('题目二')])
+        with self.assertLogs('problems.generation', 'WARNING'):
+            results = dict(generation.generate_problems('数学', '函数', '中等', 2, client=client))
+        self.assertEqual(client.calls, 2)
+        self.assertEqual(results[0], {'error': '余额不足'})
+        self.assertEqual(results[1]['题目'], '题目二')
+
+    def test_streaming_response(self):
+        teacher = get_user_model().objects.create_user(username='teacher', password='pw', role='teacher')
+        client = StubClient([problem_json('题目一'), RuntimeError('余额不足')])
+        api = APIClient()
+        api.force_authenticate(teacher)
+        with mock.patch.object(generation, 'DEEPSEEK_API_KEY', 'key'), \
+                mock.patch.object(generation, 'get_client', return_value=client), \
+                self.assertLogs('problems.generation', 'WARNING'):
+            response = api.post('/api/problems/ai_generate_problems/', {
+                'subject': '数学', 'topic': '函数', 'difficulty': '中等', 'count': 2, 'stream': True,
+            }, format='json')
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+            lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(lines[0], {'index': 0, 'problem': problem_data('题目一')})
+        self.assertEqual(lines[1], {'index': 1, 'error': '余额不足'})
+        self.assertEqual(lines[2], {'done': True, 'count': 2, 'generated': 1, 'failed': 1})
+
+    def test_missing_api_key(self):
+        teacher = get_user_model().objects.create_user(username='teacher', password='pw', role='teacher')
+        api = APIClient()
+        api.force_authenticate(teacher)
+        with mock.patch.object(generation, 'DEEPSEEK_API_KEY', ''):
+            response = api.post('/api/problems/ai_generate_problems/', {
+                'subject': '数学', 'topic': '函数', 'difficulty': '中等', 'count': 1}, format='json')
+        self.assertEqual(response.status_code, 500)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.assertTrue(search.is_available())
+        math = Subject.objects.create(name='数学')
+        physics = Subject.objects.create(name='物理')
+        self.function = Topic.objects.create(subject=math, name='函数')
+        self.mechanics = Topic.objects.create(subject=physics, name='力学')
+        self.in_title = Problem.objects.create(topic=self.function, title='求函数的极值', content='已知 f(x)=x^3-3x',
+                                               answer='2', explanation='略', difficulty='中等')
+        self.in_content = Problem.objects.create(topic=self.function, title='导数的应用',
+                                                 content='讨论函数的单调性与极值', answer='1',
+                                                 explanation='略', difficulty='中等')
+        self.other = Problem.objects.create(topic=self.mechanics, title='小球下落', content='Newton second law',
+                                            answer='1', explanation='略', difficulty='简单')
+        # bm25 的逆文档频率在检索词出现在一半以上的文档中时接近 0，补充一些无关题目
+        reaction = Topic.objects.create(subject=Subject.objects.create(name='化学'), name='氧化还原')
+        Problem.objects.bulk_create([
+            Problem(topic=reaction, title=f'配平方程式{i}', content='求电子转移数', answer='1',
+                    explanation='略', difficulty='简单')
+            for i in range(10)
+        ])
+        search.index_problems(Problem.objects.filter(topic=reaction).select_related('topic__subject'))
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(username='student', password='pw'))
+
+    def ids(self, query, queryset=None):
+        return [problem_id for problem_id, _ in search.search(query, queryset)]
+
+    def test_tokenize(self):
+        self.assertEqual(search.tokenize('函数的极值'), ['函数', '数的', '的极', '极值'])
+        self.assertEqual(search.tokenize('求 f(x) 的最大值'), ['求', 'f', 'x', '的最', '最大', '大值'])
+        self.assertEqual(search.tokenize('Newton 2nd-Law'), ['newton', '2nd', 'law'])
+        self.assertEqual(search._match_terms('函 数'), ['"函"*', '"数"*'])
+        self.assertEqual(search._match_terms('a"b'), ['"a"', '"b"'])
+
+    def test_cjk_queries(self):
+        self.assertEqual(self.ids('极值'), [self.in_title.id, self.in_content.id])
+        # 没有同时包含所有检索词的题目时退回到任一检索词
+        self.assertEqual(self.ids('函数极值')[:2], [self.in_title.id, self.in_content.id])
+        self.assertEqual(self.ids('极'), [self.in_title.id, self.in_content.id])
+        self.assertEqual(self.ids('newton LAW'), [self.other.id])
+        self.assertEqual(self.ids('物理'), [self.other.id])
+        self.assertEqual(self.ids('极值', Problem.objects.filter(title__startswith='导数')), [self.in_content.id])
+        self.assertEqual(self.ids('！？'), [])
+
+    def test_signals_keep_index_in_sync(self):
+        self.in_title.title = '求函数的零点'
+        self.in_title.save()
+        self.assertEqual(self.ids('零点'), [self.in_title.id])
+        self.assertEqual(self.ids('极值'), [self.in_content.id])
+        self.mechanics.name = '运动学'
+        self.mechanics.save()
+        self.assertEqual(self.ids('运动学'), [self.other.id])
+        self.in_content.delete()
+        self.assertEqual(self.ids('极值'), [])
+
+    def test_query_param_orders_by_bm25(self):
+        response = self.client.get('/api/problems/problems/', {'q': '极值'})
+        self.assertEqual([item['id'] for item in response.data], [self.in_title.id, self.in_content.id])
+        self.assertGreater(response.data[0]['score'], response.data[1]['score'])
+        response = self.client.get('/api/problems/problems/', {'q': '极值', 'page_size': 1, 'offset': 1})
+        self.assertEqual([item['id'] for item in response.data], [self.in_content.id])
+        response = self.client.get('/api/problems/problems/', {'q': '函数', 'subject': self.other.topic.subject_id})
+        self.assertEqual(response.data, [])
+
+    def test_rebuild_search_index(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.ids('极值'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn(f'已为 {Problem.objects.count()} 道题目建立索引', out.getvalue())
+        self.assertEqual(self.ids('极值'), [self.in_title.id, self.in_content.id])
+
+
+class ReviewScheduleTests(TestCase):
+    def setUp(self):
+        self.now = timezone.make_aware(datetime(2026, 3, 2, 9, 0))
+        self.record = UserProblemRecord(status='incorrect', score=0)
+
+    def answer(self, status, score=0, days=0):
+        self.record.status, self.record.score = status, score
+        review.schedule(self.record, self.now + timedelta(days=days))
+        return (self.record.review_interval, self.record.review_repetitions, round(self.record.review_ease, 2))
+
+    def test_sm2_intervals_and_ease(self):
+        review.schedule(self.record, self.now)
+        self.assertEqual(self.record.review_due, self.now + timedelta(days=1))
+        self.assertEqual(self.answer('correct', 100, 1), (1, 1, 2.6))
+        self.assertEqual(self.answer('correct', 100, 2), (6, 2, 2.7))
+        self.assertEqual(self.answer('correct', 100, 8), (16, 3, 2.8))
+        self.assertEqual(self.record.review_due, self.now + timedelta(days=24))
+        # 做错：间隔重置，熟练度系数降低
+        self.assertEqual(self.answer('incorrect', 0, 24), (1, 0, 2.26))
+        self.assertEqual(self.answer('partially_correct', 60, 25), (1, 1, 2.12))
+        self.assertEqual(self.answer('partially_correct', 50, 26), (1, 0, 1.8))
+
+    def test_ease_floor_and_mastery(self):
+        review.schedule(self.record, self.now)
+        for day in range(10):
+            self.answer('incorrect', 0, day)
+        self.assertEqual(self.record.review_ease, review.EASE_MIN)
+        self.record.review_ease, self.record.review_repetitions, self.record.review_interval = 2.5, 2, 30
+        self.answer('correct', 100)
+        self.assertIsNone(self.record.review_due)
+
+    def test_only_wrong_answers_enter_the_queue(self):
+        for status in ('correct', 'skipped'):
+            record = review.schedule(UserProblemRecord(status=status, score=0), self.now)
+            self.assertIsNone(record.review_due)
+
+
+class ReviewQueueTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='数学')
+        topic = Topic.objects.create(subject=subject, name='函数')
+        self.user = get_user_model().objects.create_user(username='student', password='pw')
+        self.now = timezone.now()
+        today = timezone.localtime(self.now).replace(hour=0, minute=0, second=0, microsecond=0)
+        # 昨天、今天零点、今天稍晚、今天最后一刻、明天零点、后天
+        self.dues = [today - timedelta(days=1), today, today + timedelta(hours=23),
+                     today + timedelta(days=1, microseconds=-1), today + timedelta(days=1),
+                     today + timedelta(days=2)]
+        self.records = []
+        for i, due in enumerate(self.dues):
+            problem = Problem.objects.create(topic=topic, title=f'题目{i}', content='题干', answer='1',
+                                             explanation='略', difficulty='中等')
+            self.records.append(UserProblemRecord.objects.create(
+                user=self.user, problem=problem, user_answer='2', status='incorrect', review_due=due))
+
+    def test_due_today_includes_the_rest_of_the_day(self):
+        due = list(review.due_records(self.user, self.now))
+        self.assertEqual(due, self.records[:4])
+
+    def test_review_endpoint_is_paginated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/problems/records/review/', {'page_size': 3})
+        self.assertEqual([item['record_id'] for item in response.data['results']],
+                         [record.id for record in self.records[:3]])
+        self.assertEqual(response.data['results'][0]['subject_name'], '数学')
+        with self.assertNumQueries(1):
+            response = client.get(response.data['next'])
+        self.assertEqual([item['record_id'] for item in response.data['results']], [self.records[3].id])
+        self.assertIsNone(response.data['next'])
+
+
+class SubmissionTests(TestCase):
+    def setUp(self):
+        subject = Subject.objects.create(name='数学')
+        self.topic = Topic.objects.create(subject=subject, name='函数')
+        self.problems = [
+            Problem.objects.create(topic=self.topic, title=f'题目{i}', content='题干', answer=str(i),
+                                   explanation='略', difficulty='中等')
+            for i in range(45)
+        ]
+        self.user = get_user_model().objects.create_user(username='student', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def submit(self, answers):
+        return self.client.post('/api/problems/records/submit_session/', {'answers': [
+            {'problem': problem.id, 'user_answer': answer} for problem, answer in answers]}, format='json')
+
+    def test_repeated_problem_keeps_the_last_answer(self):
+        first, second = self.problems[:2]
+        response = self.submit([(first, '9'), (second, '1'), (first, '0')])
+        self.assertEqual([item['status'] for item in response.data['results']], ['correct', 'correct', 'correct'])
+        self.assertEqual(response.data['results'][0]['record_id'], response.data['results'][2]['record_id'])
+        self.assertEqual(UserProblemRecord.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(ProblemAttempt.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(UserStats.objects.get(user=self.user).total_attempted, 2)
+        self.assertEqual(TopicAbility.objects.get(user=self.user, topic=self.topic).attempts, 2)
+
+    def test_resubmit_updates_the_record(self):
+        problem = self.problems[1]
+        record_id = self.submit([(problem, '2')]).data['results'][0]['record_id']
+        ability = TopicAbility.objects.get(user=self.user, topic=self.topic)
+        response = self.submit([(problem, '1')])
+        result = response.data['results'][0]
+        self.assertEqual((result['record_id'], result['status']), (record_id, 'correct'))
+        self.assertIsNotNone(result['review_due'])
+
+        record = UserProblemRecord.objects.get(pk=record_id)
+        self.assertEqual((record.status, record.user_answer, record.review_repetitions), ('correct', '1', 1))
+        self.assertEqual(list(ProblemAttempt.objects.filter(user=self.user).order_by('id')
+                              .values_list('status', flat=True)), ['incorrect', 'correct'])
+        user_stats = UserStats.objects.get(user=self.user)
+        self.assertEqual((user_stats.total_attempted, user_stats.correct_count, user_stats.incorrect_count,
+                          user_stats.score_sum), (1, 1, 0, 100))
+        self.assertEqual(stats.check(), [])
+        updated = TopicAbility.objects.get(user=self.user, topic=self.topic)
+        self.assertEqual(updated.attempts, 2)
+        self.assertGreater(updated.rating, ability.rating)
+
+    def test_query_count_does_not_grow_with_answers(self):
+        # 先各作答一次，使两次提交都同时包含新建和更新，能力值行也已存在
+        self.submit([(problem, '99') for problem in self.problems[:2] + self.problems[5:7]])
+        counts = []
+        for batch in (self.problems[:5], self.problems[5:25]):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.submit([(problem, str(problem.id % 3)) for problem in batch])
+            self.assertEqual(response.data['total'], len(batch))
+            counts.append(len(queries))
+        # 题目、统计行锁、已有记录各一次读取，历史和记录各一次批量写入，统计和能力值各一次更新（含保存点）
+        self.assertEqual(counts, [15, 15])
+        self.assertEqual(stats.check(), [])
+
+
+class ConcurrentSubmissionTests(TransactionTestCase):
+    def test_concurrent_submits_keep_stats_consistent(self):
+        subject = Subject.objects.create(name='数学')
+        topic = Topic.objects.create(subject=subject, name='函数')
+        problem = Problem.objects.create(topic=topic, title='题目', content='题干', answer='1',
+                                         explanation='略', difficulty='中等')
+        user = get_user_model().objects.create_user(username='student', password='pw')
+        errors = []
+
+        def submit(answer):
+            try:
+                submission.submit_answers(user, [{'problem': problem.id, 'user_answer': answer}])
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(str(i % 2),)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(ProblemAttempt.objects.count(), 8)
+        self.assertEqual(UserProblemRecord.objects.count(), 1)
+        self.assertEqual(UserStats.objects.get(user=user).total_attempted, 1)
+        self.assertEqual(TopicAbility.objects.get(user=user, topic=topic).attempts, 8)
+        self.assertEqual(stats.check(), [])
+
+
+class ClassMasteryTests(TestCase):
+    URL = '/api/problems/analytics/class_mastery/'
+
+    def setUp(self):
+        cache.clear()
+        subject = Subject.objects.create(name='数学')
+        self.function = Topic.objects.create(subject=subject, name='函数')
+        self.sequence = Topic.objects.create(subject=subject, name='数列')
+        self.easy, self.medium, self.other = [
+            Problem.objects.create(topic=topic, title=f'题目{i}', content='题干', answer='1',
+                                   explanation='略', difficulty=difficulty)
+            for i, (topic, difficulty) in enumerate([(self.function, '简单'), (self.function, '中等'),
+                                                     (self.sequence, '中等')])
+        ]
+        users = get_user_model().objects
+        self.students = []
+        for i, class_name in enumerate(['一班', '一班', '二班']):
+            student = users.create_user(username=f'student{i}', password='pw')
+            StudentProfile.objects.create(student=student, student_number=f'2026{i}', class_name=class_name)
+            self.students.append(student)
+        self.submit(self.students[0], [(self.easy, '1'), (self.medium, '2')])
+        self.submit(self.students[1], [(self.medium, '1')])
+        self.submit(self.students[2], [(self.other, '1')])
+        self.client = APIClient()
+        self.client.force_authenticate(users.create_user(username='teacher', password='pw', role='teacher'))
+
+    def submit(self, student, answers):
+        # 缓存在事务提交后才失效
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.submit_answers(student, [{'problem': problem.id, 'user_answer': answer}
+                                                for problem, answer in answers])
+
+    def test_pivot(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.data['difficulties'], analytics.DIFFICULTIES)
+        classes = {item['class_name']: item['topics'] for item in response.data['classes']}
+        self.assertEqual(list(classes), ['一班', '二班'])
+        [function] = classes['一班']
+        self.assertEqual((function['topic_name'], function['students'], function['attempts'], function['accuracy']),
+                         ('函数', 2, 3, 0.6667))
+        cells = function['difficulties']
+        self.assertEqual(cells['简单'], {'students': 1, 'attempts': 1, 'correct': 1, 'accuracy': 1.0})
+        self.assertEqual(cells['中等'], {'students': 2, 'attempts': 2, 'correct': 1, 'accuracy': 0.5})
+        self.assertEqual(cells['困难'], {'students': 0, 'attempts': 0, 'correct': 0, 'accuracy': None})
+        self.assertEqual([topic['topic_name'] for topic in classes['二班']], ['数列'])
+
+        response = self.client.get(self.URL, {'class_name': '二班,三班'})
+        self.assertEqual([(item['class_name'], len(item['topics'])) for item in response.data['classes']],
+                         [('二班', 1), ('三班', 0)])
+
+    def test_csv_export(self):
+        response = self.client.get(self.URL, {'export': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = response.content.decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        rows = list(csv.reader(StringIO(content.lstrip('\ufeff'))))
+        self.assertEqual(rows, [
+            analytics.CSV_COLUMNS,
+            ['一班', '数学', '函数', '简单', '1', '1', '1', '1.0'],
+            ['一班', '数学', '函数', '中等', '2', '2', '1', '0.5'],
+            ['二班', '数学', '数列', '中等', '1', '1', '1', '1.0'],
+        ])
+
+    def test_teachers_only(self):
+        self.client.force_authenticate(self.students[0])
+        self.assertEqual(self.client.get(self.URL).status_code, 403)
+
+    def test_submission_invalidates_only_the_students_class(self):
+        analytics.class_mastery(['一班', '二班'])
+        with self.assertNumQueries(0):
+            analytics.class_mastery(['一班', '二班'])
+
+        self.submit(self.students[1], [(self.easy, '2')])
+        with self.assertNumQueries(0):
+            analytics.class_mastery(['二班'])
+        [function] = analytics.class_mastery(['一班'])['一班']
+        self.assertEqual(function['difficulties']['简单']['attempts'], 2)
+        self.assertEqual(function['accuracy'], 0.5)
@@ -10,5 +10,6 @@ router.register('records', views.UserProblemRecordViewSet, basename='records')
 
 urlpatterns = [
     path('ai_generate_problems/', views.ai_generate_problems, name='ai_generate_problems'),
+    path('analytics/class_mastery/', views.class_mastery, name='class_mastery'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
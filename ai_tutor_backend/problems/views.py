@@ -2,23 +2,39 @@ from rest_framework import viewsets, permissions, status, filters
 from rest_framework import serializers
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q, Count, Avg
+from rest_framework.pagination import CursorPagination
+from django.db.models import Q, Count, Avg, Sum, F
+from django.http import HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from students.models import StudentProfile
-import random
-import os
+import csv
 import json
-import time
-from openai import OpenAI
 from rest_framework.permissions import IsAuthenticated
 
-from .models import Subject, Topic, Problem, UserProblemRecord
+from . import ability, analytics, generation, review, search, stats, submission
+from .recommend import recommend_problems
+from .models import (
+    Subject, Topic, Problem, UserProblemRecord, ProblemAttempt, TopicAbility, UserStats, UserTopicStats
+)
 from .serializers import (
     SubjectSerializer, TopicSerializer, 
     ProblemSerializer, ProblemDetailSerializer, ProblemCreateSerializer,
-    UserProblemRecordSerializer, UserProblemRecordCreateSerializer
+    UserProblemRecordSerializer, UserProblemRecordCreateSerializer, SessionSubmitSerializer,
+    ProblemAttemptSerializer, parse_fields_param
 )
 
+# 题目列表 ?fields= 中各字段需要读取的列，未请求的列（如较大的 content）不查询
+PROBLEM_FIELD_COLUMNS = {
+    'id': ['id'],
+    'topic': ['topic'],
+    'topic_name': ['topic', 'topic__name'],
+    'subject_name': ['topic', 'topic__subject', 'topic__subject__name'],
+    'title': ['title'],
+    'content': ['content'],
+    'difficulty': ['difficulty'],
+    'created_at': ['created_at'],
+}
+
 class IsTeacherOrReadOnly(permissions.BasePermission):
     """
     教师可以执行所有操作，其他用户只能读取
@@ -56,12 +72,42 @@ class TopicViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(subject__name=subject_name)
         return queryset
 
+class ProblemCursorPagination(CursorPagination):
+    """按 id 倒序的游标分页，翻到任意位置的耗时都相同"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
+
+class ReviewCursorPagination(CursorPagination):
+    """复习队列按到期时间分页，复习过的题目移出队列后不影响后续页"""
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('review_due', 'id')
+
+class AttemptCursorPagination(CursorPagination):
+    """作答历史按时间倒序分页"""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-attempted_at', '-id')
+
 class ProblemViewSet(viewsets.ModelViewSet):
     """题目视图集"""
     queryset = Problem.objects.all()
     permission_classes = [IsTeacherOrReadOnly]
     filter_backends = [filters.SearchFilter]
     search_fields = ['title', 'content', 'topic__name', 'topic__subject__name']
+    pagination_class = ProblemCursorPagination
+
+    @property
+    def paginator(self):
+        """默认返回完整列表（兼容现有前端），?paginate=cursor 或带 cursor 参数时使用游标分页"""
+        params = self.request.query_params
+        if params.get('paginate') != 'cursor' and 'cursor' not in params:
+            return None
+        return super().paginator
     
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'update' or self.action == 'partial_update':
@@ -71,7 +117,16 @@ class ProblemViewSet(viewsets.ModelViewSet):
         return ProblemSerializer
     
     def get_queryset(self):
-        queryset = Problem.objects.all()
+        # 序列化时要读取知识点和学科名称，一次联表查出，避免每道题额外查询两次
+        queryset = Problem.objects.select_related('topic__subject')
+        requested = parse_fields_param(self.request) if self.action == 'list' else None
+        if requested:
+            columns = {column for name in requested for column in PROBLEM_FIELD_COLUMNS.get(name, [])}
+            if 'topic' not in columns:
+                queryset = queryset.select_related(None)
+            elif 'topic__subject' not in columns:
+                queryset = queryset.select_related(None).select_related('topic')
+            queryset = queryset.only(*columns)
         
         # 过滤条件
         topic_id = self.request.query_params.get('topic', None)
@@ -88,6 +143,39 @@ class ProblemViewSet(viewsets.ModelViewSet):
             queryset = queryset.filter(difficulty=difficulty)
         
         return queryset
+
+    def list(self, request, *args, **kwargs):
+        """?q= 时使用全文索引按相关度返回题目，其余情况与普通列表相同"""
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return super().list(request, *args, **kwargs)
+
+        try:
+            limit = min(int(request.query_params.get('page_size', 50)), 200)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'detail': 'page_size 和 offset 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not search.is_available():
+            # 数据库不支持全文索引时退回到模糊查询，分页方式与普通列表相同
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                Q(title__icontains=query) | Q(content__icontains=query) |
+                Q(topic__name__icontains=query) | Q(topic__subject__name__icontains=query))
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                return self.get_paginated_response(self.get_serializer(page, many=True).data)
+            queryset = queryset.order_by('-id')[offset:offset + limit]
+            return Response(self.get_serializer(queryset, many=True).data)
+
+        queryset = self.get_queryset()
+        hits = search.search(query, queryset, limit=limit, offset=offset)
+        problems = queryset.in_bulk([problem_id for problem_id, _ in hits])
+        ranked = [problems[problem_id] for problem_id, _ in hits if problem_id in problems]
+        scores = dict(hits)
+        data = self.get_serializer(ranked, many=True).data
+        for item in data:
+            item['score'] = scores[item['id']]
+        return Response(data)
     
     @action(detail=True, methods=['get'])
     def user_record(self, request, pk=None):
@@ -104,34 +192,24 @@ class ProblemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def recommend(self, request):
-        """根据学生档案推荐10道题目"""
+        """根据学生档案和作答情况推荐题目（默认10道，可用 ?count= 指定，最多50道）
+
+        优先从薄弱学科中抽题，近期错误率高的知识点被抽中的概率更高，
+        题目难度接近学生当前能力，已做对的题目不再推荐。
+        """
         user = request.user
         try:
             profile = StudentProfile.objects.get(student=user)
         except StudentProfile.DoesNotExist:
             return Response({'detail': '未找到学生档案'}, status=status.HTTP_404_NOT_FOUND)
-        # 获取薄弱学科和学业水平
+        try:
+            count = min(max(int(request.query_params.get('count', 10)), 1), 50)
+        except ValueError:
+            return Response({'detail': 'count 必须是整数'}, status=status.HTTP_400_BAD_REQUEST)
+        # 优先从薄弱学科中抽题，难度按学生在各知识点上的能力估计选择
         weak_subjects = profile.get_weak_subjects_list()
-        academic_level = profile.academic_level
-        # 学业水平与题目难度的映射
-        level_map = {
-            'excellent': '困难',
-            'good': '较难',
-            'average': '中等',
-            'below_average': '简单',
-            'poor': '简单',
-        }
-        difficulty = level_map.get(academic_level, None)
-        # 先从薄弱学科中抽题
-        problems = Problem.objects.all()
-        if weak_subjects:
-            problems = problems.filter(topic__subject__name__in=weak_subjects)
-        if difficulty:
-            problems = problems.filter(difficulty=difficulty)
-        problems = list(problems)
-        # 随机抽取10道题
-        if len(problems) > 10:
-            problems = random.sample(problems, 10)
+        problems = recommend_problems(user, count, subjects=weak_subjects,
+                                      academic_level=profile.academic_level)
         serializer = ProblemSerializer(problems, many=True)
         return Response(serializer.data)
 
@@ -153,71 +231,119 @@ class UserProblemRecordViewSet(viewsets.ModelViewSet):
         return UserProblemRecordSerializer
     
     def perform_create(self, serializer):
-        """创建记录时自动评分"""
-        problem_id = self.request.data.get('problem')
-        user_answer = self.request.data.get('user_answer', '')
-        
-        try:
-            problem = Problem.objects.get(id=problem_id)
-            # 简单的完全匹配判题（实际项目中可以用更复杂的判题逻辑）
-            correct_answer = problem.answer.strip()
-            user_answer = user_answer.strip()
-            
-            if user_answer == correct_answer:
-                status_value = 'correct'
-                score = 100
-            elif user_answer and len(user_answer) > 0:
-                # 这里可以添加部分正确的判断逻辑
-                status_value = 'incorrect'
-                score = 0
-            else:
-                status_value = 'skipped'
-                score = 0
-            
-            # 检查是否已有记录，如有则更新
-            try:
-                existing_record = UserProblemRecord.objects.get(
-                    user=self.request.user,
-                    problem_id=problem_id
-                )
-                existing_record.user_answer = user_answer
-                existing_record.status = status_value
-                existing_record.score = score
-                existing_record.time_spent = self.request.data.get('time_spent', 0)
-                existing_record.attempted_at = timezone.now()
-                existing_record.save()
-                return existing_record
-            except UserProblemRecord.DoesNotExist:
-                # 创建新记录
-                serializer.save(
-                    user=self.request.user,
-                    status=status_value,
-                    score=score
-                )
-                
-        except Problem.DoesNotExist:
-            raise serializers.ValidationError({"problem": "题目不存在"})
-    
+        """创建或更新作答记录并自动评分（与 submit_session 相同的流程，一道题的情况）"""
+        data = serializer.validated_data
+        [(_, record)] = submission.submit_answers(self.request.user, [{
+            'problem': data['problem'].id,
+            'user_answer': data.get('user_answer') or '',
+            'time_spent': data.get('time_spent', 0),
+        }])
+        serializer.instance = record
+
+    @action(detail=False, methods=['post'])
+    def submit_session(self, request):
+        """
+        一次提交整次练习的答案，逐题返回判题结果
+        POST参数: answers: [{problem, user_answer, time_spent}]，最多200道
+        """
+        serializer = SessionSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = []
+        for problem_id, record in submission.submit_answers(request.user, serializer.validated_data['answers']):
+            if record is None:
+                results.append({'problem': problem_id, 'error': '题目不存在'})
+                continue
+            results.append({
+                'problem': problem_id,
+                'record_id': record.pk,
+                'status': record.status,
+                'score': record.score,
+                'review_due': record.review_due,
+            })
+        graded = [item for item in results if 'error' not in item]
+        return Response({
+            'results': results,
+            'total': len(graded),
+            'correct_count': sum(1 for item in graded if item['status'] == 'correct'),
+            'total_score': sum(item['score'] for item in graded),
+        })
+
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """获取用户的做题统计信息"""
+        """获取用户的做题统计信息
+
+        总数读取统计汇总表（一次主键查询）；?group=subject|topic|difficulty 时
+        另外返回按学科、知识点或难度细分的统计。
+        """
         user = request.user
-        records = UserProblemRecord.objects.filter(user=user)
-        
-        total_attempted = records.count()
-        correct_count = records.filter(status='correct').count()
-        incorrect_count = records.filter(status='incorrect').count()
-        skipped_count = records.filter(status='skipped').count()
-        
-        avg_score = records.aggregate(Avg('score'))['score__avg'] or 0
-        
-        return Response({
-            "total_attempted": total_attempted,
-            "correct_count": correct_count,
-            "incorrect_count": incorrect_count,
-            "skipped_count": skipped_count,
-            "avg_score": round(avg_score, 2)
-        })
+        data = stats.summary(UserStats.objects.filter(pk=user.pk).values(*stats.COUNTER_FIELDS).first())
+
+        group = request.query_params.get('group')
+        if group:
+            # 每种分组：(直接读取的字段, 关联字段的别名)
+            group_fields = {
+                'subject': ((), {'subject_id': F('topic__subject_id'), 'subject_name': F('topic__subject__name')}),
+                'topic': (('topic_id',), {'topic_name': F('topic__name'), 'subject_name': F('topic__subject__name')}),
+                'difficulty': (('difficulty',), {}),
+            }
+            if group not in group_fields:
+                return Response({'detail': 'group 只能是 subject、topic 或 difficulty'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            fields, aliases = group_fields[group]
+            keys = [*fields, *aliases]
+            rows = (UserTopicStats.objects.filter(user=user)
+                    .values(*fields, **aliases).order_by(*keys)
+                    .annotate(**{field: Sum(field) for field in stats.COUNTER_FIELDS}))
+            data['groups'] = [{**{key: row[key] for key in keys}, **stats.summary(row)} for row in rows]
+        return Response(data)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """获取当前用户的全部作答历史（包括同一道题的多次作答），可用 ?problem= 只看一道题"""
+        attempts = ProblemAttempt.objects.filter(user=request.user).select_related('problem')
+        problem_id = request.query_params.get('problem')
+        if problem_id:
+            attempts = attempts.filter(problem_id=problem_id)
+        paginator = AttemptCursorPagination()
+        page = paginator.paginate_queryset(attempts, request, view=self)
+        return paginator.get_paginated_response(ProblemAttemptSerializer(page, many=True).data)
+
+    @action(detail=False, methods=['get'])
+    def abilities(self, request):
+        """获取当前用户在各知识点上的能力估计和建议的题目难度"""
+        abilities = (TopicAbility.objects.filter(user=request.user)
+                     .select_related('topic__subject')
+                     .order_by('topic__subject__name', 'topic__name'))
+        data = [{
+            'topic_id': item.topic_id,
+            'topic_name': item.topic.name,
+            'subject_name': item.topic.subject.name,
+            'rating': round(item.rating, 3),
+            'attempts': item.attempts,
+            'suggested_difficulty': ability.suggested_difficulty(item.rating),
+            'updated_at': item.updated_at,
+        } for item in abilities]
+        return Response(data)
+
+    @staticmethod
+    def _wrongbook_item(rec):
+        problem = rec.problem
+        return {
+            'record_id': rec.id,
+            'problem_id': problem.id,
+            'title': problem.title,
+            'content': problem.content,
+            'topic_name': problem.topic.name,
+            'subject_name': problem.topic.subject.name,
+            'difficulty': problem.difficulty,
+            'user_answer': rec.user_answer,
+            'status': rec.status,
+            'score': rec.score,
+            'attempted_at': rec.attempted_at,
+            'review_due': rec.review_due,
+            'answer': problem.answer,
+            'explanation': problem.explanation,
+        }
 
     @action(detail=False, methods=['get'])
     def wrongbook(self, request):
@@ -226,34 +352,60 @@ class UserProblemRecordViewSet(viewsets.ModelViewSet):
         records = UserProblemRecord.objects.filter(
             user=user,
             status__in=['incorrect', 'partially_correct']
-        ).order_by('-attempted_at')
+        ).select_related('problem__topic__subject').order_by('-attempted_at')
         # 题目信息+作答信息
-        data = []
-        for rec in records:
-            problem = rec.problem
-            data.append({
-                'record_id': rec.id,
-                'problem_id': problem.id,
-                'title': problem.title,
-                'content': problem.content,
-                'topic_name': problem.topic.name,
-                'subject_name': problem.topic.subject.name,
-                'difficulty': problem.difficulty,
-                'user_answer': rec.user_answer,
-                'status': rec.status,
-                'score': rec.score,
-                'attempted_at': rec.attempted_at,
-                'answer': problem.answer,
-                'explanation': problem.explanation,
-            })
+        data = [self._wrongbook_item(rec) for rec in records]
         return Response(data)
 
+    @action(detail=False, methods=['get'], url_path='review')
+    def review_queue(self, request):
+        """获取当前用户今天到期需要复习的错题（按到期时间排序，游标分页，默认每页20道）
+
+        重新作答（POST records/）后按结果安排下次复习时间。
+        """
+        paginator = ReviewCursorPagination()
+        page = paginator.paginate_queryset(review.due_records(request.user), request, view=self)
+        return paginator.get_paginated_response([self._wrongbook_item(rec) for rec in page])
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def class_mastery(request):
+    """
+    班级掌握情况分析（仅教师）：各班级在每个知识点、每个难度上的作答数和正确率
+    GET参数: class_name（可重复或以逗号分隔，默认全部班级），export=csv 时导出CSV
+    """
+    user = request.user
+    if not hasattr(user, 'role') or user.role != 'teacher':
+        return Response({'detail': '仅教师可用'}, status=status.HTTP_403_FORBIDDEN)
+
+    class_names = [name.strip() for value in request.query_params.getlist('class_name')
+                   for name in value.split(',') if name.strip()]
+    if not class_names:
+        class_names = list(StudentProfile.objects.exclude(class_name='')
+                           .order_by('class_name').values_list('class_name', flat=True).distinct())
+    mastery = analytics.class_mastery(class_names)
+
+    if request.query_params.get('export') == 'csv':
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="class_mastery.csv"'
+        # 带 BOM，Excel 打开时中文不乱码
+        response.write('\ufeff')
+        writer = csv.writer(response)
+        writer.writerow(analytics.CSV_COLUMNS)
+        writer.writerows(analytics.to_csv_rows(mastery))
+        return response
+
+    return Response({
+        'difficulties': analytics.DIFFICULTIES,
+        'classes': [{'class_name': name, 'topics': topics} for name, topics in mastery.items()],
+    })
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def ai_generate_problems(request):
     """
     AI生成题目接口：根据科目、难度、主题、数量生成题目和解析
-    POST参数: subject, topic, difficulty, count
+    POST参数: subject, topic, difficulty, count, stream（可选，为真时按生成顺序流式返回 NDJSON）
     """
     user = request.user
     if not hasattr(user, 'role') or user.role != 'teacher':
@@ -265,100 +417,34 @@ def ai_generate_problems(request):
     if not (subject and topic and difficulty and count):
         return Response({'detail': '参数不完整'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # 读取API KEY和base_url
-    DEEPSEEK_API_KEY = "your_deepseek_api_key_here"  # 替换为实际的API Key
-    if not DEEPSEEK_API_KEY:
+    if count > generation.MAX_COUNT:
+        return Response({'detail': f'一次最多生成{generation.MAX_COUNT}道题'}, status=status.HTTP_400_BAD_REQUEST)
+    if not generation.DEEPSEEK_API_KEY:
         return Response({'detail': '未配置DEEPSEEK_API_KEY'}, status=500)
-    deepseek = OpenAI(api_key=DEEPSEEK_API_KEY, base_url="https://api.deepseek.com")
 
-    problems = []
-    generated_problem_hashes = set()  # 用于存储已生成题目的哈希值
-    
-    for i in range(count):
-        # 添加随机性因素，避免生成相似题目
-        current_time = str(time.time())
-        random_seed = random.randint(1000, 9999)
-        
-        prompt = f"""请生成一道{subject}题目，满足以下要求：
-1. 知识点: {topic}
-2. 难度级别: {difficulty}
-3. 题目要有明确的题干、答案和解析
-4. 请确保题目具有独特性和多样性
-5. 基于随机种子{random_seed}生成不同风格的题目
-6. 输出格式如下(不要出现反斜杠转义问题)：
-{{
-    "题目": "(具体题目描述)",
-    "知识点": "{topic}",
-    "难度": "{difficulty}",
-    "答案": "(答案内容)",
-    "解析": "(详细解析步骤)"
-}}
-请确保输出是有效的JSON格式，特别注意：当需要在JSON字符串中包含反斜杠或引号时，请确保正确转义。"""
-        
-        try:
-            response = deepseek.chat.completions.create(
-                model="deepseek-chat",
-                messages=[{"role": "user", "content": prompt}],
-                temperature=1.2 + (i * 0.1),  # 逐渐增加随机性
-                max_tokens=1500
-            )
-            result = response.choices[0].message.content
-            print(f"AI回复原始内容: {result}")
-            
-            # 查找JSON字符串
-            start_idx = result.find('{')
-            end_idx = result.rfind('}') + 1
-            
-            if start_idx != -1 and end_idx != -1 and start_idx < end_idx:
-                json_str = result[start_idx:end_idx]
-                
-                # 尝试解析JSON，如果失败，尝试修复常见问题
-                try:
-                    problem_data = json.loads(json_str)
-                except json.JSONDecodeError as e:
-                    print(f"JSON解析错误: {str(e)}")
-                    
-                    # 尝试替换可能导致问题的转义序列
-                    fixed_json = json_str.replace("\\", "\\\\")  # 双重转义反斜杠
-                    # 但不要双重转义已经正确转义的引号
-                    fixed_json = fixed_json.replace("\\\\\"", "\\\"")
-                    
-                    try:
-                        problem_data = json.loads(fixed_json)
-                    except json.JSONDecodeError:
-                        # 如果还是失败，返回错误信息
-                        problems.append({'error': f'JSON解析错误: {str(e)}'})
-                        continue
-                
-                # 验证所需字段是否存在
-                required_fields = ['题目', '知识点', '难度', '答案', '解析']
-                if all(field in problem_data for field in required_fields):
-                    # 检查题目是否重复
-                    problem_hash = hash(problem_data['题目'])
-                    if problem_hash in generated_problem_hashes:
-                        print("检测到重复题目，重新生成...")
-                        continue  # 跳过这次循环，重新生成
-                    
-                    # 如果不重复，添加到已生成集合和结果列表
-                    generated_problem_hashes.add(problem_hash)
-                    problems.append(problem_data)
+    results = generation.generate_problems(subject, topic, difficulty, count)
+    stream = request.data.get('stream') or request.query_params.get('stream')
+    if stream and str(stream).lower() not in ('0', 'false'):
+        # 逐行返回 JSON（NDJSON）：每生成完一道题输出一行（失败时为 error），
+        # 最后一行为汇总 {"done": true, "count": ..., "generated": ..., "failed": ...}
+        def lines():
+            generated = 0
+            for index, item in results:
+                if 'error' in item:
+                    row = {'index': index, 'error': item['error']}
                 else:
-                    missing = [f for f in required_fields if f not in problem_data]
-                    problems.append({
-                        'error': f'生成的数据缺少必要字段: {", ".join(missing)}',
-                        'data': problem_data
-                    })
-            else:
-                problems.append({'error': 'AI输出格式异常，无法提取JSON'})
-                
-            # 如果未生成足够数量的题目，可能需要额外尝试几次
-            if len(problems) < count and i == count - 1:
-                # 最后一次循环但还没生成够题目，继续尝试
-                i -= 1
-                
-        except Exception as e:
-            print(f"生成题目错误: {str(e)}")
-            problems.append({'error': str(e)})
-        time.sleep(0.5)
-    
-    return Response({'problems': problems})
\ No newline at end of file
+                    row = {'index': index, 'problem': item}
+                    generated += 1
+                yield json.dumps(row, ensure_ascii=False) + '\n'
+            yield json.dumps({'done': True, 'count': count, 'generated': generated,
+                              'failed': count - generated}) + '\n'
+
+        response = StreamingHttpResponse(lines(), content_type='application/x-ndjson; charset=utf-8')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    problems = [None] * count
+    for index, item in results:
+        problems[index] = item
+    return Response({'problems': problems})
@@ -146,7 +146,8 @@ async def run_teaching_agent(query: str, streaming: bool = True, identity: str =
             "请根据用户的问题选择合适的工具组合来获取信息。\n"
             "请确保回答完整，不要中途停止。\n"
             "你可以使用文件系统工具来读取和写入文件。如果没有指定文件夹，则默认读取 'doc' 文件夹\n"
-            "文件系统工具可以读写各种文本文件(txt, md, py, js等)，但不支持二进制文件(如图片、视频)\n"
+            "文件系统工具可以读写各种文本文件(txt, md, py, js等)，PDF、Word(docx)、PPT(pptx) 文档请使用 extract_text 工具提取文字，不支持图片、视频等其他二进制文件\n"
+            "查找某个主题的资料时，先用 search_files 工具全文检索，再读取命中的文件；大文件请用 next_token 分段读取\n"
             "你可以使用PDF工具将对话内容或报告导出为PDF文件，特别在用户要求保存或打印对话时。\n"
             "生成PDF时，默认保存到'reports'文件夹，确保先创建该文件夹。\n"
             "当涉及数学公式时，请使用标准的 Markdown 数学公式格式：\n"
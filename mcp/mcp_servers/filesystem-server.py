@@ -2,7 +2,25 @@ from mcp.server.fastmcp import FastMCP
 import os
 import sys
 import logging
+import asyncio
+import functools
+import time
 import traceback
+import base64
+import codecs
+import json
+import re
+import math
+import heapq
+import hashlib
+import shutil
+import tempfile
+import threading
+import zipfile
+from xml.etree import ElementTree
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from stat import S_ISDIR, S_ISLNK, S_ISREG, S_IMODE
 
 # 配置日志
 logging.basicConfig(
@@ -12,6 +30,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger("filesystem-mcp")
 
+# 单次读取返回的默认字节上限，避免把超大文件整块塞进 LLM 上下文
+DEFAULT_MAX_READ_BYTES = 64 * 1024
+# 字节上限的最小值：至少能容纳一个完整字符（UTF-8 / GB18030 最长 4 字节），保证每次读取都有进展
+MIN_READ_BYTES = 4
+# 跳过起始行之前的内容时每次读取的字节数，没有换行的超长行也不会整行读入内存
+SKIP_CHUNK_BYTES = 64 * 1024
+# 无 BOM 时依次尝试的候选编码
+CANDIDATE_ENCODINGS = ("utf-8", "gb18030")
+
+# 检索索引等缓存文件的存放目录
+FS_CACHE_DIR = os.path.abspath(os.getenv("FS_CACHE_DIR", ".fs_cache"))
+INDEX_VERSION = 1
+# 参与全文检索的文本文件扩展名
+INDEXABLE_EXTENSIONS = {
+    ".txt", ".md", ".markdown", ".rst", ".tex", ".csv", ".json", ".xml",
+    ".html", ".htm", ".py", ".js", ".vue", ".css", ".yaml", ".yml", ".log",
+}
+# 超过该大小的文件不建立索引
+MAX_INDEX_FILE_BYTES = 4 * 1024 * 1024
+# 可以用 extract_text 提取文字的文档格式，以及允许解析的最大文件大小
+EXTRACTABLE_EXTENSIONS = {".pdf", ".docx", ".pptx"}
+MAX_EXTRACT_FILE_BYTES = 200 * 1024 * 1024
+# 检索结果摘要的字符数
+SNIPPET_CHARS = 160
+
+# 阻塞文件 I/O 使用的线程池大小，以及单次操作的超时时间(秒)
+FS_IO_WORKERS = int(os.getenv("FS_IO_WORKERS", "8"))
+FS_IO_TIMEOUT = float(os.getenv("FS_IO_TIMEOUT", "30"))
+# 首次建立索引可能需要遍历整个目录树，单独设置更长的超时
+FS_SEARCH_TIMEOUT = float(os.getenv("FS_SEARCH_TIMEOUT", "300"))
+# 解析几百页的PDF较慢，同样使用更长的超时
+FS_EXTRACT_TIMEOUT = float(os.getenv("FS_EXTRACT_TIMEOUT", "300"))
+
+_io_executor = ThreadPoolExecutor(max_workers=FS_IO_WORKERS, thread_name_prefix="fs-io")
+
+
+async def _run_io(func, *args, timeout: float = FS_IO_TIMEOUT, **kwargs):
+    """在线程池中执行阻塞的文件操作，避免一次慢读取卡住整个事件循环
+
+    超时只是不再等待结果，线程中的操作并不会被取消。写入等有副作用的操作
+    应传入 timeout=None 一直等到完成，否则超时后无法知道操作是否已经生效。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_io_executor, functools.partial(func, *args, **kwargs))
+    if timeout is None:
+        return await future
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"文件操作超时（{timeout}秒）: {getattr(func, '__name__', func)}")
+
 try:
     mcp = FastMCP("filesystem")
     logger.info("FastMCP 文件系统服务器初始化成功")
@@ -21,22 +90,28 @@ except Exception as e:
     sys.exit(1)
 
 @mcp.tool()
-async def list_files(directory: str) -> dict:
+async def list_files(directory: str, detailed: bool = False) -> dict:
     """列出指定目录中的所有文件和文件夹
     
     Args:
         directory: 要列出的目录路径
+        detailed: 是否同时返回每一项的类型、大小和修改时间（可选）
     
     Returns:
         dict: 包含文件和文件夹列表或错误信息
     """
     try:
         logger.info(f"正在列出目录内容: {directory}")
-        if not os.path.exists(directory):
+        if not await _run_io(os.path.exists, directory):
             logger.warning(f"目录不存在: {directory}")
             return {"error": f"目录不存在: {directory}"}
-            
-        files = os.listdir(directory)
+
+        if detailed:
+            entries = await _run_io(_scan_directory, directory)
+            logger.info(f"成功列出 {len(entries)} 个文件/文件夹")
+            return {"entries": entries}
+
+        files = await _run_io(os.listdir, directory)
         logger.info(f"成功列出 {len(files)} 个文件/文件夹")
         return {"files": files}
     except Exception as e:
@@ -44,45 +119,282 @@ async def list_files(directory: str) -> dict:
         traceback.print_exc()
         return {"error": str(e)}
 
+class ReadError(Exception):
+    """读取参数或续读令牌无效时抛出"""
+
+
+def _detect_encoding(sample: bytes):
+    """根据已经读到内存中的字节判断编码，不会再次读取文件
+
+    Returns:
+        tuple: (编码名称, BOM 字节数)
+    """
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8", len(codecs.BOM_UTF8)
+    if sample.startswith(codecs.BOM_UTF16_LE):
+        return "utf-16-le", len(codecs.BOM_UTF16_LE)
+    if sample.startswith(codecs.BOM_UTF16_BE):
+        return "utf-16-be", len(codecs.BOM_UTF16_BE)
+    for encoding in CANDIDATE_ENCODINGS:
+        try:
+            # final=False 允许末尾出现被截断的多字节字符
+            codecs.getincrementaldecoder(encoding)().decode(sample, final=False)
+            return encoding, 0
+        except UnicodeDecodeError:
+            continue
+    return "latin-1", 0
+
+
+def _decode_window(data: bytes, encoding: str, at_eof: bool):
+    """解码一段字节，末尾不完整的多字节字符留给下一次读取
+
+    Returns:
+        tuple: (文本, 实际消费的字节数)
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    text = decoder.decode(data, final=at_eof)
+    pending = len(decoder.getstate()[0])
+    return text, len(data) - pending
+
+
+def _encode_token(state: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(state).encode("utf-8")).decode("ascii")
+
+
+def _decode_token(token: str, file_path: str, stat: os.stat_result) -> dict:
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except (ValueError, UnicodeError) as e:
+        raise ReadError(f"续读令牌无效: {e}")
+    if state.get("path") != os.path.abspath(file_path):
+        raise ReadError("续读令牌与文件路径不匹配")
+    if state.get("mtime_ns") != stat.st_mtime_ns or state.get("size") != stat.st_size:
+        raise ReadError("文件在两次读取之间被修改，请从头重新读取")
+    return state
+
+
+def _read_byte_range(file_path, stat, offset, length, max_bytes, encoding=None):
+    """按字节范围读取文件，只读取一次磁盘"""
+    size = stat.st_size
+    offset = max(0, min(offset, size))
+    # length 小于一个字符时也读满一个字符，否则解码不出内容，next_offset 不会前进
+    limit = max_bytes if length is None else max(min(length, max_bytes), MIN_READ_BYTES)
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        data = file.read(limit)
+
+    # 偏移量可能落在 UTF-8 多字节字符中间，开头的续字节(0b10xxxxxx)不属于任何完整字符
+    continuation = 0
+    if offset > 0:
+        while continuation < min(3, len(data)) and data[continuation] & 0xC0 == 0x80:
+            continuation += 1
+
+    skipped = 0
+    if encoding is None:
+        # 跳过续字节后再判断编码，否则残缺的字符会让 UTF-8 文件被误判为 gb18030 或 latin-1
+        encoding, skipped = _detect_encoding(data[continuation:])
+        if offset > 0:
+            skipped = 0
+    elif offset == 0:
+        _, skipped = _detect_encoding(data[:4])
+    if encoding == "utf-8":
+        skipped += continuation
+
+    at_eof = offset + len(data) >= size
+    text, consumed = _decode_window(data[skipped:], encoding, at_eof)
+    # 返回的 offset 为内容实际开始的位置（已跳过残缺字符，不含 BOM）
+    start = offset + continuation if encoding == "utf-8" else offset
+    next_offset = offset + skipped + consumed
+    remaining = None if length is None else max(length - (next_offset - offset), 0)
+    eof = next_offset >= size or remaining == 0
+    return {
+        "content": text,
+        "encoding": encoding,
+        "size": size,
+        "offset": start,
+        "next_offset": next_offset,
+        "bytes_read": next_offset - start,
+        "eof": eof,
+        "_state": None if eof else {
+            "mode": "bytes",
+            "offset": next_offset,
+            "length": remaining,
+            "encoding": encoding,
+        },
+    }
+
+
+def _read_line_range(file_path, stat, start_line, end_line, max_bytes, offset=0, line_no=1, encoding=None):
+    """按行号范围读取文件（行号从1开始，包含两端），超过字节上限时停止
+
+    单行超过字节上限时只返回该行的前一部分（truncated 为 True），
+    续读令牌指向该行中间，下一次从断开处继续读取该行。
+    每次用 readline(limit) 限长读取，没有换行的大文件也不会整行读入内存。
+    """
+    chunks = []
+    used = 0
+    first_line = last_line = None
+    truncated = False
+    bom = 0
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        while line_no < start_line:
+            raw = file.readline(SKIP_CHUNK_BYTES)
+            if not raw:
+                break
+            offset += len(raw)
+            if raw.endswith(b"\n"):
+                line_no += 1
+        while True:
+            if end_line is not None and line_no > end_line:
+                break
+            # 多读一个字节，用于判断该行（含换行符）是否超过上限
+            raw = file.readline(max_bytes + 1)
+            if not raw:
+                break
+            if used + len(raw) > max_bytes and chunks:
+                break
+            if first_line is None:
+                first_line = line_no
+            last_line = line_no
+            if len(raw) > max_bytes:
+                # 单行超过上限：在字符边界处断开，行号不变，下一次从断开处继续读取该行
+                head = raw[:max_bytes]
+                if encoding is None:
+                    encoding, bom = _detect_encoding(head)
+                _, cut = _decode_window(head, encoding, at_eof=False)
+                cut = cut or len(head)
+                chunks.append(raw[:cut])
+                offset += cut
+                truncated = True
+                break
+            chunks.append(raw)
+            used += len(raw)
+            offset += len(raw)
+            line_no += 1
+
+    data = b"".join(chunks)
+    if encoding is None:
+        encoding, bom = _detect_encoding(data)
+    if first_line == 1:
+        data = data[bom:]
+    text = codecs.decode(data, encoding, errors="replace")
+    eof = offset >= stat.st_size or (end_line is not None and line_no > end_line)
+    return {
+        "content": text,
+        "encoding": encoding,
+        "size": stat.st_size,
+        "start_line": first_line,
+        "end_line": last_line,
+        "next_offset": offset,
+        "truncated": truncated,
+        "eof": eof,
+        "_state": None if eof else {
+            "mode": "lines",
+            "offset": offset,
+            "line": line_no,
+            "end_line": end_line,
+            "encoding": encoding,
+        },
+    }
+
+
+def _read_text(file_path, offset=0, length=None, start_line=None, end_line=None,
+               max_bytes=DEFAULT_MAX_READ_BYTES, continuation_token=None) -> dict:
+    """读取文本文件的一段内容，返回内容、编码以及续读令牌"""
+    if max_bytes is None or max_bytes <= 0:
+        max_bytes = DEFAULT_MAX_READ_BYTES
+    max_bytes = max(max_bytes, MIN_READ_BYTES)
+    stat = os.stat(file_path)
+
+    if continuation_token:
+        state = _decode_token(continuation_token, file_path, stat)
+        if state["mode"] == "lines":
+            result = _read_line_range(
+                file_path, stat, state["line"], state["end_line"], max_bytes,
+                offset=state["offset"], line_no=state["line"], encoding=state["encoding"]
+            )
+        else:
+            result = _read_byte_range(
+                file_path, stat, state["offset"], state["length"], max_bytes,
+                encoding=state["encoding"]
+            )
+    elif start_line is not None or end_line is not None:
+        start_line = max(1, start_line or 1)
+        if end_line is not None and end_line < start_line:
+            raise ReadError(f"结束行号 {end_line} 小于起始行号 {start_line}")
+        result = _read_line_range(file_path, stat, start_line, end_line, max_bytes)
+    else:
+        if offset < 0 or (length is not None and length < 0):
+            raise ReadError("offset 和 length 不能为负数")
+        result = _read_byte_range(file_path, stat, offset, length, max_bytes)
+
+    state = result.pop("_state")
+    if state is not None:
+        state.update(path=os.path.abspath(file_path), mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        result["next_token"] = _encode_token(state)
+    else:
+        result["next_token"] = None
+    return result
+
+
 @mcp.tool()
-async def read_file(file_path: str) -> dict:
-    """读取指定文件的内容
-    
+async def read_file(file_path: str, offset: int = 0, length: int = None,
+                    start_line: int = None, end_line: int = None,
+                    max_bytes: int = DEFAULT_MAX_READ_BYTES,
+                    continuation_token: str = None) -> dict:
+    """读取指定文件的内容，支持按字节范围或行号范围分段读取
+
+    每次最多返回 max_bytes 字节的内容。如果文件没有读完，结果中的
+    next_token 不为空，将其作为 continuation_token 再次调用即可继续读取。
+
     Args:
         file_path: 要读取的文件路径
+        offset: 起始字节偏移量（可选，默认从文件开头读取）
+        length: 最多读取的字节数（可选）
+        start_line: 起始行号，从1开始（可选，指定后按行读取）
+        end_line: 结束行号，包含该行（可选）
+        max_bytes: 单次返回的最大字节数（可选，默认64KB）
+        continuation_token: 上一次读取返回的 next_token（可选）
     
     Returns:
-        dict: 包含文件内容或错误信息
+        dict: 包含文件内容、编码、是否读完(eof)和续读令牌(next_token)，或错误信息
     """
     try:
         logger.info(f"正在读取文件: {file_path}")
-        if not os.path.exists(file_path):
+        if not await _run_io(os.path.exists, file_path):
             logger.warning(f"文件不存在: {file_path}")
             return {"error": f"文件不存在: {file_path}"}
             
-        if not os.path.isfile(file_path):
+        if not await _run_io(os.path.isfile, file_path):
             logger.warning(f"路径不是文件: {file_path}")
             return {"error": f"路径不是文件: {file_path}"}
-            
-        with open(file_path, 'r', encoding='utf-8') as file:
-            content = file.read()
-        logger.info(f"成功读取文件: {file_path}")
-        return {"content": content}
-    except UnicodeDecodeError:
-        logger.error(f"文件编码错误，尝试使用其他编码: {file_path}")
-        try:
-            with open(file_path, 'r', encoding='latin-1') as file:
-                content = file.read()
-            logger.info(f"使用latin-1编码成功读取文件: {file_path}")
-            return {"content": content}
-        except Exception as e:
-            logger.error(f"使用备用编码读取文件时出错: {str(e)}")
-            return {"error": f"文件编码错误: {str(e)}"}
+
+        if os.path.splitext(file_path)[1].lower() in EXTRACTABLE_EXTENSIONS:
+            return {"error": f"{file_path} 是PDF/Office文档，请使用 extract_text 工具提取文字"}
+
+        result = await _run_io(_read_text, file_path, offset, length, start_line, end_line,
+                               max_bytes, continuation_token)
+        logger.info(f"成功读取文件: {file_path} (编码: {result['encoding']}, 读完: {result['eof']})")
+        return result
+    except ReadError as e:
+        logger.warning(f"读取参数无效: {str(e)}")
+        return {"error": str(e)}
     except Exception as e:
         logger.error(f"读取文件时出错: {str(e)}")
         traceback.print_exc()
         return {"error": str(e)}
 
+def _write_text(file_path: str, content: str):
+    # 确保目录存在
+    dir_name = os.path.dirname(file_path)
+    if dir_name and not os.path.exists(dir_name):
+        logger.info(f"创建目录: {dir_name}")
+        os.makedirs(dir_name, exist_ok=True)
+
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write(content)
+
 @mcp.tool()
 async def write_file(file_path: str, content: str) -> dict:
     """写入内容到指定文件
@@ -96,14 +408,7 @@ async def write_file(file_path: str, content: str) -> dict:
     """
     try:
         logger.info(f"准备写入文件: {file_path}")
-        # 确保目录存在
-        dir_name = os.path.dirname(file_path)
-        if dir_name and not os.path.exists(dir_name):
-            logger.info(f"创建目录: {dir_name}")
-            os.makedirs(dir_name)
-            
-        with open(file_path, 'w', encoding='utf-8') as file:
-            file.write(content)
+        await _run_io(_write_text, file_path, content, timeout=None)
         logger.info(f"成功写入文件: {file_path}")
         return {"success": f"文件写入成功: {file_path}"}
     except Exception as e:
@@ -124,7 +429,7 @@ async def file_exists(file_path: str) -> dict:
     """
     try:
         logger.info(f"检查文件是否存在: {file_path}")
-        exists = os.path.exists(file_path)
+        exists = await _run_io(os.path.exists, file_path)
         logger.info(f"文件 {file_path} 存在: {exists}")
         return {"exists": exists}
     except Exception as e:
@@ -132,8 +437,697 @@ async def file_exists(file_path: str) -> dict:
         traceback.print_exc()
         return {"error": str(e)}
 
+def _entry_type(is_dir: bool, is_file: bool, is_symlink: bool) -> str:
+    if is_symlink:
+        return "symlink"
+    if is_dir:
+        return "directory"
+    if is_file:
+        return "file"
+    return "other"
+
+
+def _scan_directory(directory: str) -> list:
+    """一次 os.scandir 遍历返回目录项的名称、类型、大小和修改时间"""
+    entries = []
+    with os.scandir(directory) as iterator:
+        for entry in iterator:
+            try:
+                stat = entry.stat(follow_symlinks=False)
+                entries.append({
+                    "name": entry.name,
+                    "type": _entry_type(entry.is_dir(follow_symlinks=False),
+                                        entry.is_file(follow_symlinks=False),
+                                        entry.is_symlink()),
+                    "size": stat.st_size,
+                    "mtime": stat.st_mtime,
+                })
+            except OSError as e:
+                entries.append({"name": entry.name, "error": str(e)})
+    return entries
+
+
+def _stat_path(path: str) -> dict:
+    try:
+        stat = os.stat(path, follow_symlinks=False)
+    except FileNotFoundError:
+        return {"path": path, "exists": False}
+    except OSError as e:
+        return {"path": path, "error": str(e)}
+    return {
+        "path": path,
+        "exists": True,
+        "type": _entry_type(S_ISDIR(stat.st_mode),
+                            S_ISREG(stat.st_mode),
+                            S_ISLNK(stat.st_mode)),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
+def _read_one(file_path: str, max_bytes: int) -> dict:
+    """read_many 中单个文件的读取，错误只影响该文件"""
+    try:
+        if not os.path.isfile(file_path):
+            return {"file_path": file_path, "error": f"文件不存在或不是文件: {file_path}"}
+        result = _read_text(file_path, max_bytes=max_bytes)
+        result["file_path"] = file_path
+        return result
+    except (ReadError, OSError) as e:
+        return {"file_path": file_path, "error": str(e)}
+
+
+def _write_many_atomic(files: list) -> list:
+    """原子地写入多个文件
+
+    先把所有内容写入目标目录下的临时文件并落盘，全部成功后再逐个
+    os.replace 到目标路径。任一步骤失败时删除临时文件，并把已经替换
+    的文件恢复为原内容，保证要么全部写入、要么全部不变。
+    """
+    staged = []   # (目标路径, 临时文件路径, 备份路径或None)
+    replaced = []
+    try:
+        for item in files:
+            file_path = item["file_path"]
+            dir_name = os.path.dirname(os.path.abspath(file_path))
+            os.makedirs(dir_name, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(prefix=".tmp-", dir=dir_name)
+            staged.append((file_path, temp_path, None))
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                file.write(item.get("content", ""))
+                file.flush()
+                os.fsync(file.fileno())
+            # mkstemp 创建的文件权限为 0600，改为与原文件一致
+            try:
+                mode = S_IMODE(os.stat(file_path).st_mode)
+            except FileNotFoundError:
+                mode = 0o644
+            os.chmod(temp_path, mode)
+
+        # 为已存在的目标文件建立备份，用于失败时回滚
+        for i, (file_path, temp_path, _) in enumerate(staged):
+            if os.path.isfile(file_path):
+                backup_path = f"{temp_path}.bak"
+                try:
+                    os.link(file_path, backup_path)
+                except OSError:
+                    shutil.copy2(file_path, backup_path)
+                staged[i] = (file_path, temp_path, backup_path)
+
+        for file_path, temp_path, backup_path in staged:
+            os.replace(temp_path, file_path)
+            replaced.append((file_path, backup_path))
+    except Exception:
+        for file_path, backup_path in reversed(replaced):
+            try:
+                if backup_path:
+                    os.replace(backup_path, file_path)
+                else:
+                    os.unlink(file_path)
+            except OSError as e:
+                logger.error(f"回滚文件失败 {file_path}: {str(e)}")
+        raise
+    finally:
+        for _, temp_path, backup_path in staged:
+            for path in (temp_path, backup_path):
+                if path and os.path.exists(path):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+    return [item["file_path"] for item in files]
+
+
+@mcp.tool()
+async def read_many(file_paths: list[str], max_bytes: int = DEFAULT_MAX_READ_BYTES) -> dict:
+    """一次读取多个文件的内容
+
+    Args:
+        file_paths: 要读取的文件路径列表
+        max_bytes: 每个文件最多返回的字节数（可选，默认64KB，未读完时返回 next_token）
+    
+    Returns:
+        dict: results 列表，按输入顺序给出每个文件的内容或错误信息
+    """
+    try:
+        logger.info(f"批量读取 {len(file_paths)} 个文件")
+        # 各文件在线程池中并发读取
+        results = await asyncio.gather(*(_run_io(_read_one, path, max_bytes) for path in file_paths))
+        failed = sum(1 for r in results if "error" in r)
+        logger.info(f"批量读取完成，失败 {failed} 个")
+        return {"results": list(results)}
+    except Exception as e:
+        logger.error(f"批量读取文件时出错: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e)}
+
+@mcp.tool()
+async def stat_many(paths: list[str]) -> dict:
+    """一次查询多个路径是否存在及其类型、大小和修改时间
+    
+    Args:
+        paths: 要查询的路径列表
+    
+    Returns:
+        dict: results 列表，按输入顺序给出每个路径的信息
+    """
+    try:
+        logger.info(f"批量查询 {len(paths)} 个路径")
+        results = await asyncio.gather(*(_run_io(_stat_path, path) for path in paths))
+        return {"results": list(results)}
+    except Exception as e:
+        logger.error(f"批量查询路径时出错: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e)}
+
+@mcp.tool()
+async def write_many(files: list[dict]) -> dict:
+    """原子地写入多个文件：要么全部写入成功，要么全部保持原样
+    
+    Args:
+        files: 文件列表，每项形如 {"file_path": 路径, "content": 内容}
+    
+    Returns:
+        dict: 写入成功的文件列表或错误信息
+    """
+    try:
+        logger.info(f"准备批量写入 {len(files)} 个文件")
+        missing = [i for i, item in enumerate(files) if not item.get("file_path")]
+        if missing:
+            return {"error": f"第 {missing} 项缺少 file_path"}
+        # 不设超时：超时后线程中的写入仍会继续，无法再保证“全部保持原样”
+        written = await _run_io(_write_many_atomic, files, timeout=None)
+        logger.info(f"批量写入成功: {written}")
+        return {"success": True, "files": written}
+    except Exception as e:
+        logger.error(f"批量写入文件时出错，已回滚: {str(e)}")
+        traceback.print_exc()
+        return {"error": f"批量写入失败，所有文件保持原样: {str(e)}"}
+
+class ExtractError(Exception):
+    """无法从文档中提取文字时抛出"""
+
+
+# Office Open XML 文档中使用的命名空间
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_SLIDE_RE = re.compile(r"ppt/slides/slide(\d+)\.xml$")
+
+# (绝对路径, mtime_ns, 大小) -> 内容哈希，避免重复计算大文件的哈希
+_content_hashes = {}
+_content_hashes_lock = threading.Lock()
+
+
+def _file_hash(file_path: str, stat: os.stat_result) -> str:
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    with _content_hashes_lock:
+        digest = _content_hashes.get(key)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        with _content_hashes_lock:
+            _content_hashes[key] = digest
+    return digest
+
+
+def _extract_pdf_pages(file_path: str) -> list:
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ExtractError("未安装 pypdf，无法提取PDF文字，请执行 pip install pypdf")
+    reader = PdfReader(file_path)
+    pages = []
+    for page in reader.pages:
+        try:
+            pages.append(page.extract_text() or "")
+        except Exception as e:
+            logger.warning(f"提取PDF页面文字失败: {str(e)}")
+            pages.append("")
+    return pages
+
+
+def _extract_docx_pages(file_path: str) -> list:
+    """按文档中的分页符切分 Word 文档的段落文字"""
+    with zipfile.ZipFile(file_path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    pages = [[]]
+    for paragraph in root.iter(f"{_W_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{_W_NS}t" and node.text:
+                parts.append(node.text)
+            elif node.tag == f"{_W_NS}tab":
+                parts.append("\t")
+            elif (node.tag == f"{_W_NS}br" and node.get(f"{_W_NS}type") == "page") \
+                    or node.tag == f"{_W_NS}lastRenderedPageBreak":
+                if parts or pages[-1]:
+                    pages[-1].append("".join(parts))
+                    parts = []
+                    pages.append([])
+        pages[-1].append("".join(parts))
+    return ["\n".join(lines).strip() for lines in pages]
+
+
+def _extract_pptx_pages(file_path: str) -> list:
+    """每张幻灯片作为一页，按幻灯片编号排序"""
+    with zipfile.ZipFile(file_path) as archive:
+        slides = []
+        for name in archive.namelist():
+            match = _SLIDE_RE.match(name)
+            if match:
+                slides.append((int(match.group(1)), name))
+        pages = []
+        for _, name in sorted(slides):
+            root = ElementTree.fromstring(archive.read(name))
+            lines = []
+            for paragraph in root.iter(f"{_A_NS}p"):
+                text = "".join(node.text or "" for node in paragraph.iter(f"{_A_NS}t"))
+                if text:
+                    lines.append(text)
+            pages.append("\n".join(lines))
+    return pages
+
+
+_EXTRACTORS = {
+    ".pdf": _extract_pdf_pages,
+    ".docx": _extract_docx_pages,
+    ".pptx": _extract_pptx_pages,
+}
+
+
+def _extract_pages(file_path: str):
+    """提取文档每一页的文字，结果按内容哈希缓存在 FS_CACHE_DIR 中
+
+    Returns:
+        tuple: (页面文字列表, 是否命中缓存)
+    """
+    ext = os.path.splitext(file_path)[1].lower()
+    extractor = _EXTRACTORS.get(ext)
+    if extractor is None:
+        raise ExtractError(f"不支持的文档格式: {ext}，支持 {', '.join(sorted(_EXTRACTORS))}")
+    stat = os.stat(file_path)
+    if stat.st_size > MAX_EXTRACT_FILE_BYTES:
+        raise ExtractError(f"文件过大: {stat.st_size} 字节")
+
+    digest = _file_hash(file_path, stat)
+    cache_path = os.path.join(FS_CACHE_DIR, "extract", f"{digest}.json")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            return json.load(file)["pages"], True
+    except (FileNotFoundError, ValueError, KeyError):
+        pass
+
+    try:
+        pages = extractor(file_path)
+    except ExtractError:
+        raise
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ExtractError(f"文档已损坏或格式不正确: {str(e)}")
+    except Exception as e:
+        raise ExtractError(f"解析文档失败: {str(e)}")
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump({"format": ext.lstrip('.'), "pages": pages}, file, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+    return pages, False
+
+
+def _extract_text(file_path: str, start_page: int = None, end_page: int = None,
+                  max_chars: int = DEFAULT_MAX_READ_BYTES) -> dict:
+    pages, cached = _extract_pages(file_path)
+    page_count = len(pages)
+    start = max(1, start_page or 1)
+    end = min(page_count, end_page or page_count)
+    if max_chars is None or max_chars <= 0:
+        max_chars = DEFAULT_MAX_READ_BYTES
+
+    parts = []
+    truncated_pages = []
+    used = 0
+    page = start
+    while page <= end:
+        text = pages[page - 1]
+        if parts and used + len(text) > max_chars:
+            break
+        if len(text) > max_chars:
+            # 单页超过上限时只返回该页的前 max_chars 个字符，在结果中注明
+            truncated_pages.append(page)
+            logger.warning(f"{file_path} 第 {page} 页共 {len(text)} 个字符，只返回前 {max_chars} 个")
+        parts.append(f"--- 第 {page} 页 ---\n{text[:max_chars]}")
+        used += len(text)
+        page += 1
+    return {
+        "content": "\n\n".join(parts),
+        "format": os.path.splitext(file_path)[1].lower().lstrip('.'),
+        "page_count": page_count,
+        "start_page": start if parts else None,
+        "end_page": page - 1 if parts else None,
+        "next_page": page if page <= end else None,
+        "truncated_pages": truncated_pages,
+        "cached": cached,
+    }
+
+
+@mcp.tool()
+async def extract_text(file_path: str, start_page: int = None, end_page: int = None,
+                       max_chars: int = DEFAULT_MAX_READ_BYTES) -> dict:
+    """提取 PDF、Word(docx)、PowerPoint(pptx) 文档中的文字
+
+    提取结果按文件内容缓存，重复读取同一份教材不会重新解析。
+    PowerPoint 的页码即幻灯片编号。内容超过 max_chars 时在页边界处截断，
+    next_page 给出下一次调用应使用的 start_page；单页就超过 max_chars 时
+    只返回该页的前 max_chars 个字符，页码列在 truncated_pages 中
+    （检索索引不受影响，仍包含完整内容）。
+
+    Args:
+        file_path: 文档路径
+        start_page: 起始页码，从1开始（可选）
+        end_page: 结束页码，包含该页（可选）
+        max_chars: 单次返回的最大字符数（可选，默认65536）
+    
+    Returns:
+        dict: 包含文字内容、总页数、返回的页码范围、next_page 和 truncated_pages，或错误信息
+    """
+    try:
+        logger.info(f"正在提取文档文字: {file_path}")
+        if not await _run_io(os.path.isfile, file_path):
+            logger.warning(f"文件不存在: {file_path}")
+            return {"error": f"文件不存在: {file_path}"}
+
+        result = await _run_io(_extract_text, file_path, start_page, end_page, max_chars,
+                               timeout=FS_EXTRACT_TIMEOUT)
+        logger.info(f"成功提取文档文字: {file_path} (共 {result['page_count']} 页, 缓存: {result['cached']})")
+        return result
+    except ExtractError as e:
+        logger.warning(f"提取文档文字失败: {str(e)}")
+        return {"error": str(e)}
+    except Exception as e:
+        logger.error(f"提取文档文字时出错: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e)}
+
+# 匹配英文单词/数字以及连续的中日韩文字
+_TOKEN_RE = re.compile(r"[a-z0-9_]+|[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def _tokenize(text: str) -> list:
+    """分词：英文按单词切分，中日韩文字按相邻二元组(bigram)切分"""
+    tokens = []
+    for match in _TOKEN_RE.finditer(text.lower()):
+        run = match.group()
+        if run[0] < "\u3400" or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _read_whole_text(file_path: str, limit: int = MAX_INDEX_FILE_BYTES) -> str:
+    """读取文件开头至多 limit 字节并解码"""
+    with open(file_path, 'rb') as file:
+        data = file.read(limit)
+    encoding, bom = _detect_encoding(data)
+    return codecs.decode(data[bom:], encoding, errors="replace")
+
+
+def _document_text(file_path: str) -> str:
+    """返回用于检索的文档文字，PDF/Office 文档使用提取缓存"""
+    if os.path.splitext(file_path)[1].lower() in EXTRACTABLE_EXTENSIONS:
+        pages, _ = _extract_pages(file_path)
+        return "\n".join(pages)
+    return _read_whole_text(file_path)
+
+
+class DocumentIndex:
+    """目录树的持久化倒排索引
+
+    索引保存在 FS_CACHE_DIR 下，每次检索前对比文件的 mtime 和大小，
+    只重新分词发生变化的文件，检索结果按 BM25 排序。
+    """
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        digest = hashlib.sha1(self.root.encode("utf-8")).hexdigest()[:16]
+        self.index_path = os.path.join(FS_CACHE_DIR, "index", f"{digest}.json")
+        self.docs = {}       # 相对路径 -> {"mtime_ns", "size", "length", "terms"}
+        self.postings = {}   # 词项 -> {相对路径: 词频}
+        self.total_length = 0
+        self.lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+                return
+            self.docs = data["docs"]
+            self.postings = data["postings"]
+            self.total_length = data["total_length"]
+            logger.info(f"已加载索引: {self.index_path} ({len(self.docs)} 个文件)")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"索引文件损坏，将重新建立: {str(e)}")
+            self.docs, self.postings, self.total_length = {}, {}, 0
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        data = {
+            "version": INDEX_VERSION,
+            "root": self.root,
+            "docs": self.docs,
+            "postings": self.postings,
+            "total_length": self.total_length,
+        }
+        temp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, self.index_path)
+
+    def _walk(self):
+        """遍历目录树，返回 (相对路径, stat) ，跳过隐藏目录和不可索引的文件"""
+        stack = [self.root]
+        while stack:
+            current = stack.pop()
+            try:
+                entries = list(os.scandir(current))
+            except OSError as e:
+                logger.warning(f"无法访问目录 {current}: {str(e)}")
+                continue
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    ext = os.path.splitext(entry.name)[1].lower()
+                    if ext in EXTRACTABLE_EXTENSIONS:
+                        size_limit = MAX_EXTRACT_FILE_BYTES
+                    elif ext in INDEXABLE_EXTENSIONS:
+                        size_limit = MAX_INDEX_FILE_BYTES
+                    else:
+                        continue
+                    stat = entry.stat()
+                    if stat.st_size <= size_limit:
+                        yield os.path.relpath(entry.path, self.root), stat
+
+    def _add(self, rel_path: str, stat: os.stat_result):
+        try:
+            text = _document_text(os.path.join(self.root, rel_path))
+        except (OSError, ExtractError) as e:
+            # 记录为空文档，文件未修改前不再重复尝试
+            logger.warning(f"索引文件失败 {rel_path}: {str(e)}")
+            text = ""
+        counts = Counter(_tokenize(text))
+        length = sum(counts.values())
+        self.docs[rel_path] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "length": length,
+            "terms": list(counts),
+        }
+        self.total_length += length
+        for term, tf in counts.items():
+            self.postings.setdefault(term, {})[rel_path] = tf
+
+    def _remove(self, rel_path: str):
+        doc = self.docs.pop(rel_path)
+        self.total_length -= doc["length"]
+        for term in doc["terms"]:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(rel_path, None)
+            if not posting:
+                del self.postings[term]
+
+    def refresh(self) -> int:
+        """增量刷新索引，返回发生变化的文件数"""
+        current = dict(self._walk())
+        changed = 0
+        for rel_path in [p for p in self.docs if p not in current]:
+            self._remove(rel_path)
+            changed += 1
+        for rel_path, stat in current.items():
+            doc = self.docs.get(rel_path)
+            if doc and doc["mtime_ns"] == stat.st_mtime_ns and doc["size"] == stat.st_size:
+                continue
+            if doc:
+                self._remove(rel_path)
+            self._add(rel_path, stat)
+            changed += 1
+        if changed:
+            self._save()
+            logger.info(f"索引已更新: {self.root} ({changed} 个文件变化)")
+        return changed
+
+    def search(self, query: str, top_k: int = 10) -> list:
+        """按 BM25 计算相关度，返回 [(相对路径, 得分)]"""
+        terms = list(dict.fromkeys(_tokenize(query)))
+        if not terms or not self.docs:
+            return []
+        n_docs = len(self.docs)
+        avg_length = self.total_length / n_docs or 1
+        scores = defaultdict(float)
+        for term in terms:
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for rel_path, tf in posting.items():
+                norm = 1 - self.B + self.B * self.docs[rel_path]["length"] / avg_length
+                scores[rel_path] += idf * tf * (self.K1 + 1) / (tf + self.K1 * norm)
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+
+# 已加载的索引，按根目录缓存
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def _get_index(directory: str) -> DocumentIndex:
+    root = os.path.abspath(directory)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = DocumentIndex(root)
+        return _indexes[root]
+
+
+def _make_snippet(text: str, terms: list, width: int = SNIPPET_CHARS) -> str:
+    """截取第一个命中词附近的文本作为摘要"""
+    lowered = text.lower()
+    positions = [pos for pos in (lowered.find(term) for term in terms) if pos >= 0]
+    if not positions:
+        return " ".join(text[:width].split())
+    start = max(0, min(positions) - width // 3)
+    snippet = " ".join(text[start:start + width].split())
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(text) else ""
+    return f"{prefix}{snippet}{suffix}"
+
+
+def _search_files(query: str, directory: str, top_k: int) -> dict:
+    index = _get_index(directory)
+    with index.lock:
+        updated = index.refresh()
+        ranked = index.search(query, top_k)
+        indexed = len(index.docs)
+    terms = list(dict.fromkeys(_tokenize(query)))
+    results = []
+    for rel_path, score in ranked:
+        path = os.path.join(index.root, rel_path)
+        try:
+            snippet = _make_snippet(_document_text(path), terms)
+        except (OSError, ExtractError):
+            snippet = ""
+        results.append({"path": path, "score": round(score, 4), "snippet": snippet})
+    return {"results": results, "indexed_files": indexed, "updated_files": updated}
+
+
+@mcp.tool()
+async def search_files(query: str, directory: str = "doc", top_k: int = 10) -> dict:
+    """在目录及其子目录的文本文档中全文检索，按相关度返回文件和匹配片段
+
+    适合按主题查找教学文档，一次调用即可定位相关文件，无需逐个读取。
+    支持中文检索，索引会自动随文件修改增量更新。
+
+    Args:
+        query: 检索关键词或问题
+        directory: 要检索的目录（可选，默认为 doc）
+        top_k: 最多返回的结果数（可选，默认10）
+    
+    Returns:
+        dict: 包含按相关度排序的结果列表(路径、得分、片段)或错误信息
+    """
+    try:
+        logger.info(f"正在检索目录 {directory}: {query}")
+        if not await _run_io(os.path.isdir, directory):
+            logger.warning(f"目录不存在: {directory}")
+            return {"error": f"目录不存在: {directory}"}
+        if not query or not query.strip():
+            return {"error": "检索关键词不能为空"}
+
+        result = await _run_io(_search_files, query, directory, max(1, top_k), timeout=FS_SEARCH_TIMEOUT)
+        logger.info(f"检索完成，命中 {len(result['results'])} 个文件")
+        return result
+    except Exception as e:
+        logger.error(f"检索文件时出错: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e)}
+
+def _run_benchmark(n_files: int = 64, file_size: int = 256 * 1024, latency: float = 0.02):
+    """并发读取的微基准：比较在事件循环中直接读取与经线程池读取的吞吐量
+
+    latency 用于模拟网络共享目录的单次读取延迟(秒)，设为0则测试本地磁盘。
+    """
+    workdir = tempfile.mkdtemp(prefix="fs-bench-")
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(workdir, f"doc_{i}.md")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(("第%d份讲义 lesson notes\n" % i) * (file_size // 32))
+        paths.append(path)
+
+    def slow_read(path):
+        if latency:
+            time.sleep(latency)
+        return _read_text(path, max_bytes=file_size)
+
+    async def blocking_reads():
+        async def one(path):
+            return slow_read(path)
+        return await asyncio.gather(*(one(path) for path in paths))
+
+    async def executor_reads():
+        return await asyncio.gather(*(_run_io(slow_read, path) for path in paths))
+
+    try:
+        print(f"文件数: {n_files}, 单个文件: {file_size // 1024}KB, 模拟延迟: {latency * 1000:.0f}ms, "
+              f"线程池: {FS_IO_WORKERS}")
+        for name, runner in (("事件循环内直接读取", blocking_reads), ("线程池并发读取", executor_reads)):
+            start = time.perf_counter()
+            results = asyncio.run(runner())
+            elapsed = time.perf_counter() - start
+            total_bytes = sum(r["bytes_read"] for r in results)
+            print(f"{name}: {elapsed:.3f}s, {n_files / elapsed:.1f} 文件/秒, "
+                  f"{total_bytes / elapsed / 1024 / 1024:.1f} MB/s")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
 # 主程序入口
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        logging.getLogger().setLevel(logging.WARNING)
+        _run_benchmark()
+        sys.exit(0)
     try:
         logger.info("启动文件系统 MCP 服务...")
         mcp.run(transport='stdio')
@@ -1,8 +1,17 @@
 import os
+import io
+import time
+import gzip
+import html
+import string
+import hashlib
+import tempfile
 import threading
+from collections import OrderedDict
 from pathlib import Path
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from urllib.parse import urlparse, parse_qs
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from urllib.parse import urlparse, urlsplit, unquote, parse_qs
 import webbrowser
 import logging
 import socket
@@ -19,9 +28,29 @@ server_instance = None
 server_port = 8080  # 默认端口
 web_root = None
 
-# 系统页面映射关系
+# 空闲的keep-alive连接保持的秒数，超时后释放处理线程
+KEEP_ALIVE_TIMEOUT = int(os.getenv("LOCAL_WEB_KEEP_ALIVE", "15"))
+# 超过该大小的文件用 sendfile 直接从内核发送
+SENDFILE_MIN_BYTES = 64 * 1024
+# 小于该大小的文件不值得压缩
+GZIP_MIN_BYTES = 1024
+# 这些类型的文件会生成 .gz 预压缩版本
+GZIP_TYPES = {"text/html", "text/css", "text/plain", "text/javascript", "application/javascript",
+              "application/json", "image/svg+xml"}
+
+# 页面更新通知(SSE)的心跳间隔(秒)
+SSE_HEARTBEAT = 15
+# 页面更新通知和页面正文片段的地址
+EVENTS_PATH = "/_events"
+FRAGMENT_PATH = "/_fragment"
+
+# 内存页面缓存的容量上限（正文与gzip版本合计）
+PAGE_STORE_MAX_BYTES = int(os.getenv("PAGE_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+# 生成的页面是否同时写入磁盘；关闭后页面只保存在内存中，被淘汰或服务重启后即失效
+PAGE_WRITE_THROUGH = os.getenv("PAGE_WRITE_THROUGH", "true").lower() == "true"
 
- = {
+# 系统页面映射关系
+SYSTEM_PAGES = {
     "checkin": "/checkin", #签到页面
     "index": "/index", #主页
     "dialogue": "/dialogue", #对话页面
@@ -59,17 +88,532 @@ def get_free_port(start_port=8080, max_port=8180):
                 current_port += 1
     raise RuntimeError(f"无法找到{start_port}-{max_port}范围内的可用端口")
 
+def _make_etag(st, encoding=None) -> str:
+    """由修改时间和大小生成ETag，不需要读取文件内容"""
+    suffix = f"-{encoding}" if encoding else ""
+    return f'"{st.st_mtime_ns:x}-{st.st_size:x}{suffix}"'
+
+
+def _write_gzip_variant(path: str, data: bytes, st):
+    """写入 path 对应的 .gz 文件，修改时间设为与原文件相同，写入临时文件后原子替换"""
+    gz_path = path + ".gz"
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".gz-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(temp_path, 0o644)
+        os.utime(temp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(temp_path, gz_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return os.stat(gz_path)
+
+
+def _ensure_gzip_variant(path: str, st=None):
+    """确保 path 旁边有与之对应的 .gz 预压缩文件
+
+    .gz 文件的修改时间设置为与原文件相同，据此判断是否过期；
+    过期或不存在时重新压缩，写入临时文件后原子替换。
+
+    Returns:
+        os.stat_result: .gz 文件的状态，无法生成时返回 None
+    """
+    st = st or os.stat(path)
+    gz_path = path + ".gz"
+    try:
+        gz_st = os.stat(gz_path)
+        if gz_st.st_mtime_ns == st.st_mtime_ns:
+            return gz_st
+    except OSError:
+        pass
+
+    try:
+        with open(path, 'rb') as f:
+            data = gzip.compress(f.read(), compresslevel=6, mtime=0)
+        return _write_gzip_variant(path, data, st)
+    except OSError as e:
+        logger.warning(f"生成预压缩文件失败 {gz_path}: {str(e)}")
+        return None
+
+
+class Page:
+    """内存中的一个页面：正文、gzip压缩后的正文和校验信息
+
+    由 Markdown 生成的页面还带有 fragment，即 <main> 中的正文片段，
+    页面更新时客户端只需重新获取这一部分。
+    """
+    __slots__ = ("body", "gzip_body", "content_type", "cache_control", "etag", "modified", "fragment")
+
+    def __init__(self, body: bytes, content_type: str = "text/html; charset=utf-8", cache_control: str = None):
+        self.body = body
+        self.cache_control = cache_control
+        self.gzip_body = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+        self.content_type = content_type
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.modified = time.time()
+        self.fragment = None
+
+    @property
+    def content_hash(self) -> str:
+        """页面内容的哈希，有正文片段时以片段为准（与页面中的 data-hash 一致）"""
+        return (self.fragment or self).etag.strip('"')
+
+    @property
+    def size(self) -> int:
+        size = len(self.body) + len(self.gzip_body or b"")
+        return size + (self.fragment.size if self.fragment else 0)
+
+
+class PageStore:
+    """按URL路径保存生成页面的内存LRU缓存
+
+    页面在生成时就渲染并压缩好，请求直接从内存返回，不经过磁盘。
+    总大小超过上限时淘汰最久未访问的页面。处理请求的线程会并发访问，
+    所有操作都加锁。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.pages = OrderedDict()  # URL路径 -> Page，按最近访问时间排序
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, url_path: str):
+        with self._lock:
+            page = self.pages.get(url_path)
+            if page is None:
+                self.misses += 1
+                return None
+            self.pages.move_to_end(url_path)
+            self.hits += 1
+            return page
+
+    def put(self, url_path: str, page: Page):
+        with self._lock:
+            old = self.pages.pop(url_path, None)
+            if old is not None:
+                self.total_bytes -= old.size
+            self.pages[url_path] = page
+            self.total_bytes += page.size
+            while self.total_bytes > self.max_bytes and len(self.pages) > 1:
+                _, evicted = self.pages.popitem(last=False)
+                self.total_bytes -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.pages.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": len(self.pages),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "write_through": PAGE_WRITE_THROUGH,
+            }
+
+
+class PageEvents:
+    """页面更新通知
+
+    每次页面重新生成时版本号加一，等待中的SSE连接被唤醒后向客户端
+    推送新的内容哈希。每个SSE连接占用一个处理线程，在条件变量上等待。
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._versions = {}  # URL路径 -> (版本号, 内容哈希, 标题)
+        self.closed = False
+
+    def publish(self, url_path: str, content_hash: str, title: str = None):
+        with self._cond:
+            version = self._versions.get(url_path, (0,))[0] + 1
+            self._versions[url_path] = (version, content_hash, title)
+            self._cond.notify_all()
+
+    def current(self, url_path: str) -> tuple:
+        with self._cond:
+            return self._versions.get(url_path, (0, None, None))
+
+    def wait(self, url_path: str, version: int, timeout: float) -> tuple:
+        """等待页面版本变化，超时或服务停止时返回当前状态"""
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.closed or self._versions.get(url_path, (0,))[0] != version, timeout)
+            return self._versions.get(url_path, (0, None, None))
+
+    def open(self):
+        with self._cond:
+            self.closed = False
+
+    def close(self):
+        """停止服务时唤醒所有SSE连接使其退出"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+page_store = PageStore(PAGE_STORE_MAX_BYTES)
+page_events = PageEvents()
+# 已写入当前 web_root 的共享静态文件
+written_static = set()
+
+
+# 所有生成页面共用的样式表，以带版本号的URL引用，浏览器可长期缓存
+PAGE_CSS = """body {
+    font-family: Arial, sans-serif;
+    line-height: 1.6;
+    max-width: 800px;
+    margin: 0 auto;
+    padding: 20px;
+}
+pre {
+    background-color: #f5f5f5;
+    padding: 10px;
+    border-radius: 5px;
+    overflow-x: auto;
+}
+code { font-family: Consolas, monospace; }
+table {
+    border-collapse: collapse;
+    width: 100%;
+    margin: 15px 0;
+}
+th, td {
+    border: 1px solid #ddd;
+    padding: 8px;
+    text-align: left;
+}
+th { background-color: #f2f2f2; }
+"""
+
+# 页面更新时只替换正文，不重新加载整个页面
+LIVE_SCRIPT = """(function () {
+    var main = document.getElementById("page-body");
+    if (!main || !window.EventSource || !window.fetch) return;
+    // location.pathname 已经是百分号编码的，先解码，否则中文页面名会被编码两次
+    var page = decodeURIComponent(location.pathname);
+    var current = document.documentElement.getAttribute("data-hash");
+    var query = "?page=" + encodeURIComponent(page);
+    var source = new EventSource("%(events)s" + query + "&hash=" + encodeURIComponent(current));
+    source.addEventListener("updated", function (event) {
+        var data = JSON.parse(event.data);
+        if (data.hash === current) return;
+        fetch("%(fragment)s" + query).then(function (response) {
+            if (!response.ok) throw new Error(response.status);
+            return response.text();
+        }).then(function (fragment) {
+            main.innerHTML = fragment;
+            current = data.hash;
+            if (data.title) document.title = data.title;
+        }).catch(function () { location.reload(); });
+    });
+})();
+""" % {"events": EVENTS_PATH, "fragment": FRAGMENT_PATH}
+
+STYLESHEET_PATH = "/_static/page.css"
+LIVE_SCRIPT_PATH = "/_static/live.js"
+# 样式表URL带内容哈希，内容变化时URL随之变化，因此可以永久缓存
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html data-hash="{hash}">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{title}</title>
+    <link rel="stylesheet" href="{stylesheet}">
+    <script src="{live_script}" defer></script>
+</head>
+<body>
+<main id="page-body">{fragment}</main>
+</body>
+</html>"""
+
+FRAGMENT_TEMPLATE = """
+    <h1>{title}</h1>
+    {body}
+"""
+
+
+class PageRenderer:
+    """生成页面的渲染器
+
+    Markdown 转换器、页面模板和样式表只在启动时准备一次，之后每次渲染
+    只做 Markdown 转换和字符串拼接。Markdown 实例不是线程安全的，
+    转换时加锁。
+    """
+
+    MARKDOWN_EXTENSIONS = ['extra', 'codehilite', 'tables', 'nl2br']
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        try:
+            import markdown
+            self._markdown = markdown.Markdown(extensions=self.MARKDOWN_EXTENSIONS)
+        except ImportError:
+            logger.warning("markdown模块未找到，将使用基本转换")
+            self._markdown = None
+
+        # 所有页面共用的静态文件，URL路径 -> Page
+        self.static = {
+            STYLESHEET_PATH: Page(PAGE_CSS.encode('utf-8'), "text/css; charset=utf-8", STATIC_CACHE_CONTROL),
+            LIVE_SCRIPT_PATH: Page(LIVE_SCRIPT.encode('utf-8'), "text/javascript; charset=utf-8",
+                                   STATIC_CACHE_CONTROL),
+        }
+        page_template = PAGE_TEMPLATE
+        for field, path in (("stylesheet", STYLESHEET_PATH), ("live_script", LIVE_SCRIPT_PATH)):
+            page_template = page_template.replace(f"{{{field}}}", f"{path}?v={self.static[path].content_hash[:10]}")
+        # 预先把模板拆成 [(固定文本, 字段名)]，渲染时只需拼接
+        self._template = self._compile(page_template)
+        self._fragment_template = self._compile(FRAGMENT_TEMPLATE)
+
+    @staticmethod
+    def _compile(template: str) -> list:
+        return [(literal, field) for literal, field, _, _ in string.Formatter().parse(template)]
+
+    @staticmethod
+    def _fill(template: list, fields: dict) -> str:
+        return "".join(literal + (fields[field] if field else "") for literal, field in template)
+
+    @staticmethod
+    def is_markdown(content: str) -> bool:
+        return '<html' not in content and '<!DOCTYPE' not in content
+
+    def markdown_to_html(self, content: str) -> str:
+        if self._markdown is None:
+            # 基本转换: 段落和代码块
+            html_content = content.replace('\n\n', '</p><p>')
+            html_content = f"<p>{html_content}</p>"
+            html_content = html_content.replace('```', '<pre><code>', 1)
+            while '```' in html_content:
+                html_content = html_content.replace('```', '</code></pre>', 1)
+            return html_content
+        with self._lock:
+            return self._markdown.reset().convert(content)
+
+    def render_page(self, content: str, title: str = "生成页面") -> Page:
+        """Markdown 内容套用页面模板，已经是完整HTML的内容原样使用（没有正文片段）"""
+        if not self.is_markdown(content):
+            return Page(content.encode('utf-8'))
+        title = html.escape(title)
+        fragment = Page(self._fill(self._fragment_template,
+                                   {"title": title, "body": self.markdown_to_html(content)}).encode('utf-8'))
+        fields = {"title": title, "hash": fragment.content_hash, "fragment": fragment.body.decode('utf-8')}
+        page = Page(self._fill(self._template, fields).encode('utf-8'))
+        page.fragment = fragment
+        return page
+
+
+renderer = PageRenderer()
+
+
+class LocalWebServer(ThreadingHTTPServer):
+    """每个连接一个线程，一个学生的慢连接不会阻塞其他人"""
+    daemon_threads = True
+    # 全班同时打开同一页面时的连接排队长度
+    request_queue_size = 128
+
+
 class CustomHTTPRequestHandler(SimpleHTTPRequestHandler):
-    """自定义HTTP请求处理器，支持设置自定义web根目录"""
-    
+    """自定义HTTP请求处理器，支持设置自定义web根目录
+
+    在标准静态文件服务的基础上支持：
+    - 优先返回内存页面缓存中的生成页面
+    - HTTP/1.1 keep-alive
+    - ETag / Last-Modified 校验，未修改时返回304
+    - 客户端支持gzip时发送 .gz 预压缩版本
+    - 大文件使用 sendfile 发送
+    """
+
+    protocol_version = "HTTP/1.1"
+    timeout = KEEP_ALIVE_TIMEOUT
+
     def __init__(self, *args, directory=None, **kwargs):
-        self.directory = directory
-        super().__init__(*args, **kwargs)
+        # 父类在 directory 为 None 时会改用当前工作目录，因此要传给父类
+        super().__init__(*args, directory=directory, **kwargs)
     
     def log_message(self, format, *args):
         """重写日志方法，使用我们的日志器"""
         logger.info("%s - %s", self.address_string(), format % args)
-    
+
+    def _accepts_gzip(self) -> bool:
+        accept = self.headers.get("Accept-Encoding", "")
+        return any(part.split(";")[0].strip() == "gzip" for part in accept.split(","))
+
+    def _not_modified(self, etag: str, mtime: float) -> bool:
+        """根据 If-None-Match / If-Modified-Since 判断客户端缓存是否仍然有效"""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+        return False
+
+    def _send_cache_headers(self, etag: str, mtime: float, ctype: str, cache_control: str = None):
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(mtime, usegmt=True))
+        # 生成的页面随时可能更新，每次都用ETag校验；其他静态资源可缓存一段时间
+        if cache_control is None:
+            cache_control = "no-cache" if ctype.startswith("text/html") else "public, max-age=3600"
+        self.send_header("Cache-Control", cache_control)
+        self.send_header("Vary", "Accept-Encoding")
+
+    def _page_param(self, name: str = "page") -> str:
+        """查询参数中的页面路径，统一为以 / 开头"""
+        values = parse_qs(urlsplit(self.path).query).get(name)
+        return "/" + values[0].lstrip("/") if values else ""
+
+    def do_GET(self):
+        if urlsplit(self.path).path == EVENTS_PATH:
+            self._send_events()
+            return
+        super().do_GET()
+
+    def _send_events(self):
+        """SSE：页面重新生成时推送 updated 事件，数据为新的内容哈希"""
+        url_path = self._page_param()
+        known_hash = parse_qs(urlsplit(self.path).query).get("hash", [None])[0] or self.headers.get("Last-Event-ID")
+
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def send_update(content_hash, title):
+            data = json.dumps({"page": url_path, "hash": content_hash, "title": title}, ensure_ascii=False)
+            self.wfile.write(f"id: {content_hash}\nevent: updated\ndata: {data}\n\n".encode('utf-8'))
+
+        try:
+            self.wfile.write(b"retry: 3000\n\n")
+            version, content_hash, title = page_events.current(url_path)
+            if content_hash and known_hash and known_hash != content_hash:
+                # 客户端加载页面之后、连接建立之前页面已经更新
+                send_update(content_hash, title)
+            while not page_events.closed:
+                new_version, content_hash, title = page_events.wait(url_path, version, SSE_HEARTBEAT)
+                if page_events.closed:
+                    break
+                if new_version == version:
+                    self.wfile.write(b": ping\n\n")
+                else:
+                    version = new_version
+                    send_update(content_hash, title)
+        except (BrokenPipeError, ConnectionResetError, TimeoutError):
+            # 客户端关闭了页面
+            pass
+
+    def _send_page(self, page: Page):
+        """从内存返回生成的页面"""
+        body, encoding = page.body, None
+        if page.gzip_body is not None and self._accepts_gzip():
+            body, encoding = page.gzip_body, "gzip"
+        etag = page.etag[:-1] + '-gzip"' if encoding else page.etag
+
+        if self._not_modified(etag, page.modified):
+            self.send_response(304)
+            self._send_cache_headers(etag, page.modified, page.content_type, page.cache_control)
+            self.end_headers()
+            return None
+
+        self.send_response(200)
+        self.send_header("Content-type", page.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self._send_cache_headers(etag, page.modified, page.content_type, page.cache_control)
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def send_head(self):
+        """返回要发送的文件对象，并发送状态行和响应头；目录交给父类处理"""
+        url_path = unquote(urlsplit(self.path).path)
+        if url_path == FRAGMENT_PATH:
+            page = page_store.get(self._page_param())
+            if page is None or page.fragment is None:
+                self.send_error(404, "Page not found")
+                return None
+            return self._send_page(page.fragment)
+
+        page = renderer.static.get(url_path) or page_store.get(url_path)
+        if page is not None:
+            return self._send_page(page)
+
+        path = self.translate_path(self.path)
+        if os.path.isdir(path):
+            index = os.path.join(path, "index.html")
+            if not urlsplit(self.path).path.endswith('/') or not os.path.isfile(index):
+                return super().send_head()
+            path = index
+        if path.endswith('/'):
+            self.send_error(404, "File not found")
+            return None
+
+        ctype = self.guess_type(path)
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(404, "File not found")
+            return None
+
+        try:
+            st = os.fstat(f.fileno())
+            etag, encoding, length = _make_etag(st), None, st.st_size
+            if (self._accepts_gzip() and ctype.split(";")[0] in GZIP_TYPES
+                    and st.st_size >= GZIP_MIN_BYTES):
+                gz_st = _ensure_gzip_variant(path, st)
+                if gz_st is not None:
+                    f.close()
+                    f = open(path + ".gz", 'rb')
+                    etag, encoding, length = _make_etag(st, "gzip"), "gzip", os.fstat(f.fileno()).st_size
+
+            if self._not_modified(etag, st.st_mtime):
+                f.close()
+                self.send_response(304)
+                self._send_cache_headers(etag, st.st_mtime, ctype)
+                self.end_headers()
+                return None
+
+            self.send_response(200)
+            self.send_header("Content-type", ctype)
+            self.send_header("Content-Length", str(length))
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self._send_cache_headers(etag, st.st_mtime, ctype)
+            self.end_headers()
+            return f
+        except BaseException:
+            f.close()
+            raise
+
+    def copyfile(self, source, outputfile):
+        """大文件用 sendfile 直接由内核发送，目录列表等内存数据走默认逻辑"""
+        try:
+            size = os.fstat(source.fileno()).st_size
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            size = 0
+        if size >= SENDFILE_MIN_BYTES:
+            self.connection.sendfile(source)
+        else:
+            super().copyfile(source, outputfile)
+
     def end_headers(self):
         """添加跨域头信息"""
         self.send_header('Access-Control-Allow-Origin', '*')
@@ -99,6 +643,10 @@ def start_server(port=None, directory=None):
     
     # 确保目录存在
     os.makedirs(directory, exist_ok=True)
+    if web_root and os.path.abspath(directory) != os.path.abspath(web_root):
+        # 内存中的页面属于原来的根目录
+        page_store.clear()
+        written_static.clear()
     web_root = directory
     
     # 如果未指定端口，查找可用端口
@@ -114,7 +662,8 @@ def start_server(port=None, directory=None):
     
     try:
         # 创建服务器
-        server = HTTPServer(('localhost', server_port), handler)
+        server = LocalWebServer(('localhost', server_port), handler)
+        page_events.open()
         server_instance = server
         
         # 在单独的线程中运行服务器
@@ -143,6 +692,8 @@ def stop_server():
     """停止本地HTTP服务器"""
     global server_thread, server_instance
     
+    # 结束所有页面更新通知连接
+    page_events.close()
     if server_instance:
         logger.info("正在停止本地网页服务器...")
         server_instance.shutdown()
@@ -186,7 +737,8 @@ def open_browser(path=""):
         # 检查请求的文件是否存在
         if path:
             file_path = os.path.join(web_root, path.lstrip('/'))
-            if not os.path.exists(file_path):
+            in_memory = page_store.get("/" + unquote(urlsplit(path).path).lstrip('/')) is not None
+            if not in_memory and not os.path.exists(file_path):
                 return {
                     "status": "warning",
                     "message": f"链接已打开，但文件不存在: {file_path}",
@@ -246,6 +798,50 @@ def open_system_page(page_name):
             "url": url
         }
 
+def _write_page_file(file_path: str, page: Page):
+    """把页面及其gzip版本写入磁盘"""
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'wb') as f:
+        f.write(page.body)
+    if page.gzip_body is not None:
+        _write_gzip_variant(file_path, page.gzip_body, os.stat(file_path))
+
+
+def _publish_page(filename: str, page: Page, title: str = None) -> dict:
+    """把渲染好的页面放入内存缓存（并按配置写入磁盘），返回访问地址"""
+    # 确保文件名有.html后缀
+    if not filename.endswith('.html'):
+        filename = f"{filename}.html"
+
+    # 构建完整文件路径
+    file_path = os.path.join(web_root, filename)
+
+    # 页面放入内存缓存，请求直接从内存返回，并通知已打开该页面的客户端
+    relative_url = filename
+    url_path = "/" + relative_url.lstrip("/")
+    page_store.put(url_path, page)
+    page_events.publish(url_path, page.content_hash, title)
+
+    if PAGE_WRITE_THROUGH:
+        # 同时写入磁盘，页面被淘汰或服务重启后仍可访问
+        _write_page_file(file_path, page)
+        for path, static_page in renderer.static.items():
+            if path not in written_static:
+                _write_page_file(os.path.join(web_root, path.lstrip('/')), static_page)
+                written_static.add(path)
+
+    logger.info(f"已创建HTML文件: {file_path}")
+
+    return {
+        "status": "success",
+        "message": "文件创建成功",
+        "filepath": file_path,
+        "url": f"http://localhost:{server_port}/{relative_url}",
+        "relative_path": relative_url,
+        "persisted": PAGE_WRITE_THROUGH
+    }
+
+
 def create_html_file(filename, content, title="生成页面"):
     """创建一个HTML文件
     
@@ -264,99 +860,9 @@ def create_html_file(filename, content, title="生成页面"):
             "status": "error",
             "message": "服务器未启动，无法创建文件"
         }
-    
-    # 确保文件名有.html后缀
-    if not filename.endswith('.html'):
-        filename = f"{filename}.html"
-    
-    # 构建完整文件路径
-    file_path = os.path.join(web_root, filename)
-    
+
     try:
-        # 判断内容是否为Markdown格式
-        is_markdown = '<html' not in content and '<!DOCTYPE' not in content
-        
-        if is_markdown:
-            # 尝试导入markdown模块
-            try:
-                import markdown
-                html_content = markdown.markdown(
-                    content, 
-                    extensions=['extra', 'codehilite', 'tables', 'nl2br']
-                )
-            except ImportError:
-                logger.warning("markdown模块未找到，将使用基本转换")
-                # 基本转换: 段落和代码块
-                html_content = content.replace('\n\n', '</p><p>')
-                html_content = f"<p>{html_content}</p>"
-                html_content = html_content.replace('```', '<pre><code>', 1)
-                while '```' in html_content:
-                    html_content = html_content.replace('```', '</code></pre>', 1)
-            
-            # 完整的HTML文档
-            full_html = f"""<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{title}</title>
-    <style>
-        body {{ 
-            font-family: Arial, sans-serif; 
-            line-height: 1.6;
-            max-width: 800px;
-            margin: 0 auto;
-            padding: 20px;
-        }}
-        pre {{ 
-            background-color: #f5f5f5; 
-            padding: 10px; 
-            border-radius: 5px; 
-            overflow-x: auto;
-        }}
-        code {{ font-family: Consolas, monospace; }}
-        table {{ 
-            border-collapse: collapse; 
-            width: 100%; 
-            margin: 15px 0;
-        }}
-        th, td {{ 
-            border: 1px solid #ddd; 
-            padding: 8px; 
-            text-align: left;
-        }}
-        th {{ background-color: #f2f2f2; }}
-    </style>
-</head>
-<body>
-    <h1>{title}</h1>
-    {html_content}
-</body>
-</html>"""
-        else:
-            # 已经是HTML内容，直接使用
-            full_html = content
-        
-        # 确保目录存在
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        
-        # 写入文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(full_html)
-        
-        logger.info(f"已创建HTML文件: {file_path}")
-        
-        # 计算相对URL
-        relative_url = filename
-        url = f"http://localhost:{server_port}/{relative_url}"
-        
-        return {
-            "status": "success",
-            "message": "文件创建成功",
-            "filepath": file_path,
-            "url": url,
-            "relative_path": relative_url
-        }
+        return _publish_page(filename, renderer.render_page(content, title), title)
     except Exception as e:
         logger.error(f"创建HTML文件时出错: {str(e)}")
         return {
@@ -364,6 +870,42 @@ def create_html_file(filename, content, title="生成页面"):
             "message": f"创建HTML文件失败: {str(e)}"
         }
 
+
+def create_html_files(pages):
+    """批量创建HTML文件，共用同一个渲染器，单个页面失败不影响其他页面
+
+    Args:
+        pages: 页面列表，每项形如 {"filename": 文件名, "content": 内容, "title": 标题(可选)}
+
+    Returns:
+        dict: 每个页面的创建结果
+    """
+    if not web_root:
+        return {
+            "status": "error",
+            "message": "服务器未启动，无法创建文件"
+        }
+
+    results = []
+    for index, item in enumerate(pages):
+        filename = item.get("filename") or f"page_{index + 1}"
+        try:
+            title = item.get("title") or "生成页面"
+            result = _publish_page(filename, renderer.render_page(item.get("content") or "", title), title)
+        except Exception as e:
+            logger.error(f"创建HTML文件 {filename} 时出错: {str(e)}")
+            result = {"status": "error", "message": f"创建HTML文件失败: {str(e)}"}
+        result["index"] = index
+        results.append(result)
+
+    succeeded = sum(1 for r in results if r["status"] == "success")
+    return {
+        "status": "success" if succeeded else "error",
+        "created": succeeded,
+        "failed": len(results) - succeeded,
+        "pages": results
+    }
+
 # 创建MCP服务器
 mcp = FastMCP("local_web")
 
@@ -415,6 +957,18 @@ async def create_web_page(filename: str, content: str, title: str = "生成页
     """
     return create_html_file(filename, content, title)
 
+@mcp.tool()
+async def create_web_pages(pages: list[dict]) -> dict:
+    """一次创建多个网页，例如一节课的全部讲义页面
+
+    Args:
+        pages: 页面列表，每项形如 {"filename": 文件名, "content": HTML或Markdown内容, "title": 页面标题(可选)}
+
+    Returns:
+        dict: 每个页面的文件路径和URL
+    """
+    return create_html_files(pages)
+
 @mcp.tool()
 async def navigate_to_system_page(page_name: str) -> dict:
     """打开系统内置页面，如签到页面、对话页面等
@@ -441,7 +995,8 @@ async def get_server_status() -> dict:
             "status": "running",
             "port": server_port,
             "root_directory": web_root,
-            "base_url": f"http://localhost:{server_port}"
+            "base_url": f"http://localhost:{server_port}",
+            "page_store": page_store.stats()
         }
     else:
         return {
@@ -1,11 +1,24 @@
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import FastMCP, Context
 import os
 import sys
+import time
+import json
+import uuid
+import shutil
+import hashlib
+import io
+import re
+import html
+import asyncio
+import threading
+import contextlib
 import logging
 import traceback
 import tempfile
+import zipfile
 import subprocess
 from pathlib import Path
+from collections import OrderedDict
 
 # 配置日志
 logging.basicConfig(
@@ -20,6 +33,265 @@ REPORT_DIR = os.path.abspath("reports")
 os.makedirs(REPORT_DIR, exist_ok=True)
 logger.info(f"PDF输出目录: {REPORT_DIR}")
 
+# 同时进行的渲染任务数，默认与CPU核数一致
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(os.cpu_count() or 2)))
+# 单次渲染的超时时间(秒)
+PDF_RENDER_TIMEOUT = float(os.getenv("PDF_RENDER_TIMEOUT", "300"))
+
+# 生成的PDF按内容寻址缓存，超过容量上限时按LRU淘汰
+PDF_CACHE_DIR = os.path.join(REPORT_DIR, ".store")
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+# pandoc 转换时使用的公共排版参数
+PANDOC_LATEX_OPTIONS = [
+    '--pdf-engine=xelatex',
+    '-V', 'geometry:margin=1in',
+    '-V', 'mainfont=SimSun',  # 中文支持
+]
+
+
+# 超过该字符数的Markdown按章节切块渲染（外部工具并发执行），每块约 PDF_CHUNK_TARGET 个字符
+PDF_CHUNK_THRESHOLD = int(os.getenv("PDF_CHUNK_THRESHOLD", "60000"))
+PDF_CHUNK_TARGET = int(os.getenv("PDF_CHUNK_TARGET", "20000"))
+
+# 进程内渲染(weasyprint)使用的中文字体，可通过 PDF_CJK_FONT 指定字体文件路径
+PDF_CJK_FONT = os.getenv("PDF_CJK_FONT")
+PDF_CJK_FONT_FAMILIES = '"Noto Sans CJK SC", "Source Han Sans SC", "SimSun", "Microsoft YaHei", sans-serif'
+
+REPORT_CSS = """
+@page {
+    size: A4;
+    margin: 2.5cm;
+}
+body { font-family: %(fonts)s; font-size: 11pt; line-height: 1.6; }
+h1.report-title { text-align: center; font-size: 20pt; margin-bottom: 1.5em; }
+pre { background-color: #f5f5f5; padding: 8px; white-space: pre-wrap; font-size: 9pt; }
+code { font-family: "Courier New", monospace; }
+table { border-collapse: collapse; width: 100%%; margin: 12px 0; }
+th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: left; }
+th { background-color: #f2f2f2; }
+"""
+
+# 页码单独作为一个样式表，分块渲染时不加页码，合并后再统一编号
+PAGE_NUMBER_CSS = """
+@page { @bottom-center { content: counter(page); font-size: 9pt; color: #666; } }
+"""
+
+REPORT_HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head><meta charset="UTF-8"><title>{title}</title></head>
+<body>
+{heading}
+{body}
+</body>
+</html>"""
+
+# 出现这些 LaTeX 数学写法时交给 pandoc + xelatex 渲染
+# 行内公式沿用 pandoc 的规则：开头的 $ 后和结尾的 $ 前不能是空白，结尾的 $ 后不能紧跟数字，
+# 这样 "$x = 2$" 会被识别为公式，"$5 和 $10" 这类金额不会
+_LATEX_MATH_RE = re.compile(r"\$\$|```math|\\begin\{|(?<![\\$])\$(?=[^\s$])[^$\n]*(?<=[^\s\\])\$(?!\d)")
+
+
+class RenderError(Exception):
+    """外部转换工具执行失败时抛出
+
+    transient 为 True 表示超时、系统资源不足等偶发错误，原样重试可能成功；
+    其余错误（如内容无法排版）原样重试只会得到同样的结果。
+    """
+
+    def __init__(self, message: str, transient: bool = False):
+        super().__init__(message)
+        self.transient = transient
+
+
+class WeasyEngine:
+    """进程内的 Markdown -> HTML -> PDF 渲染器
+
+    启动时加载一次 weasyprint、字体配置和样式表，之后每次渲染直接复用，
+    省去启动 xelatex 和加载中文字体的开销。weasyprint 主要是纯 Python
+    计算，受 GIL 限制，多线程并不会更快，因此渲染过程串行执行：
+    长文档分块和批量生成使用本引擎时各块、各文档依次渲染，
+    只有 pandoc 等外部工具的渲染才会并发。
+    """
+
+    def __init__(self):
+        self.available = False
+        self.version = None
+        self.error = None
+        self._lock = threading.Lock()
+        try:
+            import markdown
+            # 缺少系统库时 weasyprint 会向 stdout 打印提示，会破坏 stdio 上的 MCP 协议
+            with contextlib.redirect_stdout(sys.stderr):
+                import weasyprint
+                from weasyprint.text.fonts import FontConfiguration
+        except (ImportError, OSError) as e:
+            # OSError: 缺少 pango 等系统库
+            self.error = str(e)
+            logger.info(f"weasyprint 不可用，将只使用外部转换工具: {self.error}")
+            return
+
+        fonts = PDF_CJK_FONT_FAMILIES
+        font_face = ""
+        if PDF_CJK_FONT:
+            font_face = f'@font-face {{ font-family: "ReportCJK"; src: url("{Path(PDF_CJK_FONT).as_uri()}"); }}\n'
+            fonts = f'"ReportCJK", {fonts}'
+        css = font_face + REPORT_CSS % {"fonts": fonts}
+
+        self._weasyprint = weasyprint
+        self._font_config = FontConfiguration()
+        self._stylesheet = weasyprint.CSS(string=css, font_config=self._font_config)
+        self._page_number_stylesheet = weasyprint.CSS(string=PAGE_NUMBER_CSS, font_config=self._font_config)
+        self._markdown = markdown.Markdown(extensions=['extra', 'sane_lists'])
+        css_hash = hashlib.sha256((css + PAGE_NUMBER_CSS).encode('utf-8')).hexdigest()[:8]
+        self.version = f"weasyprint {weasyprint.__version__} css:{css_hash}"
+        self.available = True
+        logger.info(f"进程内渲染引擎已加载: {self.version}")
+
+    def markdown_to_html(self, content: str, title: str = None) -> str:
+        """title 为空时不生成标题（用于长文档除第一块以外的分块）"""
+        with self._lock:
+            body = self._markdown.reset().convert(content)
+        heading = f'<h1 class="report-title">{html.escape(title)}</h1>' if title else ""
+        return REPORT_HTML_TEMPLATE.format(title=html.escape(title or ""), heading=heading, body=body)
+
+    def render_html(self, html_content: str, output_path: str, page_numbers: bool = True):
+        stylesheets = [self._stylesheet]
+        if page_numbers:
+            stylesheets.append(self._page_number_stylesheet)
+        with self._lock:
+            document = self._weasyprint.HTML(string=html_content, base_url=REPORT_DIR)
+            document.write_pdf(output_path, stylesheets=stylesheets, font_config=self._font_config)
+
+    def render_markdown(self, content: str, output_path: str, title: str = None, page_numbers: bool = True):
+        self.render_html(self.markdown_to_html(content, title), output_path, page_numbers)
+
+
+def _detect_engines() -> dict:
+    """启动时探测一次可用的转换工具及其版本，之后的请求直接使用结果"""
+    engines = {}
+    for name in ("pandoc", "xelatex", "wkhtmltopdf"):
+        path = shutil.which(name)
+        version = None
+        if path:
+            try:
+                result = subprocess.run([path, '--version'], stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE, check=True, timeout=30)
+                output = result.stdout.decode('utf-8', errors='replace').strip()
+                version = output.splitlines()[0] if output else ""
+            except (subprocess.SubprocessError, OSError) as e:
+                logger.warning(f"{name} 无法运行: {str(e)}")
+                path = None
+        engines[name] = {"path": path, "version": version}
+        logger.info(f"转换工具 {name}: {version or '未安装'}")
+    return engines
+
+
+ENGINES = _detect_engines()
+weasy_engine = WeasyEngine()
+
+# 限制并发渲染数，避免多个 xelatex 进程争抢CPU
+_render_semaphore = asyncio.Semaphore(PDF_RENDER_WORKERS)
+# 进程内渲染串行执行（见 WeasyEngine），单独排队，不占用外部命令的并发名额
+_weasy_semaphore = asyncio.Semaphore(1)
+
+
+class PdfStore:
+    """按内容哈希寻址的PDF缓存
+
+    相同的内容、标题、引擎和参数总是得到同一个键，命中时直接复用已生成
+    的文件。缓存总大小超过上限时淘汰最久未使用的文件。所有操作都在事件
+    循环线程中执行，不需要加锁。
+    """
+    TEMP_PREFIX = "tmp-"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # 键 -> 文件大小，按最近使用时间排序
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+        # 恢复上次运行留下的缓存，按修改时间(即最近使用时间)排序
+        found = []
+        for entry in os.scandir(directory):
+            if entry.name.startswith(self.TEMP_PREFIX):
+                os.unlink(entry.path)
+            elif entry.name.endswith(".pdf"):
+                stat = entry.stat()
+                found.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        for _, key, size in sorted(found):
+            self.entries[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    @staticmethod
+    def make_key(*parts) -> str:
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def temp_path(self) -> str:
+        """渲染用的临时输出路径，保留 .pdf 后缀以便 pandoc 推断输出格式"""
+        return os.path.join(self.directory, f"{self.TEMP_PREFIX}{uuid.uuid4().hex}.pdf")
+
+    def get(self, key: str):
+        """返回缓存中的文件路径，未命中时返回 None"""
+        path = self.path_for(key)
+        if key not in self.entries or not os.path.exists(path):
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        os.utime(path)
+        self.hits += 1
+        return path
+
+    def put(self, key: str, source_path: str) -> str:
+        """把渲染好的文件移入缓存并返回缓存路径"""
+        path = self.path_for(key)
+        os.replace(source_path, path)
+        if key in self.entries:
+            self.total_bytes -= self.entries.pop(key)
+        size = os.path.getsize(path)
+        self.entries[key] = size
+        self.total_bytes += size
+        self._evict(keep=key)
+        return path
+
+    def _evict(self, keep: str = None):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key = next(iter(self.entries))
+            if key == keep:
+                break
+            self.total_bytes -= self.entries.pop(key)
+            self.evictions += 1
+            try:
+                os.unlink(self.path_for(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "size_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+pdf_store = PdfStore(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
 try:
     mcp = FastMCP("pdf")
     logger.info("FastMCP PDF服务器初始化成功")
@@ -28,89 +300,405 @@ except Exception as e:
     traceback.print_exc()
     sys.exit(1)
 
+
+async def _run_command(cmd: list, timeout: float = PDF_RENDER_TIMEOUT):
+    """以异步子进程执行转换命令，不阻塞事件循环
+
+    Raises:
+        RenderError: 命令返回非零或超时
+    """
+    async with _render_semaphore:
+        logger.info(f"执行命令: {' '.join(cmd)}")
+        process = await asyncio.create_subprocess_exec(
+            *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise RenderError(f"转换超时（{timeout}秒）", transient=True)
+    if process.returncode != 0:
+        raise RenderError(stderr.decode('utf-8', errors='replace'))
+    return stdout, stderr
+
+
+async def _run_in_thread(func, *args, timeout: float = PDF_RENDER_TIMEOUT):
+    """在线程中执行进程内渲染，同一时间只有一个渲染任务"""
+    async with _weasy_semaphore:
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(func, *args), timeout)
+        except asyncio.TimeoutError:
+            raise RenderError(f"转换超时（{timeout}秒）", transient=True)
+        except RenderError:
+            raise
+        except (OSError, MemoryError) as e:
+            raise RenderError(f"{type(e).__name__}: {str(e)}", transient=True)
+        except Exception as e:
+            raise RenderError(f"{type(e).__name__}: {str(e)}")
+
+
+def _resolve_output_path(output_filename: str = None, content: str = None) -> str:
+    """根据文件名生成 REPORT_DIR 下的输出路径"""
+    # 如果未指定输出文件名，按内容哈希命名，使重复导出的同一内容能命中缓存；
+    # 没有内容时使用当前时间戳
+    if not output_filename:
+        if content is not None:
+            output_filename = f"report_{hashlib.sha256(content.encode('utf-8')).hexdigest()[:12]}"
+        else:
+            output_filename = f"report_{int(time.time())}"
+
+    # 确保文件名不包含路径和扩展名
+    output_filename = os.path.basename(output_filename)
+    output_filename = output_filename.replace(".pdf", "")
+    return os.path.join(REPORT_DIR, f"{output_filename}.pdf")
+
+
+def _write_temp_file(content: str, suffix: str) -> str:
+    with tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False, encoding='utf-8') as temp_file:
+        temp_file.write(content)
+        return temp_file.name
+
+
+def _materialize(store_path: str, output_path: str):
+    """把缓存中的PDF放到用户指定的输出路径，优先使用硬链接避免复制"""
+    if os.path.lexists(output_path):
+        os.unlink(output_path)
+    try:
+        os.link(store_path, output_path)
+    except OSError:
+        shutil.copyfile(store_path, output_path)
+
+
+async def _render_cached(key: str, output_path: str, render) -> bool:
+    """命中缓存时直接复用已有的PDF，否则调用 render(临时路径) 渲染后放入缓存
+
+    render 返回 False 表示结果不完整，此时只输出文件而不缓存。
+
+    Returns:
+        bool: 是否命中缓存
+    """
+    cached_path = pdf_store.get(key)
+    if cached_path:
+        logger.info(f"命中PDF缓存: {key[:12]}")
+        _materialize(cached_path, output_path)
+        return True
+
+    temp_path = pdf_store.temp_path()
+    try:
+        complete = await render(temp_path)
+        if not os.path.exists(temp_path):
+            raise RenderError("PDF生成失败，输出文件不存在")
+        if complete is False:
+            # 部分内容渲染失败，结果不放入缓存，下次导出时重新渲染
+            _materialize(temp_path, output_path)
+            return False
+        store_path = pdf_store.put(key, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    _materialize(store_path, output_path)
+    return False
+
+
+def _markdown_options(title: str = None, page_numbers: bool = True, plain_math: bool = False) -> list:
+    """pandoc 转换参数
+
+    Args:
+        title: 文档标题，为空时不生成标题
+        page_numbers: 为 False 时不输出页码，由合并后统一编号
+        plain_math: 为 True 时不解析 $...$ 公式和原始 LaTeX，按普通文本输出
+    """
+    options = [*PANDOC_LATEX_OPTIONS]
+    if title:
+        options += ['-V', f'title={title}']
+    if not page_numbers:
+        # \maketitle 会把标题页设为 plain 样式并输出页码，将 plain 改为与 empty 相同，
+        # 避免合并时叠加的页码与之重复
+        options += ['-V', 'pagestyle=empty',
+                    '-V', r'header-includes=\makeatletter\let\ps@plain\ps@empty\makeatother']
+    if plain_math:
+        options += ['-f', 'markdown-tex_math_dollars-tex_math_single_backslash-raw_tex']
+    options += ['-V', 'monofont=Courier New', '--standalone']
+    return options
+
+
+def _needs_latex(content: str) -> bool:
+    """内容包含 LaTeX 数学公式时需要 pandoc + xelatex 才能正确排版"""
+    return _LATEX_MATH_RE.search(content) is not None
+
+
+def _select_markdown_engine(content: str, requested: str = "auto") -> str:
+    """选择Markdown渲染引擎：含数学公式时用 pandoc，其余优先用进程内的 weasyprint"""
+    available = {"weasyprint": weasy_engine.available, "pandoc": _check_pandoc_installed()}
+    if requested in available:
+        if available[requested]:
+            return requested
+        logger.warning(f"请求的引擎 {requested} 不可用，自动选择其他引擎")
+    elif requested != "auto":
+        raise RenderError(f"不支持的引擎: {requested}，可选 auto、weasyprint、pandoc")
+
+    order = ["pandoc", "weasyprint"] if _needs_latex(content) else ["weasyprint", "pandoc"]
+    for engine in order:
+        if available[engine]:
+            return engine
+    raise RenderError("未找到Pandoc或weasyprint，请安装其中之一以支持PDF生成")
+
+
+def _engine_version(engine: str):
+    if engine == "weasyprint":
+        return weasy_engine.version
+    return ENGINES[engine]["version"] if engine else None
+
+
+async def _render_markdown(content: str, output_path: str, title: str, engine: str = "pandoc",
+                           page_numbers: bool = True, plain_math: bool = False):
+    """将Markdown渲染为PDF，engine 为 weasyprint 或 pandoc，其余参数见 _markdown_options"""
+    if engine == "weasyprint":
+        await _run_in_thread(weasy_engine.render_markdown, content, output_path, title, page_numbers)
+        return
+    if not _check_pandoc_installed():
+        raise RenderError("未找到Pandoc，请安装Pandoc以支持PDF生成")
+
+    temp_path = _write_temp_file(content, '.md')
+    try:
+        cmd = [ENGINES["pandoc"]["path"], temp_path, '-o', output_path,
+               *_markdown_options(title, page_numbers, plain_math)]
+        await _run_command(cmd)
+    finally:
+        # 清理临时文件
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def _html_engine(requested: str = "auto"):
+    """HTML 依次优先使用进程内的 weasyprint、wkhtmltopdf、pandoc"""
+    available = {
+        "weasyprint": weasy_engine.available,
+        "wkhtmltopdf": _check_wkhtmltopdf_installed(),
+        "pandoc": _check_pandoc_installed(),
+    }
+    if available.get(requested):
+        return requested
+    for engine in ("weasyprint", "wkhtmltopdf", "pandoc"):
+        if available[engine]:
+            return engine
+    return None
+
+
+async def _render_html(html_content: str, output_path: str, engine: str = None):
+    """将HTML渲染为PDF，未指定引擎时自动选择"""
+    engine = engine or _html_engine()
+    if engine == "weasyprint":
+        logger.info(f"使用weasyprint转换HTML到PDF")
+        await _run_in_thread(weasy_engine.render_html, html_content, output_path)
+        return
+    if engine == "wkhtmltopdf":
+        logger.info(f"使用wkhtmltopdf转换HTML到PDF")
+        make_cmd = lambda src: [ENGINES["wkhtmltopdf"]["path"], '--encoding', 'utf-8', src, output_path]
+    elif engine == "pandoc":
+        logger.info(f"使用pandoc转换HTML到PDF")
+        make_cmd = lambda src: [ENGINES["pandoc"]["path"], src, '-o', output_path, *PANDOC_LATEX_OPTIONS]
+    else:
+        raise RenderError("未找到weasyprint、wkhtmltopdf或pandoc，无法生成PDF")
+
+    temp_path = _write_temp_file(html_content, '.html')
+    try:
+        await _run_command(make_cmd(temp_path))
+    finally:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+
+def _split_markdown(content: str, target: int = PDF_CHUNK_TARGET) -> list:
+    """在一、二级标题处把长文档切成若干块，相邻的小节合并到约 target 个字符
+
+    代码块和 $$ 公式块中以 # 开头的行不当作标题。
+
+    Returns:
+        list: 各块的Markdown内容
+    """
+    sections, current, block = [], [], None
+    for line in content.splitlines(keepends=True):
+        stripped = line.strip()
+        marker = stripped[:3] if stripped.startswith(("```", "~~~")) else ("$$" if stripped == "$$" else None)
+        if marker:
+            if block is None:
+                block = marker
+            elif block == marker:
+                block = None
+        elif block is None and current and re.match(r"#{1,2}\s", line):
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+
+    chunks, buffer = [], ""
+    for section in sections:
+        if buffer and len(buffer) + len(section) > target:
+            chunks.append(buffer)
+            buffer = ""
+        buffer += section
+    if buffer:
+        chunks.append(buffer)
+    return chunks
+
+
+def _chunk_heading(chunk: str) -> str:
+    """分块的第一个标题，用作书签和错误报告"""
+    for line in chunk.splitlines():
+        if line.startswith("#"):
+            return line.lstrip("#").strip()
+    return chunk.strip()[:30]
+
+
+async def _render_chunk(index: int, chunk: str, output_path: str, title: str, engine: str) -> dict:
+    """渲染长文档中的一块（不加页码），失败时单独重试
+
+    依次尝试：正常渲染 -> 公式按原文输出(pandoc)，或遇到超时等偶发错误时原样重试(weasyprint)
+    -> 输出一页失败说明。
+
+    Returns:
+        dict: 渲染失败过时返回失败信息，recovery 为最终采用的补救方式；正常渲染时返回 None
+    """
+    chunk_title = title if index == 0 else None
+    options = _markdown_options(chunk_title, page_numbers=False) if engine == "pandoc" else None
+    key = PdfStore.make_key("markdown-chunk", chunk, chunk_title, engine, _engine_version(engine), options)
+    try:
+        await _render_cached(key, output_path,
+                             lambda path: _render_markdown(chunk, path, chunk_title, engine, page_numbers=False))
+        return None
+    except RenderError as e:
+        failure = {"index": index, "heading": _chunk_heading(chunk), "error": str(e)[:500]}
+        transient = e.transient
+
+    # weasyprint 没有其他排版方式可换，只有偶发错误才值得原样重试
+    if engine == "pandoc" or transient:
+        logger.warning(f"第 {index + 1} 块渲染失败，单独重试: {failure['error'][:200]}")
+        recovery = "plain_math" if engine == "pandoc" else "retry"
+        try:
+            await _render_markdown(chunk, output_path, chunk_title, engine,
+                                   page_numbers=False, plain_math=engine == "pandoc")
+            failure["recovery"] = recovery
+            return failure
+        except RenderError as e:
+            logger.warning(f"第 {index + 1} 块重试失败: {str(e)[:200]}")
+    else:
+        logger.warning(f"第 {index + 1} 块渲染失败: {failure['error'][:200]}")
+
+    notice = f"## {failure['heading']}\n\n> 本节内容渲染失败，请检查其中的公式或特殊字符。\n"
+    try:
+        await _render_markdown(notice, output_path, chunk_title, engine, page_numbers=False, plain_math=True)
+        failure["recovery"] = "placeholder"
+    except RenderError:
+        failure["recovery"] = None
+    return failure
+
+
+async def _render_markdown_chunked(chunks: list, output_path: str, title: str, engine: str,
+                                   report: dict) -> bool:
+    """渲染各块（外部工具并发执行，weasyprint 依次执行），按顺序合并并统一加上连续页码
+
+    每块从新的一页开始。失败信息写入 report["failed_chunks"]。
+
+    Returns:
+        bool: 所有块是否都正常渲染（有失败时结果不缓存）
+    """
+    work_dir = tempfile.mkdtemp(prefix="pdf-chunks-")
+    try:
+        paths = [os.path.join(work_dir, f"{i:04d}.pdf") for i in range(len(chunks))]
+        failures = await asyncio.gather(*(
+            _render_chunk(i, chunk, paths[i], title, engine) for i, chunk in enumerate(chunks)
+        ))
+        failed = [f for f in failures if f]
+        report["failed_chunks"] = failed
+
+        parts = [(path, _chunk_heading(chunk)) for path, chunk in zip(paths, chunks) if os.path.exists(path)]
+        if not parts:
+            raise RenderError(f"所有分块均渲染失败: {failed[0]['error'] if failed else ''}")
+        await asyncio.to_thread(_merge_pdfs, parts, output_path, True)
+        return not failed
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+async def _markdown_to_pdf_file(content: str, output_path: str, title: str, engine: str = "auto") -> dict:
+    """选择引擎并渲染Markdown（经过PDF缓存）
+
+    超过 PDF_CHUNK_THRESHOLD 的长文档按章节切块渲染后合并，单块失败只影响该块；
+    pandoc 渲染的各块并发执行，weasyprint 在进程内串行，各块依次渲染。
+
+    Returns:
+        dict: engine 实际使用的引擎，cached 是否命中缓存；
+              分块渲染时还包含 chunks 块数和 failed_chunks 失败的块
+    """
+    engine = _select_markdown_engine(content, engine)
+    version = _engine_version(engine)
+    chunks = _split_markdown(content) if len(content) > PDF_CHUNK_THRESHOLD else [content]
+
+    if len(chunks) == 1:
+        options = _markdown_options(title) if engine == "pandoc" else None
+        key = PdfStore.make_key("markdown", content, title, engine, version, options)
+        cached = await _render_cached(key, output_path, lambda path: _render_markdown(content, path, title, engine))
+        return {"engine": engine, "cached": cached}
+
+    mode = "依次" if engine == "weasyprint" else "并发"
+    logger.info(f"长文档分为 {len(chunks)} 块{mode}渲染 (引擎: {engine})")
+    report = {"engine": engine, "chunks": len(chunks), "failed_chunks": []}
+    key = PdfStore.make_key("markdown-chunked", content, title, engine, version, PDF_CHUNK_TARGET)
+    report["cached"] = await _render_cached(
+        key, output_path, lambda path: _render_markdown_chunked(chunks, path, title, engine, report))
+    return report
+
+
 @mcp.tool()
-async def markdown_to_pdf(content: str, output_filename: str = None, title: str = None) -> dict:
+async def markdown_to_pdf(content: str, output_filename: str = None, title: str = None,
+                          engine: str = "auto") -> dict:
     """将Markdown内容转换为PDF文件
+
+    默认自动选择渲染引擎：普通报告使用快速的进程内引擎，
+    包含 LaTeX 数学公式时使用 pandoc + xelatex。
     
     Args:
         content: Markdown格式的内容
         output_filename: 输出的PDF文件名（可选，不含路径和扩展名）
         title: PDF文档标题（可选）
+        engine: 渲染引擎 auto、weasyprint 或 pandoc（可选，默认auto）
     
     Returns:
         dict: 包含PDF文件路径或错误信息
     """
     try:
-        # 如果未指定输出文件名，使用当前时间戳
-        if not output_filename:
-            import time
-            output_filename = f"report_{int(time.time())}"
-
-        # 确保文件名不包含路径和扩展名
-        output_filename = os.path.basename(output_filename)
-        output_filename = output_filename.replace(".pdf", "")
+        # 创建完整的输出路径
+        output_path = _resolve_output_path(output_filename, content)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
         # 设置PDF标题
         if not title:
-            title = output_filename
-
-        # 创建完整的输出路径
-        output_path = os.path.join(REPORT_DIR, f"{output_filename}.pdf")
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            title = Path(output_path).stem
 
         logger.info(f"准备将Markdown内容转换为PDF: {output_path}")
+        render_info = await _markdown_to_pdf_file(content, output_path, title, engine)
 
-        # 创建临时Markdown文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.md', delete=False, encoding='utf-8') as temp_file:
-            temp_path = temp_file.name
-            temp_file.write(content)
-
-        try:
-            # 检查是否安装了pandoc
-            try:
-                subprocess.run(['pandoc', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            except (subprocess.SubprocessError, FileNotFoundError):
-                return {"error": "未找到Pandoc，请安装Pandoc以支持PDF生成"}
-
-            # 使用pandoc将Markdown转换为PDF
-            cmd = [
-                'pandoc',
-                temp_path,
-                '-o', output_path,
-                '--pdf-engine=xelatex',
-                '-V', f'title={title}',
-                '-V', 'geometry:margin=1in',
-                '-V', 'mainfont=SimSun',  # 中文支持
-                '-V', 'monofont=Courier New',
-                '--standalone'
-            ]
-            
-            logger.info(f"执行命令: {' '.join(cmd)}")
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            
-            if os.path.exists(output_path):
-                logger.info(f"PDF生成成功: {output_path}")
-                return {
-                    "success": True,
-                    "message": f"PDF生成成功",
-                    "file_path": output_path
-                }
-            else:
-                logger.error("PDF生成失败，输出文件不存在")
-                return {"error": "PDF生成失败，输出文件不存在", "stderr": result.stderr.decode('utf-8', errors='replace')}
-                
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Pandoc执行失败: {e}")
-            stderr = e.stderr.decode('utf-8', errors='replace')
-            logger.error(f"Pandoc错误输出: {stderr}")
-            return {"error": f"PDF生成失败: {stderr}"}
-        finally:
-            # 清理临时文件
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
-                
+        if os.path.exists(output_path):
+            logger.info(f"PDF生成成功: {output_path}")
+            return {
+                "success": True,
+                "message": f"PDF生成成功",
+                "file_path": output_path,
+                **render_info
+            }
+        else:
+            logger.error("PDF生成失败，输出文件不存在")
+            return {"error": "PDF生成失败，输出文件不存在"}
+    except RenderError as e:
+        logger.error(f"PDF渲染失败: {str(e)}")
+        return {"error": f"PDF生成失败: {str(e)}"}
     except Exception as e:
         logger.error(f"生成PDF时出错: {str(e)}")
         traceback.print_exc()
@@ -127,113 +715,276 @@ async def get_pdf_info() -> dict:
         return {
             "status": "active",
             "output_directory": REPORT_DIR,
-            "has_pandoc": _check_pandoc_installed()
+            "has_pandoc": _check_pandoc_installed(),
+            "engines": ENGINES,
+            "weasyprint": {"available": weasy_engine.available, "version": weasy_engine.version,
+                           "error": weasy_engine.error},
+            "render_workers": PDF_RENDER_WORKERS,
+            "cache": pdf_store.stats(),
         }
     except Exception as e:
         logger.error(f"获取PDF服务信息时出错: {str(e)}")
         return {"error": str(e)}
 
 def _check_pandoc_installed() -> bool:
-    """检查是否安装了pandoc"""
-    try:
-        subprocess.run(['pandoc', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        return False
+    """检查是否安装了pandoc（使用启动时的探测结果）"""
+    return ENGINES["pandoc"]["path"] is not None
 
 @mcp.tool()
-async def html_to_pdf(html_content: str, output_filename: str = None, title: str = None) -> dict:
+async def html_to_pdf(html_content: str, output_filename: str = None, title: str = None,
+                      engine: str = "auto") -> dict:
     """将HTML内容转换为PDF文件
     
     Args:
         html_content: HTML格式的内容
         output_filename: 输出的PDF文件名（可选，不含路径和扩展名）
         title: PDF文档标题（可选）
+        engine: 渲染引擎 auto、weasyprint、wkhtmltopdf 或 pandoc（可选，默认auto）
     
     Returns:
         dict: 包含PDF文件路径或错误信息
     """
     try:
-        # 如果未指定输出文件名，使用当前时间戳
-        if not output_filename:
-            import time
-            output_filename = f"report_{int(time.time())}"
-
-        # 确保文件名不包含路径和扩展名
-        output_filename = os.path.basename(output_filename)
-        output_filename = output_filename.replace(".pdf", "")
-
         # 创建完整的输出路径
-        output_path = os.path.join(REPORT_DIR, f"{output_filename}.pdf")
+        output_path = _resolve_output_path(output_filename, html_content)
         os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
-        # 创建临时HTML文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as temp_file:
-            temp_path = temp_file.name
-            temp_file.write(html_content)
-        
-        try:
-            # 检查是否安装了wkhtmltopdf或pandoc
-            if _check_wkhtmltopdf_installed():
-                cmd = [
-                    'wkhtmltopdf',
-                    '--encoding', 'utf-8',
-                    temp_path,
-                    output_path
-                ]
-                logger.info(f"使用wkhtmltopdf转换HTML到PDF")
-            elif _check_pandoc_installed():
-                cmd = [
-                    'pandoc',
-                    temp_path,
-                    '-o', output_path,
-                    '--pdf-engine=xelatex',
-                    '-V', 'geometry:margin=1in',
-                    '-V', 'mainfont=SimSun',  # 中文支持
-                ]
-                logger.info(f"使用pandoc转换HTML到PDF")
-            else:
-                return {"error": "未找到wkhtmltopdf或pandoc，无法生成PDF"}
-            
-            logger.info(f"执行命令: {' '.join(cmd)}")
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-            
-            if os.path.exists(output_path):
-                logger.info(f"PDF生成成功: {output_path}")
-                return {
-                    "success": True,
-                    "message": f"PDF生成成功",
-                    "file_path": output_path
-                }
-            else:
-                logger.error("PDF生成失败，输出文件不存在")
-                return {"error": "PDF生成失败，输出文件不存在"}
-        except subprocess.CalledProcessError as e:
-            logger.error(f"转换工具执行失败: {e}")
-            stderr = e.stderr.decode('utf-8', errors='replace')
-            logger.error(f"错误输出: {stderr}")
-            return {"error": f"PDF生成失败: {stderr}"}
-        finally:
-            # 清理临时文件
-            try:
-                os.unlink(temp_path)
-            except:
-                pass
+        engine = _html_engine(engine)
+        if engine is None:
+            return {"error": "未找到weasyprint、wkhtmltopdf或pandoc，无法生成PDF"}
+        key = PdfStore.make_key("html", html_content, title, engine, _engine_version(engine), PANDOC_LATEX_OPTIONS)
+        cached = await _render_cached(key, output_path, lambda path: _render_html(html_content, path, engine))
+
+        if os.path.exists(output_path):
+            logger.info(f"PDF生成成功: {output_path}")
+            return {
+                "success": True,
+                "message": f"PDF生成成功",
+                "file_path": output_path,
+                "engine": engine,
+                "cached": cached
+            }
+        else:
+            logger.error("PDF生成失败，输出文件不存在")
+            return {"error": "PDF生成失败，输出文件不存在"}
+    except RenderError as e:
+        logger.error(f"转换工具执行失败: {str(e)}")
+        return {"error": f"PDF生成失败: {str(e)}"}
     except Exception as e:
         logger.error(f"生成PDF时出错: {str(e)}")
         traceback.print_exc()
         return {"error": str(e)}
 
 def _check_wkhtmltopdf_installed() -> bool:
-    """检查是否安装了wkhtmltopdf"""
+    """检查是否安装了wkhtmltopdf（使用启动时的探测结果）"""
+    return ENGINES["wkhtmltopdf"]["path"] is not None
+
+def _page_number_overlay(pages):
+    """用 reportlab 生成与各页尺寸一致、只有底部居中页码的PDF"""
     try:
-        subprocess.run(['wkhtmltopdf', '--version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        return False
+        from pypdf import PdfReader
+        from reportlab.pdfgen import canvas
+    except ImportError:
+        raise RenderError("未安装 reportlab，无法添加页码，请执行 pip install reportlab")
+    buffer = io.BytesIO()
+    overlay = canvas.Canvas(buffer)
+    for number, page in enumerate(pages, 1):
+        box = page.mediabox
+        overlay.setPageSize((float(box.width), float(box.height)))
+        overlay.setFont("Helvetica", 9)
+        overlay.setFillGray(0.4)
+        overlay.drawCentredString(float(box.width) / 2, 28, str(number))
+        overlay.showPage()
+    overlay.save()
+    buffer.seek(0)
+    return PdfReader(buffer)
+
+
+def _merge_pdfs(parts: list, output_path: str, page_numbers: bool = False):
+    """按顺序合并PDF，每个部分生成一个书签
+
+    Args:
+        parts: [(PDF路径, 书签标题)]
+        page_numbers: 是否在合并结果上加连续页码
+    """
+    try:
+        from pypdf import PdfWriter, Transformation
+    except ImportError:
+        raise RenderError("未安装 pypdf，无法合并PDF，请执行 pip install pypdf")
+    writer = PdfWriter()
+    for path, bookmark in parts:
+        writer.append(path, outline_item=bookmark)
+    if page_numbers:
+        overlay = _page_number_overlay(writer.pages)
+        for page, stamp in zip(writer.pages, overlay.pages):
+            box = page.mediabox
+            page.merge_transformed_page(stamp, Transformation().translate(float(box.left), float(box.bottom)))
+    with open(output_path, 'wb') as file:
+        writer.write(file)
+    writer.close()
+
+
+def _safe_filename(name: str) -> str:
+    """去掉文件名中不能使用的字符"""
+    return re.sub(r'[\\/:*?"<>|]', '_', name)
+
+
+def _zip_pdfs(parts: list, output_path: str):
+    """把多个PDF打包为zip，parts 为 [(PDF路径, 包内文件名)]"""
+    with zipfile.ZipFile(output_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for path, name in parts:
+            archive.write(path, arcname=name)
+
+
+@mcp.tool()
+async def batch_markdown_to_pdf(documents: list[dict], mode: str = "separate", output_filename: str = None,
+                                engine: str = "auto", ctx: Context = None) -> dict:
+    """批量将多份Markdown文档转换为PDF，例如为全班每位学生各生成一份报告
+
+    使用 pandoc 时各文档并发渲染，进程内的 weasyprint 引擎则依次渲染；
+    每完成一份就通过进度通知告知客户端。
+    单份文档失败不会影响其他文档。
+
+    Args:
+        documents: 文档列表，每项形如 {"content": Markdown内容, "title": 标题(可选), "output_filename": 文件名(可选)}
+        mode: separate 分别保存为多个PDF；merge 合并为一个带书签的PDF；zip 打包为一个zip文件（可选，默认separate）
+        output_filename: merge/zip 模式下输出文件的文件名（可选，不含路径和扩展名）
+        engine: 渲染引擎 auto、weasyprint 或 pandoc（可选，默认auto）
+
+    Returns:
+        dict: 每份文档的结果，merge/zip 模式下还包含合并后的文件路径
+    """
+    try:
+        if mode not in ("separate", "merge", "zip"):
+            return {"error": f"不支持的模式: {mode}，可选 separate、merge、zip"}
+        if not documents:
+            return {"error": "文档列表不能为空"}
+
+        total = len(documents)
+        batch_name = os.path.basename(output_filename or f"batch_{int(time.time())}").replace(".pdf", "")
+        logger.info(f"开始批量生成 {total} 份PDF (模式: {mode})")
+        # merge/zip 模式下单份PDF只是中间结果，放在临时目录中
+        work_dir = tempfile.mkdtemp(prefix="pdf-batch-") if mode != "separate" else None
+
+        async def render_one(index: int, doc: dict) -> dict:
+            content = doc.get("content") or ""
+            name = doc.get("output_filename") or f"{batch_name}_{index + 1:02d}"
+            title = doc.get("title") or os.path.basename(name).replace(".pdf", "")
+            result = {"index": index, "title": title}
+            try:
+                if work_dir:
+                    output_path = os.path.join(work_dir, f"{index:04d}.pdf")
+                else:
+                    output_path = _resolve_output_path(name, content)
+                render_info = await _markdown_to_pdf_file(content, output_path, title, engine)
+                result.update(file_path=output_path, **render_info)
+            except Exception as e:
+                logger.error(f"第 {index + 1} 份文档生成失败: {str(e)}")
+                result["error"] = str(e)
+            return result
+
+        results = []
+        tasks = [asyncio.create_task(render_one(i, doc)) for i, doc in enumerate(documents)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                result = await finished
+                results.append(result)
+                if ctx is not None:
+                    status = "失败" if "error" in result else "完成"
+                    await ctx.report_progress(len(results), total)
+                    await ctx.info(f"[{len(results)}/{total}] {result['title']} {status}")
+            results.sort(key=lambda r: r["index"])
+            succeeded = [r for r in results if "error" not in r]
+
+            response = {
+                "success": bool(succeeded),
+                "mode": mode,
+                "succeeded": len(succeeded),
+                "failed": total - len(succeeded),
+            }
+            if mode == "separate" or not succeeded:
+                response["documents"] = results
+                return response
+
+            output_path = os.path.join(REPORT_DIR, f"{batch_name}.{'pdf' if mode == 'merge' else 'zip'}")
+            if mode == "merge":
+                parts = [(r["file_path"], r["title"]) for r in succeeded]
+                await asyncio.to_thread(_merge_pdfs, parts, output_path)
+            else:
+                parts = [(r["file_path"], f"{r['index'] + 1:02d}_{_safe_filename(r['title'])}.pdf") for r in succeeded]
+                await asyncio.to_thread(_zip_pdfs, parts, output_path)
+            for r in results:
+                r.pop("file_path", None)
+            response.update(file_path=output_path, documents=results)
+            logger.info(f"批量PDF已生成: {output_path}")
+            return response
+        finally:
+            for task in tasks:
+                task.cancel()
+            if work_dir:
+                shutil.rmtree(work_dir, ignore_errors=True)
+    except RenderError as e:
+        logger.error(f"批量生成PDF失败: {str(e)}")
+        return {"error": f"批量生成PDF失败: {str(e)}"}
+    except Exception as e:
+        logger.error(f"批量生成PDF时出错: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e)}
+
+def _sample_report(sections: int) -> str:
+    """生成与日常学情报告结构相近的Markdown，用于基准测试"""
+    parts = ["## 学情概览\n\n本报告汇总了班级近期的练习情况与薄弱知识点。\n"]
+    for i in range(1, sections + 1):
+        rows = "\n".join(f"| 学生{j} | {60 + (i * j) % 40} | {'函数' if j % 2 else '导数'} |" for j in range(1, 11))
+        parts.append(
+            f"## 第{i}部分 知识点分析\n\n"
+            f"本部分共有 {10 + i} 道题，平均正确率为 {50 + i % 50}%。学生在概念理解上表现较好，"
+            f"但在综合应用题中仍存在较多失误，建议加强针对性练习。\n\n"
+            f"- 主要问题：审题不仔细\n- 建议：每日完成两道综合题\n\n"
+            f"| 姓名 | 得分 | 薄弱点 |\n|---|---|---|\n{rows}\n"
+        )
+    return "\n".join(parts)
+
+
+def _run_benchmark(rounds: int = 3):
+    """比较各渲染引擎在不同篇幅报告上的耗时"""
+    sizes = {"短报告(1节)": 1, "常规报告(8节)": 8, "长报告(40节)": 40}
+    engines = [name for name, ok in (("weasyprint", weasy_engine.available),
+                                     ("pandoc", _check_pandoc_installed())) if ok]
+    if not engines:
+        print("没有可用的渲染引擎")
+        return
+
+    async def run():
+        workdir = tempfile.mkdtemp(prefix="pdf-bench-")
+        try:
+            for label, sections in sizes.items():
+                content = _sample_report(sections)
+                for engine in engines:
+                    elapsed = []
+                    for i in range(rounds):
+                        output_path = os.path.join(workdir, f"{engine}_{sections}_{i}.pdf")
+                        start = time.perf_counter()
+                        try:
+                            await _render_markdown(content, output_path, label, engine)
+                        except RenderError as e:
+                            print(f"{label} {engine}: 渲染失败 {str(e)[:200]}")
+                            break
+                        elapsed.append(time.perf_counter() - start)
+                    if elapsed:
+                        print(f"{label} {engine}: 平均 {sum(elapsed) / len(elapsed):.3f}s, "
+                              f"最快 {min(elapsed):.3f}s ({len(content)} 字符)")
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    asyncio.run(run())
 
 # 主程序入口
 if __name__ == "__main__":
+    if "--benchmark" in sys.argv:
+        logging.getLogger().setLevel(logging.WARNING)
+        _run_benchmark()
+        sys.exit(0)
     try:
         logger.info("启动PDF生成MCP服务...")
         mcp.run(transport='stdio')
@@ -242,4 +993,4 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"运行PDF生成MCP服务时发生错误: {str(e)}")
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,61 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+_spec = importlib.util.spec_from_file_location(
+    "filesystem_server", os.path.join(os.path.dirname(os.path.abspath(__file__)), "filesystem-server.py"))
+filesystem_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(filesystem_server)
+
+
+class ReadTextTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def write(self, name, data):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'wb') as file:
+            file.write(data)
+        return path
+
+    def read_all(self, path, **kwargs):
+        result = filesystem_server._read_text(path, **kwargs)
+        parts = [result['content']]
+        for _ in range(10000):
+            if not result['next_token']:
+                return ''.join(parts)
+            result = filesystem_server._read_text(path, max_bytes=kwargs.get('max_bytes'),
+                                                  continuation_token=result['next_token'])
+            parts.append(result['content'])
+        self.fail('续读没有结束')
+
+    def test_tiny_max_bytes_always_advances(self):
+        text = '函数与导数，讲义。' * 20
+        path = self.write('cjk.txt', text.encode('utf-8'))
+        for max_bytes in (1, 2, 3, 4, 5):
+            with self.subTest(max_bytes=max_bytes):
+                self.assertEqual(self.read_all(path, max_bytes=max_bytes), text)
+                self.assertEqual(self.read_all(path, start_line=1, max_bytes=max_bytes), text)
+
+    def test_short_length_inside_a_character_ends(self):
+        path = self.write('cjk.txt', '函数'.encode('utf-8'))
+        for offset in range(6):
+            with self.subTest(offset=offset):
+                result = filesystem_server._read_text(path, offset=offset, length=1, max_bytes=1)
+                self.assertTrue(result['eof'])
+
+    def test_long_line_is_read_in_pieces(self):
+        line = b'{"a":' + b'1,' * (1024 * 1024) + b'2}\n'
+        path = self.write('dump.json', line + b'next\n')
+        result = filesystem_server._read_text(path, start_line=1, max_bytes=1000)
+        self.assertEqual((len(result['content']), result['truncated']), (1000, True))
+        result = filesystem_server._read_text(path, start_line=2, max_bytes=1000)
+        self.assertEqual((result['content'], result['start_line']), ('next\n', 2))
+        self.assertEqual(self.read_all(path, start_line=1, max_bytes=64 * 1024),
+                         (line + b'next\n').decode('ascii'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+
+import pdf_server
+
+
+class NeedsLatexTests(unittest.TestCase):
+    def test_math(self):
+        for content in ['$x = 2$', '解得 $x=2$。', '$a$ 与 $b$', r'$\alpha$', '$x^2$', '$$\ny = 1\n$$',
+                        r'\begin{align} a \end{align}', '```math\nx\n```']:
+            with self.subTest(content=content):
+                self.assertTrue(pdf_server._needs_latex(content))
+
+    def test_plain_text(self):
+        for content in ['价格 $5 和 $10', '花费 $5。', '$ x $', r'\$x\$', '没有公式', '$100$200']:
+            with self.subTest(content=content):
+                self.assertFalse(pdf_server._needs_latex(content))
+
+
+class MarkdownOptionsTests(unittest.TestCase):
+    def test_no_page_numbers_covers_title_page(self):
+        options = pdf_server._markdown_options('标题', page_numbers=False)
+        self.assertIn('pagestyle=empty', options)
+        self.assertTrue(any(r'\let\ps@plain\ps@empty' in option for option in options))
+
+    def test_page_numbers(self):
+        options = pdf_server._markdown_options('标题')
+        self.assertNotIn('pagestyle=empty', options)
+        self.assertFalse(any('header-includes' in option for option in options))
+
+
+if __name__ == '__main__':
+    unittest.main()